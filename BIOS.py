@@ -8,28 +8,11 @@ function draw()
     c = 0
     
     while c < 32 do
-        -- Calculamos la posición Y inicial para este color
-        -- 160px / 32 colores = 5px de alto por franja
-        base_y = c * 5
-        
-        -- Bucle para el grosor de la línea (5 pixeles de alto)
-        off_y = 0
-        while off_y < 5 do
-            
-            -- Bucle para recorrer el ancho de la pantalla (160 pixeles)
-            x = 0
-            while x < 160 do
-                -- Dibujamos el pixel actual
-                -- pset(x, y, color)
-                pset(x, base_y + off_y, c)
-                
-                x = x + 1
-            end
-            
-            off_y = off_y + 1
-        end
+        -- Una franja por color: 160px / 32 colores = 5px de alto
+        -- rectfill(x, y, w, h, color) pinta la franja entera en un solo SYS
+        rectfill(0, c * 5, 160, 5, c)
         
         c = c + 1
     end
 end
-"""
\ No newline at end of file
+"""
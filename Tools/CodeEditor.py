@@ -1,12 +1,16 @@
 import pygame
 import re
+from collections import OrderedDict
 
 from Tools.Themes import THEMES
-from VM.Lexer import KEYWORDS
+from VM.Lexer import KEYWORDS, LineLexer
 from VM.SystemSpecs import *
 
 
 class CodeEditor:
+    # Líneas ya renderizadas que se guardan (LRU)
+    MAX_LINE_CACHE = 512
+
     def __init__(self, hardware):
         self.hw = hardware
         self.lines = [""]
@@ -20,6 +24,11 @@ class CodeEditor:
         self.error_line = -1
         self.error_msg = "OK"
 
+        # Tokens cacheados por línea: resaltado y compilación
+        self.lexer = LineLexer()
+        # Línea resaltada ya renderizada: (segmentos, tema) -> Surface
+        self.line_cache = OrderedDict()
+
         # Dimensiones de fuente MINI (4x6)
         self.char_w = 4
         self.char_h = 6
@@ -54,6 +63,11 @@ class CodeEditor:
     def get_code(self):
         return "\n".join(self.lines)
 
+    def get_tokens(self):
+        """Tokens del código actual (solo se re-tokenizan las líneas editadas)"""
+        self.lexer.update(self.lines)
+        return self.lexer.tokens()
+
     def set_error(self, msg):
         self.error_msg = str(msg)
         self.error_line = -1
@@ -73,6 +87,8 @@ class CodeEditor:
         next_idx = (current + 1) % len(theme_names)
         self.theme_name = theme_names[next_idx]
         self.theme = THEMES[self.theme_name]
+        # Los colores de las líneas cacheadas son los del tema anterior
+        self.line_cache.clear()
 
     # --- HISTORIAL & CLIPBOARD ---
     def save_history(self):
@@ -401,20 +417,51 @@ class CodeEditor:
             self.cx = min(len(self.lines[self.cy]), self.cx)
 
     # --- DRAWING (Con Coloreado Corregido) ---
-    def draw_highlighted_line(self, text, x, y, target):
-        # Regex corregido para capturar identificadores, simbolos y strings
-        parts = re.split(r'("[^"]*"|--.*|\W)', text)
-        cur_x = x
+    def draw_highlighted_line(self, segments, x, y, target):
+        """Un blit de la línea ya renderizada (se arma la primera vez)"""
+        key = (segments, self.theme_name)
+        surf = self.line_cache.get(key)
+        if surf is not None:
+            self.line_cache.move_to_end(key)
+        else:
+            surf = self.line_cache[key] = self.render_line(segments)
+            if len(self.line_cache) > self.MAX_LINE_CACHE:
+                self.line_cache.popitem(last=False)
+        if surf is not None:
+            target.blit(surf, (x, y))
+
+    def render_line(self, segments):
+        """Surface indexada con la línea resaltada (fondo transparente), o None si está vacía"""
+        parts = self.highlight(segments)
+        if not parts: return None
+
+        # Fondo: un índice que no use ningún color de la línea
+        used = {col for _, col in parts}
+        bg = next(c for c in range(len(self.hw.palette)) if c not in used)
+        width = sum(len(part) for part, _ in parts) * 5
+        surf = pygame.Surface((width, self.char_h), depth=8)
+        surf.set_palette(self.hw.palette)
+        surf.fill(bg)
+        surf.set_colorkey(bg)
+
+        cur_x = 0
+        for part, col in parts:
+            self.hw.print_text(part, cur_x, 0, col, is_small=True, target=surf)
+            cur_x += len(part) * 5
+        return surf
+
+    def highlight(self, segments):
+        """(texto, color) por segmento del LineLexer: (tipo, texto, columna), espacios y comentarios incluidos"""
+        parts = []
         next_is_func = False
 
-        for part in parts:
-            if not part: continue
+        for kind, part, _ in segments:
             col = self.theme["text"]
 
-            # 1. Strings / Comentarios
-            if part.startswith('"') or part.startswith("'"):
+            # 1. Strings (también los que cruzan líneas) / Comentarios
+            if kind.startswith("STRING"):
                 col = self.theme["string"]
-            elif part.startswith("--"):
+            elif kind == "COMMENT":
                 col = self.theme["comment"]
 
             # 2. Keywords / Function Name
@@ -424,25 +471,23 @@ class CodeEditor:
 
             # Lógica para detectar nombre de funcion:
             # Si el flag está activo, y la parte NO es un espacio vacío...
-            elif next_is_func and part.strip():
+            elif next_is_func and kind != "SKIP":
                 # Si es una palabra válida, la pintamos
-                if part.isidentifier():
+                if kind == "IDENT":
                     col = self.theme["func_name"]
-                    next_is_func = False  # Ya pintamos el nombre, apagamos flag
-                # Si es un símbolo (ej: parentesis), apagamos flag
-                elif part.strip() != "":
-                    next_is_func = False
+                # Ya pintamos el nombre (o era un símbolo), apagamos flag
+                next_is_func = False
 
             # 3. Números
-            elif part.isdigit():
+            elif kind == "NUMBER":
                 col = self.theme["number"]
 
             # 4. Símbolos
-            elif part in ["+", "-", "*", "/", "=", "<", ">", "%", "(", ")", "[", "]", ",", "."]:
+            elif kind in ("OP", "LPAREN", "RPAREN", "COMMA") or part in ("[", "]", "."):
                 col = self.theme["symbol"]
 
-            self.hw.print_text(part, cur_x, y, col, is_small=True, target=target)
-            cur_x += len(part) * 5
+            parts.append((part, col))
+        return parts
 
     def draw(self):
         target = self.hw.editor_screen
@@ -455,6 +500,9 @@ class CodeEditor:
         start, end = self.get_sorted_selection()
         sel_col = self.hw.palette[self.theme["selection"]]
 
+        # Solo se re-tokenizan las líneas que cambiaron
+        self.lexer.update(self.lines)
+
         for i in range(self.max_lines_visible):
             idx = self.scroll_y + i
             if idx >= len(self.lines): break
@@ -487,7 +535,7 @@ class CodeEditor:
             num = str(idx + 1)
             self.hw.print_text(num, self.gutter_w - (len(num) * 5) - 2, y + 1, self.theme["num_fg"], is_small=True,
                                target=target)
-            self.draw_highlighted_line(line, self.gutter_w + 4, y + 1, target)
+            self.draw_highlighted_line(self.lexer.segments[idx], self.gutter_w + 4, y + 1, target)
 
             # Cursor
             if idx == self.cy:
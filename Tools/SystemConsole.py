@@ -1,13 +1,94 @@
-import pygame
+import queue
+import sys
+import threading
 import time
+from collections import deque
+
+import pygame
+
+# Nivel de cada tipo de mensaje (para filtrar); los tipos desconocidos valen 1
+LEVELS = {"USER": 1, "INFO": 1, "SUCCESS": 1, "SYSTEM": 2, "WARN": 2, "ERROR": 3}
+
+
+class StdoutMirror:
+    """
+    Copia de los logs a stdout escrita desde un hilo aparte: log() solo
+    encola la línea y el hilo la escribe en tandas (un write + flush por
+    tanda), así la terminal nunca frena el frame.
+    Solo el hilo escribe en el stream; flush() le pide que vacíe la cola y
+    termine, y lo espera.
+    """
+    # Espera del hilo para juntar líneas antes de escribir (segundos)
+    BATCH_DELAY = 0.05
+    # Marca en la cola: escribir lo anterior y terminar el hilo
+    _STOP = object()
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.queue = queue.SimpleQueue()
+        self._thread = None
+
+    def write(self, line):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="console-stdout", daemon=True)
+            self._thread.start()
+        self.queue.put(line)
+
+    def flush(self):
+        """Escribe todo lo pendiente, en orden, y espera a que termine (al salir)"""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(self._STOP)
+            thread.join()
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is self._STOP:
+                return
+            time.sleep(self.BATCH_DELAY)
+            if not self._write_batch([first]):
+                return
+
+    def _write_batch(self, lines):
+        """Escribe lines y lo que haya en la cola. False si encontró _STOP."""
+        running = True
+        try:
+            while True:
+                line = self.queue.get_nowait()
+                if line is self._STOP:
+                    running = False
+                    break
+                lines.append(line)
+        except queue.Empty:
+            pass
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        return running
 
 
 class SystemConsole:
-    def __init__(self, hardware):
+    # Entradas que guarda el buffer circular (las más viejas se descartan)
+    MAX_LOGS = 100
+    # Líneas por segundo que se copian a stdout; el resto se cuenta y se avisa
+    STDOUT_RATE = 100
+
+    def __init__(self, hardware, stdout=None):
         self.hw = hardware
-        self.logs = []  # Lista de tuplas: (tiempo, tipo, mensaje)
+        # Buffer circular de tuplas: (tiempo, tipo, mensaje, repeticiones)
+        self.logs = deque(maxlen=self.MAX_LOGS)
         self.visible = False
 
+        # Filtros: nivel mínimo que se guarda en la consola y que se copia a stdout
+        self.min_level = 1
+        self.stdout_level = 1
+        self.stdout = StdoutMirror(stdout)
+        self._stdout_window = 0    # segundo actual del límite de stdout
+        self._stdout_count = 0     # líneas escritas en ese segundo
+        self._stdout_dropped = 0   # líneas descartadas por el límite
+        self._stamp = (0, "")      # (segundo, "%H:%M:%S") para no formatear en cada log
+
         # Configuración visual
         self.font_h = 8
         self.max_lines = 35  # Cuántas líneas caben en pantalla (320px / 8)
@@ -21,46 +102,114 @@ class SystemConsole:
             "SYSTEM": 12  # Azul
         }
 
+        # Overlay persistente, ya escalado al tamaño de la ventana: se
+        # rearma solo cuando cambian los logs (o la ventana)
+        self.bg_color = (10, 10, 20, 220)  # Azul muy oscuro, semitransparente
+        self._overlay = None
+        self.dirty = True
+        self._line_cache = {}  # entrada del log -> Surface de la línea ya escalada
+        self._header = None
+
         self.log("Spark System v1.0 Ready", "SYSTEM")
 
     def toggle(self):
         self.visible = not self.visible
 
     def log(self, msg, type="INFO"):
-        """Agrega un mensaje al log"""
-        timestamp = time.strftime("%H:%M:%S")
-        self.logs.append((timestamp, type, str(msg)))
-
-        # Auto-scroll: mantener solo las últimas N líneas
-        if len(self.logs) > 100:
-            self.logs.pop(0)
-
-        # Imprimir también en terminal de PyCharm por si acaso
-        print(f"[{type}] {msg}")
-
-    def draw(self):
+        """Agrega un mensaje al log (los repetidos seguidos se agrupan)"""
+        level = LEVELS.get(type, 1)
+        text = str(msg)
+        repeated = False
+
+        if level >= self.min_level:
+            last = self.logs[-1] if self.logs else None
+            if last is not None and last[1] == type and last[2] == text:
+                # Mismo mensaje que el anterior: solo sube el contador
+                self.logs[-1] = (last[0], type, text, last[3] + 1)
+                repeated = True
+            else:
+                if last is not None and last[3] > 1 and LEVELS.get(last[1], 1) >= self.stdout_level:
+                    # Terminó una racha de repetidos: una línea con el total
+                    self._mirror(f"[{last[1]}] {last[2]} (x{last[3]})")
+                self.logs.append((self._timestamp(), type, text, 1))
+            self.dirty = True
+
+        # Copiar también a la terminal (en otro hilo y con límite por segundo)
+        if level >= self.stdout_level and not repeated:
+            self._mirror(f"[{type}] {text}")
+
+    def _timestamp(self):
+        now = int(time.time())
+        if self._stamp[0] != now:
+            self._stamp = (now, time.strftime("%H:%M:%S", time.localtime(now)))
+        return self._stamp[1]
+
+    def _mirror(self, line):
+        now = int(time.monotonic())
+        if now != self._stdout_window:
+            self._stdout_window, self._stdout_count = now, 0
+            if self._stdout_dropped:
+                self.stdout.write(f"[SYSTEM] ({self._stdout_dropped} mensajes omitidos)")
+                self._stdout_dropped = 0
+        if self._stdout_count < self.STDOUT_RATE:
+            self._stdout_count += 1
+            self.stdout.write(line)
+        else:
+            self._stdout_dropped += 1
+
+    def draw(self, window, rects=None):
+        """
+        Compone la consola sobre la ventana: un solo blit del overlay cacheado.
+        rects: solo esas regiones de la ventana (las que se repintaron debajo)
+        """
         if not self.visible: return
 
-        target = self.hw.editor_screen
-        overlay = pygame.Surface((self.hw.ED_WIDTH, self.hw.ED_HEIGHT))
-        overlay.set_alpha(220)  # 0-255
-        overlay.fill((10, 10, 20))  # Azul muy oscuro
-        target.blit(overlay, (0, 0))
-
-        # 2. Dibujar Logs (de abajo hacia arriba)
+        if self.dirty or self._overlay is None or self._overlay.get_size() != window.get_size():
+            self._build_overlay(window.get_size())
+        if rects is None:
+            window.blit(self._overlay, (0, 0))
+        else:
+            for r in rects:
+                window.blit(self._overlay, r, r)
+
+    def _scaled_text(self, text, col_idx, is_small, sx, sy):
+        """Texto renderizado por la caché de texto del hardware, escalado a la ventana"""
+        surf = self.hw.text_cache.render(text, col_idx, is_small)
+        if surf is None: return None
+        w, h = surf.get_size()
+        return pygame.transform.scale(surf, (round(w * sx), round(h * sy)))
+
+    def _build_overlay(self, size):
+        sx, sy = size[0] / self.hw.ED_WIDTH, size[1] / self.hw.ED_HEIGHT
+        if self._overlay is None or self._overlay.get_size() != size:
+            self._overlay = pygame.Surface(size, pygame.SRCALPHA)
+            self._line_cache.clear()
+            self._header = None
+        target = self._overlay
+        target.fill(self.bg_color)
+
+        # 2. Dibujar Logs (de abajo hacia arriba), cada línea cacheada
+        cache = {}
         y = self.hw.ED_HEIGHT - 20
 
-        for i in range(len(self.logs) - 1, -1, -1):
-            ts, type, text = self.logs[i]
-            col_idx = self.colors.get(type, 7)
-            full_str = f"[{ts}] {text}"
-
-            # Pasamos target=target para que Hardware use esta superficie
-            self.hw.print_text(full_str, 5, y, col_idx, is_small=True, target=target)
+        for entry in reversed(self.logs):
+            line = self._line_cache.get(entry)
+            if line is None:
+                ts, type, text, count = entry
+                full_str = f"[{ts}] {text}" if count == 1 else f"[{ts}] {text} (x{count})"
+                line = self._scaled_text(full_str, self.colors.get(type, 7), True, sx, sy)
+            cache[entry] = line
+            if line is not None:
+                target.blit(line, (round(5 * sx), round(y * sy)))
 
             y -= self.font_h + 2
             if y < 0: break
+        # Solo quedan en caché las líneas visibles
+        self._line_cache = cache
 
         # 3. Header
-        pygame.draw.rect(target, self.hw.palette[1], (0, 0, self.hw.ED_WIDTH, 16))
-        self.hw.print_text("--- SYSTEM CONSOLE (F3) ---", 10, 4, 7, is_small=False, target=target)
\ No newline at end of file
+        pygame.draw.rect(target, self.hw.palette[1], (0, 0, size[0], round(16 * sy)))
+        if self._header is None:
+            self._header = self._scaled_text("--- SYSTEM CONSOLE (F3) ---", 7, False, sx, sy)
+        target.blit(self._header, (round(10 * sx), round(4 * sy)))
+        self.dirty = False
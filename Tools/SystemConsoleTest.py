@@ -0,0 +1,43 @@
+"""
+Pruebas de la copia de logs a stdout (StdoutMirror).
+
+    python -m Tools.SystemConsoleTest
+"""
+import io
+import time
+
+from Tools.SystemConsole import StdoutMirror
+from VM.Testing import run_tests
+
+
+def test_flush_during_batch_delay():
+    # flush() mientras el hilo espera con la primera línea en la mano:
+    # todo sale, en orden, y nada se escribe después del flush
+    out = io.StringIO()
+    mirror = StdoutMirror(out)
+    mirror.BATCH_DELAY = 0.2
+    lines = [f"linea {i}" for i in range(50)]
+    mirror.write(lines[0])
+    time.sleep(0.05)  # el hilo ya tomó la primera y está esperando
+    for line in lines[1:]:
+        mirror.write(line)
+    mirror.flush()
+    time.sleep(0.3)
+    assert out.getvalue() == "\n".join(lines) + "\n", out.getvalue()
+
+
+def test_write_after_flush():
+    out = io.StringIO()
+    mirror = StdoutMirror(out)
+    mirror.write("a")
+    mirror.flush()
+    mirror.write("b")
+    mirror.flush()
+    mirror.flush()  # sin hilo: no hace nada
+    assert out.getvalue() == "a\nb\n", out.getvalue()
+
+
+TESTS = [test_flush_during_batch_delay, test_write_after_flush]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
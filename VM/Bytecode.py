@@ -0,0 +1,128 @@
+"""
+Formato compacto del bytecode: 1 byte por opcode + operandos varint.
+
+    varint  LEB128 sin signo: 7 bits por byte, el bit alto indica que sigue
+            otro byte (0-127 ocupa 1 byte, hasta 16383 ocupa 2, ...)
+
+El Compiler y el PeepholeOptimizer trabajan sobre una lista de palabras
+(opcode y operandos como enteros sueltos, direcciones por palabra); al final
+Compiler.assemble la pasa a este formato con encode. Las direcciones (saltos
+y direcciones de función) pasan a ser offsets en bytes.
+"""
+from VM.Opcodes import OP_ARGC, JUMP_OPS
+
+# Presupuesto de bytecode de un cartucho (Docs/specs.md: cartucho de 32 KB)
+MAX_CODE_BYTES = 32 * 1024
+
+
+def varint_size(value):
+    size = 1
+    while value > 0x7F:
+        value >>= 7
+        size += 1
+    return size
+
+
+def write_varint(out, value):
+    if type(value) is not int or value < 0:
+        raise ValueError(f"operando no codificable: {value!r}")
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(code, addr):
+    """Devuelve (valor, dirección siguiente). IndexError si el varint está truncado."""
+    byte = code[addr]
+    value = byte & 0x7F
+    shift = 7
+    while byte & 0x80:
+        addr += 1
+        byte = code[addr]
+        value |= (byte & 0x7F) << shift
+        shift += 7
+    return value, addr + 1
+
+
+def read_instruction(code, addr):
+    """
+    Instrucción compacta en addr: (opcode, operandos, dirección siguiente).
+    Un opcode desconocido se devuelve sin operandos. IndexError si está truncada.
+    """
+    op = code[addr]
+    addr += 1
+    operands = []
+    for _ in range(OP_ARGC.get(op, 0)):
+        value, addr = read_varint(code, addr)
+        operands.append(value)
+    return op, operands, addr
+
+
+def instructions(code):
+    """Recorre el bytecode compacto: (dirección, opcode, operandos)"""
+    addr = 0
+    while addr < len(code):
+        op, operands, next_addr = read_instruction(code, addr)
+        yield addr, op, operands
+        addr = next_addr
+
+
+def encode(words, consts=None, address_consts=()):
+    """
+    Lista de palabras -> bytearray compacto.
+    Reubica los destinos de salto y, si se pasan, las constantes que guardan
+    direcciones de función (consts[i] para i en address_consts, en el lugar).
+    """
+    # 1. Cortar en instrucciones
+    ins = []
+    index_of = {}  # dirección en palabras -> índice de instrucción
+    addr = 0
+    while addr < len(words):
+        op = words[addr]
+        argc = OP_ARGC.get(op)
+        if argc is None or addr + argc >= len(words):
+            raise ValueError(f"bytecode inválido en {addr}: {op!r}")
+        index_of[addr] = len(ins)
+        ins.append((op, list(words[addr + 1:addr + 1 + argc])))
+        addr += 1 + argc
+    index_of[len(words)] = len(ins)
+
+    def target_index(word_addr):
+        if word_addr not in index_of:
+            raise ValueError(f"destino a mitad de instrucción: {word_addr}")
+        return index_of[word_addr]
+
+    jumps = {i: target_index(int(operands[JUMP_OPS[op]]))
+             for i, (op, operands) in enumerate(ins) if op in JUMP_OPS}
+
+    # 2. Direcciones en bytes: el tamaño de un salto depende de su destino,
+    # así que se itera hasta que no cambian (los tamaños solo crecen)
+    addr_of = [0] * (len(ins) + 1)
+    while True:
+        addr = 0
+        new_addr_of = []
+        for i, (op, operands) in enumerate(ins):
+            new_addr_of.append(addr)
+            if i in jumps:
+                operands = list(operands)
+                operands[JUMP_OPS[op]] = addr_of[jumps[i]]
+            addr += 1 + sum(varint_size(v) for v in operands)
+        new_addr_of.append(addr)
+        if new_addr_of == addr_of:
+            break
+        addr_of = new_addr_of
+
+    # 3. Emitir
+    out = bytearray()
+    for i, (op, operands) in enumerate(ins):
+        out.append(op)
+        if i in jumps:
+            operands[JUMP_OPS[op]] = addr_of[jumps[i]]
+        for value in operands:
+            write_varint(out, value)
+
+    if consts is not None:
+        for const_idx in address_consts:
+            consts[const_idx] = addr_of[target_index(consts[const_idx])]
+    return out
@@ -0,0 +1,323 @@
+"""
+Formato de cartucho .sparkcart: binario por secciones, pensado para
+cargarse con mmap sin copiar lo que no se usa.
+
+    header   "SPRK" | versión u16 | cantidad de secciones u16
+    TOC      por sección: tag (4 bytes) | offset u32 | tamaño u32
+    datos    las secciones, alineadas a 4 bytes
+
+Tamaño: hasta MAX_CART_BYTES sumando todas las secciones salvo SRC (el
+fuente es solo para el editor). Alcanza para el bytecode máximo, la
+spritesheet y el mapa completos y el resto de los datos.
+
+Secciones (todas opcionales salvo CODE):
+    CODE  bytecode compacto (VM/Bytecode.py), hasta MAX_CODE_BYTES
+    CNST  constantes: cantidad u32 y un registro por constante
+              "F" float64 | "S" largo u32 + UTF-8 | "A" dirección de función u32 | "N" nil
+    SYMS  nombres de globales (UTF-8, separados por \\n)
+    GFX   spritesheet 128x128, un índice de paleta por pixel
+    MAP   tilemap 128x128, un ID de sprite por celda
+    SFX   datos de sonido (opacos)
+    META  metadatos (JSON)
+    SRC   código fuente SparkLang (para abrirlo en el editor)
+
+    python -m VM.Cartridge juego.spark -o juego.sparkcart
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+
+from VM.Bytecode import MAX_CODE_BYTES
+
+MAGIC = b"SPRK"
+VERSION = 3
+HEADER = struct.Struct("<4sHH")
+TOC_ENTRY = struct.Struct("<4sII")
+ALIGN = 4
+
+SECTION_ORDER = (b"CODE", b"CNST", b"SYMS", b"GFX ", b"MAP ", b"SFX ", b"META", b"SRC ")
+SPRITESHEET_BYTES = 128 * 128
+TILEMAP_BYTES = 128 * 128
+# Docs/specs.md: 96 KB = 32 KB de bytecode + spritesheet y mapa (16 KB cada uno) + 32 KB
+MAX_CART_BYTES = MAX_CODE_BYTES + SPRITESHEET_BYTES + TILEMAP_BYTES + 32 * 1024
+# Secciones que no cuentan para MAX_CART_BYTES
+UNCOUNTED_SECTIONS = (b"SRC ",)
+
+U32 = struct.Struct("<I")
+F64 = struct.Struct("<d")
+
+
+class CartridgeError(Exception):
+    pass
+
+
+def check_sizes(sizes):
+    """sizes: tag -> tamaño. CartridgeError si el cartucho no respeta los límites."""
+    if sizes.get(b"CODE", 0) > MAX_CODE_BYTES:
+        raise CartridgeError(f"bytecode de {sizes[b'CODE']} B: supera el máximo de {MAX_CODE_BYTES} B")
+    if sizes.get(b"GFX ", SPRITESHEET_BYTES) != SPRITESHEET_BYTES:
+        raise CartridgeError(f"la spritesheet debe tener {SPRITESHEET_BYTES} bytes")
+    if sizes.get(b"MAP ", TILEMAP_BYTES) != TILEMAP_BYTES:
+        raise CartridgeError(f"el tilemap debe tener {TILEMAP_BYTES} bytes")
+    total = sum(size for tag, size in sizes.items() if tag not in UNCOUNTED_SECTIONS)
+    if total > MAX_CART_BYTES:
+        raise CartridgeError(f"cartucho de {total} B: supera el máximo de {MAX_CART_BYTES} B")
+
+
+def pack_consts(consts):
+    """Tabla de constantes -> sección CNST (solo float, str, direcciones int y None)"""
+    out = [U32.pack(len(consts))]
+    for value in consts:
+        if type(value) is float:
+            out.append(b"F" + F64.pack(value))
+        elif type(value) is str:
+            data = value.encode("utf-8")
+            out.append(b"S" + U32.pack(len(data)) + data)
+        elif type(value) is int and 0 <= value <= 0xFFFFFFFF:
+            out.append(b"A" + U32.pack(value))
+        elif value is None:
+            out.append(b"N")
+        else:
+            raise CartridgeError(f"constante no empaquetable: {value!r}")
+    return b"".join(out)
+
+
+def unpack_consts(data, code_size):
+    """Sección CNST -> lista de constantes. CartridgeError si está mal formada."""
+    try:
+        (count,) = U32.unpack_from(data, 0)
+        pos = U32.size
+        consts = []
+        for _ in range(count):
+            tag = data[pos:pos + 1]
+            pos += 1
+            if tag == b"F":
+                (value,) = F64.unpack_from(data, pos)
+                pos += F64.size
+            elif tag == b"S":
+                (size,) = U32.unpack_from(data, pos)
+                pos += U32.size
+                if pos + size > len(data):
+                    raise CartridgeError("CNST: string truncado")
+                value = str(data[pos:pos + size], "utf-8")
+                pos += size
+            elif tag == b"A":
+                (value,) = U32.unpack_from(data, pos)
+                pos += U32.size
+                if value >= code_size:
+                    raise CartridgeError(f"CNST: dirección de función fuera del código: {value}")
+            elif tag == b"N":
+                value = None
+            else:
+                raise CartridgeError(f"CNST: registro desconocido {bytes(tag)!r}")
+            consts.append(value)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise CartridgeError(f"CNST mal formada: {e}")
+    if pos != len(data):
+        raise CartridgeError("CNST: datos de más al final")
+    return consts
+
+
+class Cartridge:
+    """
+    Cartucho abierto con mmap. section(tag) devuelve una vista (memoryview)
+    sobre el archivo sin copiar nada; las propiedades (spritesheet, source,
+    ...) se decodifican recién cuando se piden. Lo que la VM necesita para
+    cargar (constantes y nombres) se valida al abrir: un archivo dañado da
+    CartridgeError en open, no más tarde.
+    """
+
+    def __init__(self, buffer, path=None):
+        self.path = path
+        self._buffer = buffer
+        self.view = memoryview(buffer)
+        self.sections = {}  # tag -> (offset, tamaño)
+        self._parse()
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CartridgeError(f"{path}: archivo vacío")
+        return cls(buffer, path)
+
+    def close(self):
+        """
+        Suelta el archivo. Si quedan vistas en uso (una VM que corre sobre
+        cart.code) el mmap no se puede cerrar todavía: se libera solo con la
+        última vista. Después de close no se pueden pedir más secciones.
+        """
+        self.view.release()
+        buffer, self._buffer = self._buffer, None
+        if isinstance(buffer, mmap.mmap):
+            try:
+                buffer.close()
+            except BufferError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parse(self):
+        if len(self.view) < HEADER.size:
+            raise CartridgeError("cartucho truncado (header)")
+        magic, version, count = HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC:
+            raise CartridgeError("no es un cartucho .sparkcart")
+        if version != VERSION:
+            raise CartridgeError(f"versión de cartucho no soportada: {version}")
+
+        toc_end = HEADER.size + count * TOC_ENTRY.size
+        if len(self.view) < toc_end:
+            raise CartridgeError("cartucho truncado (TOC)")
+        for i in range(count):
+            tag, offset, size = TOC_ENTRY.unpack_from(self.view, HEADER.size + i * TOC_ENTRY.size)
+            if offset < toc_end or offset + size > len(self.view):
+                raise CartridgeError(f"sección {tag.decode(errors='replace')} fuera del archivo")
+            self.sections[tag] = (offset, size)
+        if b"CODE" not in self.sections:
+            raise CartridgeError("el cartucho no tiene sección CODE")
+        check_sizes({tag: size for tag, (_, size) in self.sections.items()})
+
+        data = self.section(b"CNST")
+        self._consts = unpack_consts(data, len(self.code)) if len(data) else []
+        try:
+            data = str(self.section(b"SYMS"), "utf-8")
+        except UnicodeDecodeError as e:
+            raise CartridgeError(f"SYMS mal formada: {e}")
+        self._names = data.split("\n") if data else []
+
+    # --- Acceso a secciones ---
+    def has(self, tag):
+        return tag in self.sections
+
+    def section(self, tag):
+        """Vista sin copia de la sección (memoryview vacía si no existe)"""
+        if tag not in self.sections:
+            return self.view[0:0]
+        offset, size = self.sections[tag]
+        return self.view[offset:offset + size]
+
+    @property
+    def size(self):
+        return len(self.view)
+
+    @property
+    def code(self):
+        """Bytecode compacto: la VM lo ejecuta directo sobre el archivo mapeado"""
+        return self.section(b"CODE")
+
+    @property
+    def consts(self):
+        return list(self._consts)
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    @property
+    def meta(self):
+        data = bytes(self.section(b"META"))
+        try:
+            return json.loads(data) if data else {}
+        except ValueError as e:  # JSONDecodeError y UnicodeDecodeError
+            raise CartridgeError(f"META mal formada: {e}")
+
+    @property
+    def source(self):
+        data = self.section(b"SRC ")
+        try:
+            return str(data, "utf-8") if len(data) else None
+        except UnicodeDecodeError as e:
+            raise CartridgeError(f"SRC mal formada: {e}")
+
+    @property
+    def spritesheet(self):
+        return self.section(b"GFX ") if self.has(b"GFX ") else None
+
+    @property
+    def tilemap(self):
+        return self.section(b"MAP ") if self.has(b"MAP ") else None
+
+    @property
+    def sfx(self):
+        return self.section(b"SFX ")
+
+
+def pack_cartridge(code, consts, names=(), spritesheet=None, tilemap=None, sfx=None, meta=None, source=None):
+    """Arma el binario del cartucho (code: bytecode compacto)"""
+    sections = {
+        b"CODE": bytes(code),
+        b"CNST": pack_consts(consts),
+        b"SYMS": "\n".join(names).encode("utf-8"),
+    }
+    if spritesheet is not None:
+        sections[b"GFX "] = bytes(spritesheet)
+    if tilemap is not None:
+        sections[b"MAP "] = bytes(tilemap)
+    if sfx:
+        sections[b"SFX "] = bytes(sfx)
+    if meta:
+        sections[b"META"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    if source is not None:
+        sections[b"SRC "] = source.encode("utf-8")
+    check_sizes({tag: len(data) for tag, data in sections.items()})
+
+    tags = [tag for tag in SECTION_ORDER if tag in sections]
+    offset = HEADER.size + len(tags) * TOC_ENTRY.size
+    header = [HEADER.pack(MAGIC, VERSION, len(tags))]
+    body = []
+    for tag in tags:
+        pad = -offset % ALIGN
+        body.append(b"\0" * pad)
+        offset += pad
+        data = sections[tag]
+        header.append(TOC_ENTRY.pack(tag, offset, len(data)))
+        body.append(data)
+        offset += len(data)
+    return b"".join(header + body)
+
+
+def write_cartridge(path, program, hardware=None, meta=None, source=None, sfx=None):
+    """Guarda un programa compilado (code/consts/names) y, si hay hardware, sus assets"""
+    spritesheet = tilemap = None
+    if hardware is not None:
+        spritesheet = hardware.spritesheet_bytes()
+        tilemap = hardware.tilemap.tiles
+    data = pack_cartridge(program.code, program.consts, program.names,
+                          spritesheet, tilemap, sfx, meta, source)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def main(argv=None):
+    from VM.Pipeline import compile_source
+
+    parser = argparse.ArgumentParser(description="Spark: empaquetar un cartucho .sparkcart")
+    parser.add_argument("source", help="archivo fuente SparkLang")
+    parser.add_argument("-o", "--output", help="archivo de salida (default: mismo nombre .sparkcart)")
+    parser.add_argument("--title", help="título (metadatos)")
+    parser.add_argument("--no-source", action="store_true", help="no incluir el código fuente")
+    args = parser.parse_args(argv)
+
+    with open(args.source, encoding="utf-8") as f:
+        source_code = f.read()
+    compiler, _ = compile_source(source_code)
+
+    output = args.output or args.source.rsplit(".", 1)[0] + ".sparkcart"
+    meta = {"title": args.title} if args.title else None
+    size = write_cartridge(output, compiler, meta=meta, source=None if args.no_source else source_code)
+    print(f"{output}: {size} B")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
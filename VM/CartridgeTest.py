@@ -0,0 +1,179 @@
+"""
+Pruebas del formato .sparkcart: empaquetar -> abrir (mmap) -> correr -> cerrar.
+
+    python -m VM.CartridgeTest
+"""
+import gc
+import math
+import os
+import subprocess
+import sys
+import tempfile
+
+from VM import Cartridge as cartridge_module
+from VM.Cartridge import (HEADER, MAX_CART_BYTES, SPRITESHEET_BYTES, TILEMAP_BYTES, TOC_ENTRY, Cartridge,
+                          CartridgeError, pack_cartridge)
+from VM.Pipeline import compile_source
+from VM.Testing import run_tests
+from VM.VirtualMachine import SparkVM
+
+SOURCE = """
+x = 1 + 2
+name = "spark"
+function bump()
+    x = x + 1
+end
+"""
+
+
+def write_cart(directory, data):
+    path = os.path.join(directory, "test.sparkcart")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_round_trip_close_while_running():
+    program, _ = compile_source(SOURCE)
+    data = pack_cartridge(program.code, program.consts, program.names,
+                          tilemap=bytes(range(256)) * 64, meta={"title": "test"}, source=SOURCE)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_cart(tmp, data)
+        for engine in SparkVM.ENGINES:
+            vm = SparkVM([], [], engine=engine)
+            with Cartridge.open(path) as cart:
+                assert bytes(cart.code) == program.code
+                assert (cart.consts, cart.names) == (program.consts, program.names)
+                assert cart.source == SOURCE and cart.meta == {"title": "test"}
+                assert cart.spritesheet is None and cart.tilemap[:3].tolist() == [0, 1, 2]
+                buffer = cart._buffer
+                vm.load(cart.code, cart.consts, cart.names)
+                vm.run()
+            # close() con la VM todavía sobre cart.code: no falla y la VM sigue
+            vm.call_function("bump")
+            assert vm.get_global("x") == 4, engine
+            assert vm.get_global("name") == "spark" and vm.runtime_error is None, engine
+            cart.close()  # cerrar dos veces no hace nada
+
+            # Al soltar la VM no quedan vistas y el mmap se puede cerrar
+            del vm
+            gc.collect()
+            buffer.close()
+            assert buffer.closed, engine
+
+
+def section_span(data, tag):
+    """(offset, tamaño) de una sección en un cartucho empaquetado"""
+    _, _, count = HEADER.unpack_from(data, 0)
+    for i in range(count):
+        entry_tag, offset, size = TOC_ENTRY.unpack_from(data, HEADER.size + i * TOC_ENTRY.size)
+        if entry_tag == tag:
+            return offset, size
+    raise KeyError(tag)
+
+
+def test_consts_round_trip():
+    consts = [0.0, -0.0, 1.5, math.inf, "", "ñandú", None, 3]
+    data = pack_cartridge(b"\x00" * 8, consts, ["a", "b"])
+    with tempfile.TemporaryDirectory() as tmp:
+        with Cartridge.open(write_cart(tmp, data)) as cart:
+            loaded = cart.consts
+            assert [(type(v), repr(v)) for v in loaded] == [(type(v), repr(v)) for v in consts], loaded
+            assert cart.names == ["a", "b"]
+
+
+def test_consts_rejected():
+    # Solo float, str, direcciones (int) y nil: nada de objetos arbitrarios
+    for value in ({"a": 1}, compile("1", "<x>", "eval"), True, -1, [1.0]):
+        try:
+            pack_cartridge(b"\x00", [value])
+        except CartridgeError:
+            continue
+        raise AssertionError(f"se empaquetó la constante {value!r}")
+
+
+def test_corrupt_consts():
+    program, _ = compile_source(SOURCE)
+    data = pack_cartridge(program.code, program.consts, program.names)
+    offset, size = section_span(data, b"CNST")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pos in range(offset, offset + size):
+            for byte in (0x00, 0x41, 0xFF):
+                bad = bytearray(data)
+                bad[pos] = byte
+                path = write_cart(tmp, bytes(bad))
+                try:
+                    cart = Cartridge.open(path)
+                except CartridgeError:
+                    continue
+                # Si abre, las constantes son de los tipos permitidos
+                assert all(v is None or type(v) in (float, str, int) for v in cart.consts)
+                cart.close()
+
+        # El runner en lote lo reporta como LOAD ERROR en lugar de caerse
+        bad = bytearray(data)
+        bad[offset + 4] = ord("X")
+        path = write_cart(tmp, bytes(bad))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, os.path.join(root, "headless.py"), path, "--frames", "1"],
+                                capture_output=True, text=True, cwd=root)
+        assert result.returncode == 1 and "LOAD ERROR" in result.stdout, result.stdout + result.stderr
+
+
+def test_size_limits():
+    program, _ = compile_source(SOURCE)
+    gfx, tiles = bytes(SPRITESHEET_BYTES), bytes(TILEMAP_BYTES)
+    fits = MAX_CART_BYTES - SPRITESHEET_BYTES - TILEMAP_BYTES - 4096
+    pack_cartridge(program.code, program.consts, program.names, gfx, tiles, sfx=bytes(fits),
+                   source="x" * MAX_CART_BYTES)  # El fuente no cuenta
+
+    too_big = [
+        dict(sfx=bytes(fits + 4096)),  # Total
+        dict(code=bytes(40 * 1024)),  # Bytecode
+        dict(spritesheet=bytes(100)),  # Assets de tamaño fijo
+        dict(tilemap=bytes(TILEMAP_BYTES + 1)),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in too_big:
+            args = dict(code=program.code, consts=program.consts, names=program.names,
+                        spritesheet=gfx, tilemap=tiles)
+            args.update(case)
+            try:
+                pack_cartridge(**args)
+            except CartridgeError:
+                pass
+            else:
+                raise AssertionError(f"se empaquetó un cartucho fuera de límites: {list(case)}")
+
+            # Un archivo armado a mano con esos tamaños tampoco abre
+            check = cartridge_module.check_sizes
+            cartridge_module.check_sizes = lambda sizes: None
+            try:
+                data = pack_cartridge(**args)
+            finally:
+                cartridge_module.check_sizes = check
+            try:
+                Cartridge.open(write_cart(tmp, data)).close()
+            except CartridgeError:
+                continue
+            raise AssertionError(f"se abrió un cartucho fuera de límites: {list(case)}")
+
+
+def test_bad_files():
+    program, _ = compile_source(SOURCE)
+    data = pack_cartridge(program.code, program.consts, program.names)
+    with tempfile.TemporaryDirectory() as tmp:
+        for bad in (b"", b"XXXX" + data[4:], data[:10], data[:-4]):
+            path = write_cart(tmp, bad)
+            try:
+                Cartridge.open(path).close()
+            except CartridgeError:
+                continue
+            raise AssertionError(f"se abrió un cartucho inválido: {bad[:12]!r}")
+
+
+TESTS = [test_round_trip_close_while_running, test_consts_round_trip, test_consts_rejected, test_corrupt_consts,
+         test_size_limits, test_bad_files]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
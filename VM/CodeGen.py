@@ -0,0 +1,535 @@
+"""
+Backend nativo: traduce el AST de un cartucho a código Python, que se
+compila una vez con compile() y corre como funciones Python comunes.
+
+Cada función SparkLang pasa a ser una función Python: las locales son
+variables locales, las globales viven en la misma lista de slots que usa
+SparkVM (vm.globals) y las SYS calls llaman directo a los métodos del
+hardware. Las operaciones que la inferencia de tipos no puede probar pasan
+por helpers que replican la semántica y los mensajes de error de la VM.
+
+A diferencia de los motores de bytecode, update/draw corren hasta el final
+(no hay presupuesto de ciclos ni suspensión): un bucle que pasa de
+NativeVM.MAX_LOOP_TICKS vueltas en una llamada se corta con un error.
+"""
+import math
+
+from VM.Compiler import Compiler
+from VM.Data import *
+from VM.Lexer import Lexer
+from VM.Opcodes import SYS_FUNCTIONS, SUB, MUL, DIV, MOD
+from VM.Optimizer import ASTOptimizer
+from VM.Parser import Parser
+from VM.Scope import ScopeResolver
+from VM.SystemSpecs import SYS_SPECS
+from VM.Types import NUM, STR, BOOL, TypeInference
+from VM.VirtualMachine import SparkVM
+
+
+class SparkRuntimeError(Exception):
+    """Error del cartucho en ejecución (mismo mensaje que daría la VM)"""
+
+
+# --- Helpers de runtime: operaciones cuyos tipos no se probaron al compilar ---
+def _numbers(a, b):
+    return isinstance(a, (int, float)) and isinstance(b, (int, float))
+
+
+def _math_error(op, a, b):
+    return SparkRuntimeError(f"Math Error: Cannot op {op} on {type(a)} and {type(b)}")
+
+
+def _compare_error(a, b):
+    return SparkRuntimeError(f"Cannot compare {type(a)} and {type(b)}")
+
+
+def rt_add(a, b):
+    if _numbers(a, b):
+        return a + b
+    return str(a) + str(b)  # '+' concatena si algún lado no es número
+
+
+def rt_sub(a, b):
+    if _numbers(a, b): return a - b
+    raise _math_error(SUB, a, b)
+
+
+def rt_mul(a, b):
+    if _numbers(a, b): return a * b
+    raise _math_error(MUL, a, b)
+
+
+def rt_div(a, b):
+    if not _numbers(a, b): raise _math_error(DIV, a, b)
+    if b == 0: raise SparkRuntimeError("Division by Zero")
+    return a / b
+
+
+def rt_mod(a, b):
+    if not _numbers(a, b): raise _math_error(MOD, a, b)
+    if b == 0: raise SparkRuntimeError("Modulo by Zero")
+    return a % b
+
+
+def rt_neg(a):
+    if isinstance(a, (int, float)): return -a
+    raise SparkRuntimeError("Cannot negate non-number")
+
+
+def rt_lt(a, b):
+    try: return a < b
+    except TypeError: raise _compare_error(a, b)
+
+
+def rt_lte(a, b):
+    try: return a <= b
+    except TypeError: raise _compare_error(a, b)
+
+
+def rt_gt(a, b):
+    try: return a > b
+    except TypeError: raise _compare_error(a, b)
+
+
+def rt_gte(a, b):
+    try: return a >= b
+    except TypeError: raise _compare_error(a, b)
+
+
+def rt_no_call(*args):
+    """Destino de CALL que no es una función (o SYS sin hardware): deja 0, como la VM"""
+    return 0
+
+
+# Operador -> (plantilla en línea, helper). La plantilla se usa si los
+# tipos de ambos lados están probados (ver PythonCodeGen.gen_BinaryOp)
+BINARY_OPS = {
+    '+': ("({} + {})", "rt_add"), '-': ("({} - {})", "rt_sub"), '*': ("({} * {})", "rt_mul"),
+    '/': ("({} / {})", "rt_div"), '%': ("({} % {})", "rt_mod"),
+    '==': ("({} == {})", None), '~=': ("({} != {})", None),
+    '<': ("({} < {})", "rt_lt"), '<=': ("({} <= {})", "rt_lte"),
+    '>': ("({} > {})", "rt_gt"), '>=': ("({} >= {})", "rt_gte"),
+}
+
+# Métodos del hardware que el código generado llama directo
+HW_METHODS = {"hw_pset": "pset", "hw_spr": "spr", "hw_btn": "btn", "hw_cls": "clear_screen",
+              "hw_print": "print_text", "hw_line": "line", "hw_rect": "rect", "hw_rectfill": "rectfill",
+              "hw_circ": "circ", "hw_circfill": "circfill", "hw_pal": "pal", "hw_sset": "sset",
+              "hw_map": "map", "hw_mset": "mset", "hw_mget": "mget"}
+
+# SYS call -> (helper, cantidades de argumentos que se pueden llamar directo)
+# Los demás casos (argumentos de más, tipos sin probar, log, sfx) van por sys_call
+DIRECT_SYS = {
+    "pset": ("hw_pset", (3,)), "line": ("hw_line", (5,)), "rect": ("hw_rect", (5,)),
+    "rectfill": ("hw_rectfill", (5,)), "circ": ("hw_circ", (4,)), "circfill": ("hw_circfill", (4,)),
+    "sset": ("hw_sset", (3,)), "mset": ("hw_mset", (3,)), "mget": ("hw_mget", (2,)),
+    "spr": ("hw_spr", (3, 4, 5)), "map": ("hw_map", (2, 3, 4, 5, 6)),
+    "pal": ("hw_pal", (0, 2)), "cls": ("hw_cls", (0,)), "btn": ("hw_btn", (1,)), "print": ("hw_print", (4, 5)),
+}
+
+# Nombres que build() recibe en env
+RUNTIME_NAMES = ("G", "K", "CHK", "funcs", "resolve", "sys_call", "overflow", "timeout",
+                 "MAX_DEPTH", "MAX_TICKS", "rt_add", "rt_sub", "rt_mul", "rt_div", "rt_mod",
+                 "rt_neg", "rt_lt", "rt_lte", "rt_gt", "rt_gte") + tuple(HW_METHODS)
+
+NUMERIC_KINDS = (NUM, BOOL)
+
+
+class PythonCodeGen:
+    """
+    Program (AST ya optimizado) -> código fuente de un módulo con
+    build(env), que devuelve (init, enter, funcs):
+        init   el cuerpo principal (inicialización de globales)
+        enter  enter(fn) corre init o una función desde el host
+        funcs  dirección -> función Python de cada FuncDecl
+    Los errores de compilación son los mismos que da el Compiler.
+    """
+
+    def __init__(self):
+        self.symbols = {}  # Globales: nombre -> slot (y slot -> nombre)
+        self.names = []
+        self.consts = []  # Valores sin literal Python (inf, nan): K[i]
+        self.sys_sites = []  # (sys_id, argc, mask) de cada SYS con chequeos: CHK[i]
+
+        self.func_locals = {}
+        self.locals = set()  # Locales de la función que se genera
+        self.types = TypeInference()
+        self.checker = Compiler()  # Para sys_check_mask (mismas reglas y errores)
+
+        self.addresses = {}  # id(FuncDecl) -> dirección (índice en funcs)
+        self.static_funcs = {}  # nombre -> FuncDecl si nada más lo asigna
+        self.lines = []
+
+    def add_global(self, name):
+        if name not in self.symbols:
+            self.symbols[name] = len(self.names)
+            self.names.append(name)
+        return self.symbols[name]
+
+    def emit(self, line, depth):
+        self.lines.append("    " * depth + line)
+
+    # --- Programa ---
+    def generate(self, program):
+        self.func_locals = ScopeResolver().resolve(program)
+        self.types = TypeInference().analyze(program)
+        self.checker.types = self.types
+
+        decls = []
+        assigned = set()
+        self.collect(program.body, decls, assigned)
+        for number, func in enumerate(decls, 1):
+            self.addresses[id(func)] = number  # 0 no es dirección válida (es falsy)
+        counts = {}
+        for func in decls:
+            counts[func.name] = counts.get(func.name, 0) + 1
+        self.static_funcs = {func.name: func for func in decls
+                             if counts[func.name] == 1 and func.name not in assigned}
+
+        self.emit("def build(env):", 0)
+        for name in RUNTIME_NAMES:
+            self.emit(f"{name} = env[{name!r}]", 1)
+        self.emit("depth = 0", 1)
+        self.emit("ticks = 0", 1)
+
+        for func in decls:
+            self.gen_function(func)
+
+        self.emit("def init():", 1)
+        self.emit("nonlocal ticks", 2)
+        self.locals = set()
+        self.gen_block(program.body, 2)
+
+        self.emit("def enter(fn):", 1)
+        self.emit("nonlocal depth, ticks", 2)
+        self.emit("depth = ticks = 0", 2)
+        self.emit("return fn()", 2)
+
+        for func in decls:
+            number = self.addresses[id(func)]
+            self.emit(f"funcs[{number}] = f_{number}", 1)
+        self.emit("return init, enter, funcs", 1)
+        return "\n".join(self.lines) + "\n"
+
+    def collect(self, nodes, decls, assigned):
+        """FuncDecl de todo el programa (también anidadas) y nombres asignados"""
+        for node in nodes:
+            if isinstance(node, FuncDecl):
+                decls.append(node)
+                self.collect(node.body, decls, assigned)
+            elif isinstance(node, Assign):
+                assigned.add(node.name)
+            elif isinstance(node, If):
+                self.collect(node.body, decls, assigned)
+                self.collect(node.else_body or [], decls, assigned)
+            elif isinstance(node, While):
+                self.collect(node.body, decls, assigned)
+
+    def gen_function(self, func):
+        """Mismo marco que CALL + ENTER: argumentos de más se ignoran, los que faltan valen 0.0"""
+        number = self.addresses[id(func)]
+        local_names = self.func_locals.get(id(func), func.params)
+        self.locals = set(local_names)
+
+        params = "".join(f"l_{name}=0.0, " for name in func.params)
+        self.emit(f"def f_{number}({params}*_):", 1)
+        self.emit("nonlocal depth, ticks", 2)
+        self.emit("if depth >= MAX_DEPTH: overflow()", 2)
+        self.emit("depth += 1", 2)
+        self.emit("try:", 2)
+        self.gen_block(func.body, 3)
+        self.emit("finally:", 2)
+        self.emit("depth -= 1", 3)
+        self.locals = set()
+
+    # --- Statements ---
+    def gen_block(self, nodes, depth):
+        start = len(self.lines)
+        for node in nodes:
+            self.gen_stmt(node, depth)
+        if len(self.lines) == start:
+            self.emit("pass", depth)
+
+    def gen_stmt(self, node, depth):
+        if isinstance(node, FuncDecl):
+            self.emit(f"G[{self.add_global(node.name)}] = {self.addresses[id(node)]}", depth)
+        elif isinstance(node, Assign):
+            self.emit(f"{self.target(node.name)} = {self.gen(node.value)}", depth)
+        elif isinstance(node, If):
+            self.emit(f"if {self.gen(node.cond)}:", depth)
+            self.gen_block(node.body, depth + 1)
+            if node.else_body:
+                self.emit("else:", depth)
+                self.gen_block(node.else_body, depth + 1)
+        elif isinstance(node, While):
+            self.emit(f"while {self.gen(node.cond)}:", depth)
+            self.emit("ticks += 1", depth + 1)
+            self.emit("if ticks > MAX_TICKS: timeout()", depth + 1)
+            self.gen_block(node.body, depth + 1)
+        elif isinstance(node, Return):
+            self.emit(f"return {self.gen(node.value) if node.value else 'None'}", depth)
+        elif isinstance(node, Call):
+            self.emit(self.gen_Call(node, discard=True), depth)
+        else:
+            self.emit(self.gen(node), depth)  # Expresión suelta: se evalúa y se descarta
+
+    def target(self, name):
+        return f"l_{name}" if name in self.locals else f"G[{self.add_global(name)}]"
+
+    # --- Expresiones ---
+    def gen(self, node):
+        method = getattr(self, f"gen_{type(node).__name__}", None)
+        if method is None:
+            raise NotImplementedError(f"No se sabe generar {type(node).__name__}")
+        return method(node)
+
+    def gen_Number(self, node):
+        if math.isfinite(node.value):
+            return repr(node.value)
+        self.consts.append(node.value)
+        return f"K[{len(self.consts) - 1}]"
+
+    def gen_String(self, node):
+        return repr(node.value)
+
+    def gen_Var(self, node):
+        return self.target(node.name)
+
+    def gen_UnaryOp(self, node):
+        value = self.gen(node.value)
+        if node.op != '-':
+            return value  # El Compiler solo emite NEG para '-'
+        if self.types.kind(node.value) in NUMERIC_KINDS:
+            return f"(-{value})"
+        return f"rt_neg({value})"
+
+    def gen_BinaryOp(self, node):
+        if node.op not in BINARY_OPS:
+            raise SyntaxError(f"Operador desconocido: {node.op}")
+        left, right = self.gen(node.left), self.gen(node.right)
+        inline, helper = BINARY_OPS[node.op]
+        if helper is None or self.proven(node):
+            return inline.format(left, right)
+        return f"{helper}({left}, {right})"
+
+    def proven(self, node):
+        """True si la operación no puede fallar ni cambiar de semántica con los tipos probados"""
+        left, right = self.types.kind(node.left), self.types.kind(node.right)
+        numeric = left in NUMERIC_KINDS and right in NUMERIC_KINDS
+        if node.op in ('/', '%'):
+            # Además hay que descartar el divisor 0
+            return numeric and isinstance(node.right, Number) and node.right.value != 0
+        if node.op in ('-', '*'):
+            return numeric
+        return numeric or (left == STR and right == STR)  # '+' y comparaciones
+
+    def gen_Call(self, node, discard=False):
+        if node.name in SYS_SPECS:
+            required = SYS_SPECS[node.name]["min_args"]
+            given = len(node.args)
+            if given < required:
+                raise SyntaxError(f"'{node.name}' necesita {required} args, diste {given}")
+
+        args = [self.gen(arg) for arg in node.args]
+        if node.name in SYS_FUNCTIONS:
+            return self.gen_sys(node, args, discard)
+
+        joined = ", ".join(args)
+        if node.name in self.locals:
+            return f"resolve(l_{node.name})({joined})"
+        slot = self.add_global(node.name)
+        func = self.static_funcs.get(node.name)
+        if func is not None:
+            # Único FuncDecl con ese nombre: mientras el slot tenga su dirección
+            # se llama directo, sin resolver
+            number = self.addresses[id(func)]
+            return f"(f_{number} if G[{slot}] == {number} else resolve(G[{slot}]))({joined})"
+        return f"resolve(G[{slot}])({joined})"
+
+    def gen_sys(self, node, args, discard):
+        name = node.name
+        argc = len(args)
+        mask = self.checker.sys_check_mask(node)
+        helper, direct_argc = DIRECT_SYS.get(name, (None, ()))
+
+        if mask or argc not in direct_argc:
+            site = len(self.sys_sites)
+            self.sys_sites.append((SYS_FUNCTIONS[name], argc, mask))
+            return f"sys_call({SYS_FUNCTIONS[name]}, CHK[{site}], ({''.join(a + ', ' for a in args)}))"
+
+        if name == "btn":
+            return f"(1 if hw_btn(int({args[0]})) else 0)"
+        if name == "mget":
+            return f"hw_mget({args[0]}, {args[1]})"
+        if name == "print":
+            is_small = f"{args[4]} == 1" if argc == 5 else "False"
+            call = f"hw_print(str({args[0]}), {args[1]}, {args[2]}, {args[3]}, {is_small})"
+        else:
+            call = f"{helper}({', '.join(args)})"
+        # Como valor, toda SYS call deja 0 (salvo btn y mget)
+        return call if discard else f"({call}, 0)[1]"
+
+
+class NativeVM(SparkVM):
+    """
+    SparkVM con el backend nativo: load_source/load_program generan y
+    compilan el código Python; run, step, begin_call, resume y
+    call_function lo ejecutan con la misma interfaz que los motores de
+    bytecode (FrameScheduler y main la usan igual).
+
+    load() con bytecode sigue funcionando (motor "table"): es el camino
+    para cartuchos sin código fuente.
+    """
+    ENGINE = "native"
+
+    # Vueltas de bucle por llamada desde el host antes de cortar (no hay
+    # presupuesto de ciclos que permita suspender un bucle infinito)
+    MAX_LOOP_TICKS = 2_000_000
+
+    def __init__(self, hardware=None, names=()):
+        self.python_source = None  # Código generado (para depuración)
+        self._native_code = None
+        self._native = None  # (init, enter, funcs) del último _bind
+        self._native_call = None  # Función pendiente de begin_call
+        self._sys_sites = []
+        self._consts = []
+        super().__init__([], [], hardware=hardware, names=names)
+
+    @property
+    def native(self):
+        return self._native is not None
+
+    # --- Carga ---
+    def load_source(self, source_code, tokens=None):
+        """Lexer -> Parser -> ASTOptimizer -> PythonCodeGen. Los errores de sintaxis se propagan."""
+        if tokens is None:
+            tokens = Lexer(source_code)
+        program = ASTOptimizer().optimize(Parser(tokens).parse())
+        self.load_program(program)
+
+    def load_program(self, program):
+        gen = PythonCodeGen()
+        self.python_source = gen.generate(program)
+        self._native_code = compile(self.python_source, "<spark-native>", "exec")
+        self._sys_sites = gen.sys_sites
+        self._consts = gen.consts
+
+        self.code = []
+        self.consts = []
+        self._install_symbols(gen.names)
+        self.reset()
+        self._bind()
+
+    def load(self, bytecode, constants, names=()):
+        self.python_source = self._native_code = self._native = None
+        super().load(bytecode, constants, names)
+
+    def _bind(self):
+        """Ejecuta build() con el hardware y las globales actuales"""
+        hw = self.hardware
+        funcs = {}
+        env = {
+            "G": self.globals, "K": self._consts,
+            "CHK": [self._syscall_checks(*site) for site in self._sys_sites],
+            "funcs": funcs, "resolve": self._make_resolve(funcs), "sys_call": self._native_syscall,
+            "overflow": self._overflow, "timeout": self._timeout,
+            "MAX_DEPTH": self.MAX_CALL_DEPTH, "MAX_TICKS": self.MAX_LOOP_TICKS,
+        }
+        for name in RUNTIME_NAMES:
+            if name.startswith("rt_"):
+                env[name] = globals()[name]
+        for name, method in HW_METHODS.items():
+            env[name] = getattr(hw, method) if hw else rt_no_call
+        namespace = {}
+        exec(self._native_code, namespace)
+        self._native = namespace["build"](env)
+
+    @SparkVM.hardware.setter
+    def hardware(self, hardware):
+        SparkVM.hardware.fset(self, hardware)
+        if getattr(self, "_native_code", None) is not None:
+            self._bind()  # Las SYS calls quedan enlazadas al hardware nuevo
+
+    def _make_resolve(self, funcs):
+        def resolve(target):
+            """Destino de una llamada de usuario, con las mismas reglas que SparkVM._call"""
+            if isinstance(target, str):
+                target = self.get_global(target, None)
+            if type(target) is int:
+                return funcs.get(target, rt_no_call)
+            return rt_no_call
+        return resolve
+
+    def _native_syscall(self, sys_id, checks, args):
+        name, handler, _ = self._syscalls.get(sys_id, (None, self._sys_nop, ()))
+        for i, arg_type, check in checks:
+            if not check(args[i]):
+                raise SparkRuntimeError(f"'{name}' arg {i + 1}: expected {arg_type}, got {type(args[i]).__name__}")
+        return handler(args)
+
+    @staticmethod
+    def _overflow():
+        raise SparkRuntimeError("Stack Overflow (CALL)")
+
+    def _timeout(self):
+        raise SparkRuntimeError(f"Timeout: más de {self.MAX_LOOP_TICKS} vueltas de bucle en una llamada")
+
+    # --- Ejecución ---
+    def _run_native(self, fn):
+        enter = self._native[1]
+        try:
+            enter(fn)
+        except SparkRuntimeError as e:
+            self._error(str(e))
+        except RecursionError:
+            self._error("Stack Overflow (CALL)")
+        except Exception as e:
+            self._error(f"CPU Exception: {e}")
+
+    def reset(self):
+        super().reset()
+        self._native_call = None
+
+    def run(self):
+        if not self.native:
+            return super().run()
+        if not self.halted:
+            self._run_native(self._native[0])
+            self.halted = True  # Como al llegar al HALT final
+
+    def step(self, max_cycles=60):
+        # El cuerpo principal no se ejecuta por instrucciones: corre entero
+        if not self.native:
+            return super().step(max_cycles)
+        self.run()
+
+    def begin_call(self, func_name):
+        if not self.native:
+            return super().begin_call(func_name)
+        addr = self.get_global(func_name, None)
+        fn = self._native[2].get(addr) if type(addr) is int else None
+        if fn is None:
+            return False
+        self._native_call = fn
+        self.halted = False
+        return True
+
+    def resume(self, max_cycles=None):
+        """Sin suspensión: la llamada pendiente corre hasta el final"""
+        if not self.native:
+            return super().resume(max_cycles)
+        fn, self._native_call = self._native_call, None
+        if fn is not None:
+            self._run_native(fn)
+        return True
+
+
+# Motores que aceptan main y headless (--engine)
+ENGINES = SparkVM.ENGINES + (NativeVM.ENGINE,)
+
+
+def create_vm(engine="table", hardware=None):
+    """SparkVM del motor pedido (NativeVM para "native")"""
+    if engine == NativeVM.ENGINE:
+        return NativeVM(hardware=hardware)
+    return SparkVM([], [], hardware=hardware, engine=engine)
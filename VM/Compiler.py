@@ -1,29 +1,62 @@
+from VM.Bytecode import encode
 from VM.Data import *
 from VM.Opcodes import *
+from VM.Scope import ScopeResolver
 from VM.SystemSpecs import *
+from VM.Types import NUMERIC_TYPES, NUM, STR, TypeInference
 
 
 class Compiler:
     def __init__(self):
-        self.code = []  # Aquí guardamos los bytes (enteros)
+        self.code = []  # Palabras (enteros) hasta assemble(), después bytes
         self.consts = []  # Aquí guardamos los valores (números, strings)
         self.const_map = {}  # Para no repetir constantes idénticas
+        self.address_consts = []  # Índices de constantes que guardan direcciones de código
 
-    def emit(self, opcode, operand=None):
+        # Tabla de símbolos de globales: nombre -> slot (y slot -> nombre)
+        self.symbols = {}
+        self.names = []
+
+        # Locales: {id(FuncDecl): [nombres]} y los de la función que se compila
+        self.func_locals = {}
+        self.locals = {}  # nombre -> offset en el frame (vacío fuera de funciones)
+
+        # Tipos probados en compilación (para no validarlos en cada SYS)
+        self.types = TypeInference()
+
+    def emit(self, opcode, *operands):
         """Ayuda a escribir en la lista de código"""
         self.code.append(opcode)
-        if operand is not None:
-            self.code.append(operand)
+        self.code.extend(operands)
+
+    def assemble(self):
+        """
+        Pasa self.code de lista de palabras a bytecode compacto (bytearray,
+        ver VM/Bytecode.py). Va al final: después ya no se puede emitir ni
+        pasar el PeepholeOptimizer.
+        """
+        self.code = encode(self.code, self.consts, self.address_consts)
+        return self.code
 
     def add_const(self, value):
         """Agrega una constante y devuelve su índice"""
-        if value in self.const_map:
-            return self.const_map[value]
+        # Clave por tipo y repr: 0.0 y -0.0 (o 1.0 y True) son iguales para
+        # un dict pero no para la VM ("v" + -0 da "v-0.0")
+        key = (type(value), repr(value))
+        if key in self.const_map:
+            return self.const_map[key]
         idx = len(self.consts)
         self.consts.append(value)
-        self.const_map[value] = idx
+        self.const_map[key] = idx
         return idx
 
+    def add_global(self, name):
+        """Devuelve el slot (índice denso) de una variable global"""
+        if name not in self.symbols:
+            self.symbols[name] = len(self.names)
+            self.names.append(name)
+        return self.symbols[name]
+
     def compile(self, node):
         """Dispatcher principal: mira el tipo de nodo y llama a su función"""
         method_name = f'compile_{type(node).__name__}'
@@ -36,6 +69,9 @@ class Compiler:
     # --- Visitantes de Nodos ---
     def compile_block(self, nodes):
         for node in nodes:
+            if isinstance(node, Call) and node.name in SYS_FUNCTIONS:
+                self.compile_Call(node, discard=True)  # SYS_POP: sin POP aparte
+                continue
             self.compile(node)
             if isinstance(node, (Call, BinaryOp, UnaryOp, Number, String, Var)):
                 self.emit(POP)
@@ -43,6 +79,8 @@ class Compiler:
                 pass
 
     def compile_Program(self, node):
+        self.func_locals = ScopeResolver().resolve(node)
+        self.types = TypeInference().analyze(node)
         self.compile_block(node.body)
         self.emit(HALT)
 
@@ -55,13 +93,28 @@ class Compiler:
         self.emit(LOAD_CONST, idx)
 
     def compile_Var(self, node):
-        idx = self.add_const(node.name)  # Guardamos el nombre de la variable como const
-        self.emit(LOAD_VAR, idx)
+        if node.name in self.locals:
+            self.emit(LOAD_LOCAL, self.locals[node.name])
+        else:
+            self.emit(LOAD_VAR, self.add_global(node.name))
 
     def compile_Assign(self, node):
+        # Superinstrucción: x = x + <número> -> INC_VAR / INC_LOCAL
+        value = node.value
+        if isinstance(value, BinaryOp) and value.op == '+' and isinstance(value.left, Var) \
+                and value.left.name == node.name and isinstance(value.right, Number):
+            step = self.add_const(value.right.value)
+            if node.name in self.locals:
+                self.emit(INC_LOCAL, self.locals[node.name], step)
+            else:
+                self.emit(INC_VAR, self.add_global(node.name), step)
+            return
+
         self.compile(node.value)  # 1. Compilar el valor (se pone en stack)
-        idx = self.add_const(node.name)  # 2. Obtener índice del nombre
-        self.emit(STORE_VAR, idx)  # 3. Guardar
+        if node.name in self.locals:  # 2. Guardar en el frame o en su slot global
+            self.emit(STORE_LOCAL, self.locals[node.name])
+        else:
+            self.emit(STORE_VAR, self.add_global(node.name))
 
     def compile_BinaryOp(self, node):
         self.compile(node.left)
@@ -83,9 +136,29 @@ class Compiler:
 
     # --- Control de Flujo (La parte interesante) ---
 
+    def match_var_compare(self, cond):
+        """
+        Reconoce 'var <cmp> literal'.
+        Devuelve (opcode_si_falso, opcode_si_verdadero, operandos) o None.
+        """
+        cmp_map = {'==': EQ, '~=': NEQ, '<': LT, '<=': LTE, '>': GT, '>=': GTE}
+        if isinstance(cond, BinaryOp) and cond.op in cmp_map and isinstance(cond.left, Var) \
+                and isinstance(cond.right, (Number, String)):
+            name = cond.left.name
+            const = self.add_const(cond.right.value)
+            if name in self.locals:
+                return CMP_LOCAL_JMP_FALSE, CMP_LOCAL_JMP_TRUE, (cmp_map[cond.op], self.locals[name], const)
+            return CMP_JMP_FALSE, CMP_JMP_TRUE, (cmp_map[cond.op], self.add_global(name), const)
+        return None
+
     def compile_If(self, node):
-        self.compile(node.cond)
-        self.emit(JMP_IF_FALSE, 0)
+        fused = self.match_var_compare(node.cond)
+        if fused:
+            jmp_false, _, operands = fused
+            self.emit(jmp_false, *operands, 0)
+        else:
+            self.compile(node.cond)
+            self.emit(JMP_IF_FALSE, 0)
         jump_else = len(self.code) - 1
 
         self.compile_block(node.body)
@@ -101,6 +174,21 @@ class Compiler:
             self.code[jump_else] = len(self.code)
 
     def compile_While(self, node):
+        fused = self.match_var_compare(node.cond)
+        if fused:
+            # Bucle invertido: la condición se repite al final con un solo
+            # CMP_JMP_TRUE, así cada vuelta cuesta una instrucción de control
+            jmp_false, jmp_true, operands = fused
+            self.emit(jmp_false, *operands, 0)
+            exit_jump_idx = len(self.code) - 1
+            body_start = len(self.code)
+
+            self.compile_block(node.body)
+
+            self.emit(jmp_true, *operands, body_start)
+            self.code[exit_jump_idx] = len(self.code)
+            return
+
         loop_start = len(self.code)
         self.compile(node.cond)
         self.emit(JMP_IF_FALSE, 0)
@@ -118,7 +206,7 @@ class Compiler:
             self.emit(LOAD_CONST, self.add_const(None))  # Return nil/None por defecto
         self.emit(RET)
 
-    def compile_Call(self, node):
+    def compile_Call(self, node, discard=False):
         if node.name in SYS_SPECS:
             required = SYS_SPECS[node.name]["min_args"]
             given = len(node.args)
@@ -133,32 +221,65 @@ class Compiler:
         # 2. Verificar si es una System Call (Optimización de hardware)
         if node.name in SYS_FUNCTIONS:
             sys_id = SYS_FUNCTIONS[node.name]
-            # Emitimos SYS con el ID y la cantidad de argumentos
-            self.emit(SYS, sys_id)
-            self.emit(len(node.args))
+            # Emitimos SYS con el ID, la cantidad de argumentos y qué argumentos
+            # validar en runtime (SYS_POP si el resultado se descarta)
+            self.emit(SYS_POP if discard else SYS, sys_id, len(node.args), self.sys_check_mask(node))
         else:
-            # Llamada de usuario normal
-            idx = self.add_const(node.name)
-            self.emit(LOAD_VAR, idx)
+            # Llamada de usuario normal: el destino se carga encima de los argumentos
+            self.compile_Var(Var(node.name))
             self.emit(CALL, len(node.args))
 
+    def sys_check_mask(self, node):
+        """
+        Bit i encendido = el argumento i se valida en runtime.
+        Los que se pueden probar aquí no cuestan nada por llamada; un literal
+        del tipo equivocado es un error de compilación.
+        """
+        expected = SYS_SPECS.get(node.name, {}).get("args", [])
+        mask = 0
+        for i, (arg, arg_type) in enumerate(zip(node.args, expected)):
+            if arg_type in NUMERIC_TYPES:
+                proven = self.types.kind(arg) == NUM
+            elif arg_type == "str":
+                proven = self.types.kind(arg) == STR
+            else:
+                continue  # "any"
+
+            if proven:
+                continue
+            if isinstance(arg, (Number, String)):
+                raise SyntaxError(f"'{node.name}' arg {i + 1}: expected {arg_type}, got {type(arg.value).__name__}")
+            mask |= 1 << i
+        return mask
+
     def compile_FuncDecl(self, node):
         self.emit(JMP, 0)
         jump_idx = len(self.code) - 1
         start_addr = len(self.code)
 
-        if node.params:
-            for param_name in reversed(node.params):
-                idx = self.add_const(param_name)
-                self.emit(STORE_VAR, idx)
+        # Frame: parámetros en los primeros offsets y luego los temporales.
+        # CALL deja los argumentos en el stack y ENTER reserva el resto.
+        local_names = self.func_locals.get(id(node), node.params)
+        outer_locals = self.locals
+        self.locals = {name: offset for offset, name in enumerate(local_names)}
+        self.emit(ENTER, len(node.params), len(local_names))
 
         self.compile_block(node.body)
 
-        if not self.code or self.code[-1] != RET:
+        # Se mira el AST y no self.code[-1]: el último entero puede ser un
+        # operando que valga 41, o un RET dentro de un if que no siempre se toma
+        if not (node.body and isinstance(node.body[-1], Return)):
             self.emit(LOAD_CONST, self.add_const(None))
             self.emit(RET)
 
+        self.locals = outer_locals
         self.code[jump_idx] = len(self.code)
 
-        self.emit(LOAD_CONST, self.add_const(start_addr))
-        self.emit(STORE_VAR, self.add_const(node.name))
\ No newline at end of file
+        # La dirección va en su propia constante (sin deduplicar contra
+        # literales numéricos) para que los optimizadores puedan reubicarla
+        addr_idx = len(self.consts)
+        self.consts.append(start_addr)
+        self.address_consts.append(addr_idx)
+
+        self.emit(LOAD_CONST, addr_idx)
+        self.emit(STORE_VAR, self.add_global(node.name))
\ No newline at end of file
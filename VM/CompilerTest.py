@@ -81,18 +81,21 @@ if __name__ == "__main__":
             # Hacemos el debug más bonito mostrando el valor real
             val_str = ""
             if op == LOAD_CONST: val_str = f"({compiler.consts[arg]})"
-            if op in [LOAD_VAR, STORE_VAR]: val_str = f"('{compiler.consts[arg]}')"
+            if op in [LOAD_VAR, STORE_VAR]: val_str = f"('{compiler.names[arg]}')"
             if op in [JMP, JMP_IF_FALSE]: val_str = f"(addr {arg})"
 
             print(f"{i:03}: {name:<14} {arg} {val_str}")
             i += 2
         else:
-            print(f"{i:03}: {name:<14}")
-            i += 1
+            # Resto de instrucciones (SYS, superinstrucciones...): operandos crudos
+            argc = OP_ARGC.get(op, 0)
+            args = " ".join(str(a) for a in compiler.code[i + 1:i + 1 + argc])
+            print(f"{i:03}: {name:<14} {args}")
+            i += 1 + argc
 
     # 4. Execution
     print("\n=== 4. VM RUNTIME TRACE ===")
-    vm = SparkVM(compiler.code, compiler.consts)
+    vm = SparkVM(compiler.code, compiler.consts, names=compiler.names)
 
     cycles = 0
     print(f"{'CICLO':<6} | {'OPCODE':<12} | {'STACK (Top derecha)'}")
@@ -115,13 +118,13 @@ if __name__ == "__main__":
             break
 
     print("\n=== 5. ESTADO FINAL DE MEMORIA (RAM) ===")
-    for var, val in vm.globals.items():
+    for var, val in vm.globals_dict().items():
         print(f"{var}: {val}")
 
     print(f"\nCiclos totales usados: {cycles}")
 
     # Verificación automática del Test
-    if vm.globals.get("fact") == 120 and vm.globals.get("result") == 1:
+    if vm.get_global("fact") == 120 and vm.get_global("result") == 1:
         print("\nSUCCESS: ¡Todas las pruebas pasaron correctamente!")
     else:
         print("\nFAILURE: Algo falló en la lógica.")
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Equivalencia entre motores: el mismo cartucho tiene que dejar las mismas
+globales, la misma VRAM y el mismo runtime_error en classic, table,
+threaded (bytecode) y native (CodeGen).
+
+    python -m VM.EngineTest
+"""
+import re
+
+from BIOS import BIOS_SOURCE
+from VM.CodeGen import NativeVM, create_vm
+from VM.Hardware import HeadlessHardware
+from VM.Pipeline import compile_source
+from VM.Scheduler import FrameScheduler
+from VM.Testing import run_tests
+from VM.VirtualMachine import SparkVM
+
+BYTECODE_ENGINES = SparkVM.ENGINES
+ENGINES = BYTECODE_ENGINES + (NativeVM.ENGINE,)
+
+PROGRAMS = {
+    "aritmetica": """
+    val = (10 + 2) * -2
+    abs_val = 0
+    if val < 0 then
+        abs_val = val * -1
+    end
+    n = 5
+    fact = 1
+    while n > 0 do
+        fact = fact * n
+        n = n - 1
+    end
+    q = 160 / 32 - -(2)
+    z = 7 % 3
+    s = "hi" + 3
+    c = (1 < 2) + 1
+    """,
+    "funciones": """
+    function add(a, b)
+        return a + b
+    end
+    function fib(n)
+        if n < 2 then
+            return n
+        end
+        return fib(n - 1) + fib(n - 2)
+    end
+    function apply(f, v)
+        return f(v)
+    end
+    function twice(x)
+        return x * 2
+    end
+    t = fib(12)
+    r = apply(twice, 21)
+    u = add(1)
+    w = add(1, 2, 3)
+    """,
+    "dibujo": """
+    frame = 0
+    function update()
+        frame = frame + 1
+        mset(frame % 4, 0, frame % 16)
+    end
+    function draw()
+        cls()
+        i = 0
+        while i < 40 do
+            spr(i, i * 4 - 3, i * 3 - 2)
+            pset(i * 3, 100 + i, i)
+            i = i + 1
+        end
+        map(0, 0, 0, 120, 4, 1)
+        rectfill(10, 10, 30, 20, 8)
+        circ(80, 80, 10 + frame % 5, 12)
+        line(0, 159, 159, 0, 7)
+        print("HELLO " + frame, 5, 150, 9)
+        print("small", -3, 140, 40, 1)
+    end
+    """,
+    "cero_negativo": """
+    x = 0
+    y = -0
+    z = "v" + y
+    a = y * 1
+    b = y - 0
+    c = y + 0
+    d = "v" + (x * -1 + 0)
+    e = "v" + (x * -1 - -0)
+    f = "v" + (x * -1 - 0)
+    """,
+    "bios": BIOS_SOURCE,
+}
+
+# Programas que terminan en runtime_error: el texto tiene que ser el mismo
+ERRORS = {
+    "div0": ("x = 0\ny = 5 / x", "Division by Zero"),
+    "mod0": ("x = 0\ny = 5 % x", "Modulo by Zero"),
+    "strsub": ('x = "a"\ny = x - 1', "Math Error"),
+    "compare": ('x = "a"\ny = x < 1', "Cannot compare"),
+    "negate": ('x = "a"\ny = -x', "Cannot negate non-number"),
+    "recursion": ("function f(n)\n return f(n + 1)\nend\nf(0)", "Stack Overflow (CALL)"),
+    "sysarg": ('x = "a"\npset(x, 1, 2)', "'pset' arg 1"),
+    "en_draw": ("function draw()\n d = 0\n pset(1, 1, 4 / d)\nend", "Division by Zero"),
+}
+
+
+def function_names(source):
+    # Las direcciones de función dependen del motor: no se comparan
+    return set(re.findall(r"function\s+(\w+)", source))
+
+
+def load_vm(engine, source, hw):
+    vm = create_vm(engine, hw)
+    if engine == NativeVM.ENGINE:
+        vm.load_source(source)
+    else:
+        program, _ = compile_source(source)
+        vm.load(program.code, program.consts, program.names)
+    return vm
+
+
+def run_program(engine, source, frames=3, budget=None):
+    """
+    Inicialización + frames con FrameScheduler.
+    Devuelve (globales, CRC de la VRAM al cerrar cada tick, runtime_error).
+    """
+    hw = HeadlessHardware()
+    vm = load_vm(engine, source, hw)
+    vm.run()
+    ticks = []
+    if not vm.runtime_error:
+        vm.halted = False
+        scheduler = FrameScheduler(vm, budget=budget)
+        for _ in range(frames):
+            if scheduler.run_frame():
+                ticks.append(hw.framebuffer_checksum())
+            if vm.runtime_error:
+                break
+    skip = function_names(source)
+    state = {k: v for k, v in vm.globals_dict().items() if k not in skip}
+    return state, ticks, vm.runtime_error
+
+
+def assert_same(results):
+    # Por repr: 0.0 == -0.0 y 1 == 1.0, pero los motores tienen que dar el mismo valor
+    first_engine, first = next(iter(results.items()))
+    for engine, result in results.items():
+        assert repr(result) == repr(first), f"{engine} != {first_engine}:\n  {result}\n  {first}"
+
+
+def test_programs_agree():
+    for name, source in PROGRAMS.items():
+        results = {engine: run_program(engine, source) for engine in ENGINES}
+        assert_same(results)
+        assert results["table"][2] is None, (name, results["table"][2])
+
+
+def test_runtime_errors_agree():
+    for name, (source, expected) in ERRORS.items():
+        results = {engine: run_program(engine, source) for engine in ENGINES}
+        assert_same(results)
+        error = results["table"][2]
+        assert error and expected in error, (name, error)
+
+
+def test_small_budget_ticks():
+    # Con un presupuesto chico update/draw se suspenden y retoman en varios
+    # frames; cada tick completo tiene que dejar la misma VRAM que sin límite
+    source = PROGRAMS["dibujo"]
+    _, reference, _ = run_program(NativeVM.ENGINE, source, frames=150)
+    for budget in (7, 60, 333):
+        results = {engine: run_program(engine, source, frames=400, budget=budget)
+                   for engine in BYTECODE_ENGINES}
+        assert_same(results)
+        ticks = results["table"][1]
+        assert len(ticks) >= 2 and ticks == reference[:len(ticks)], budget
+
+
+def test_native_loop_timeout():
+    # Sin presupuesto de ciclos, native corta el bucle infinito con un error;
+    # los motores de bytecode lo suspenden frame a frame
+    source = "function update()\n n = 0\n while 1 == 1 do\n  n = n + 1\n end\nend"
+    hw = HeadlessHardware()
+    vm = NativeVM(hardware=hw)
+    vm.MAX_LOOP_TICKS = 1000
+    vm.load_source(source)
+    vm.run()
+    vm.halted = False
+    FrameScheduler(vm).run_frame()
+    assert vm.runtime_error == "RUNTIME ERR: Timeout: más de 1000 vueltas de bucle en una llamada", vm.runtime_error
+    assert vm.halted
+
+    for engine in BYTECODE_ENGINES:
+        vm = load_vm(engine, source, HeadlessHardware())
+        vm.run()
+        vm.halted = False
+        scheduler = FrameScheduler(vm, budget=500)
+        scheduler.run_frame()
+        assert scheduler.suspended and not vm.runtime_error, (engine, vm.runtime_error)
+
+
+TESTS = [test_programs_agree, test_runtime_errors_agree, test_small_budget_ticks, test_native_loop_timeout]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
@@ -1,9 +1,19 @@
+import os
+import zlib
+
 import pygame
 
-from VM.SparkFont import SparkFont
+from VM.SpriteCache import SpriteCache
+from VM.TextCache import TextCache
+from VM.TileMap import TileMap
 
 
 class SparkHardware:
+    # FPS para clock.tick (0 = sin límite)
+    FPS = 60
+    # Filas limpias entre dos franjas sucias por debajo de las cuales se unen
+    DAMAGE_GAP = 4
+
     def __init__(self, scale=4):
         pygame.init()
 
@@ -19,16 +29,11 @@ class SparkHardware:
 
         # 1. La Ventana Física (Lo que ve el usuario)
         window_size = (self.WIDTH * self.SCALE, self.HEIGHT * self.SCALE)
-        self.window = pygame.display.set_mode(window_size)
-        pygame.display.set_caption("Spark Fantasy Console")
-
-        # 2. La VRAM (Buffer interno de 160x160)
-        self.screen = pygame.Surface((self.WIDTH, self.HEIGHT))
-        self.screen.fill((0, 0, 0))  # Limpiar pantalla inicial
+        self.window = self._create_window(window_size)
 
         self.editor_screen = pygame.Surface((self.ED_WIDTH, self.ED_HEIGHT))
 
-        # 3. Paleta de Colores (32 colores fijos)
+        # 2. Paleta de Colores (32 colores fijos)
         # Usamos una lista de tuplas (R, G, B)
         self.palette = [
             (0, 0, 0), (29, 43, 83), (126, 37, 83), (0, 135, 81),
@@ -41,17 +46,106 @@ class SparkHardware:
             (150, 240, 255), (180, 150, 255), (255, 150, 200), (200, 150, 100)
         ]
 
-        self.spritesheet = pygame.Surface((128,128))
+        # 3. La VRAM: 160x160 índices de paleta, 1 byte por pixel (25.6 KB)
+        self.vram = bytearray(self.WIDTH * self.HEIGHT)
+        # La misma memoria vista como Surface de 8 bits: blits y fills de
+        # pygame escriben índices directamente en self.vram.
+        # (self.vram nunca se reasigna, solo se modifica en el lugar)
+        self.vram_surface = pygame.image.frombuffer(self.vram, (self.WIDTH, self.HEIGHT), "P")
+        self.vram_surface.set_palette(self.palette)
+        # Filas de un solo color para las primitivas de relleno (spans)
+        self._spans = [bytes([c]) * self.WIDTH for c in range(len(self.palette))]
+
+        # 4. Pantalla RGB: la VRAM se expande aquí una vez por frame (present)
+        self.screen = pygame.Surface((self.WIDTH, self.HEIGHT))
+        self.screen.fill((0, 0, 0))  # Limpiar pantalla inicial
+        # Copia de la VRAM tal como quedó en self.screen: present() compara
+        # contra ella y solo expande las filas que cambiaron
+        self._presented = bytearray(self.vram)
+
+        # Texto pre-renderizado (atlas de glifos + strings completos)
+        self.text_cache = TextCache(self.palette)
+
+        # Spritesheet indexada como la VRAM: blit 8 bits -> 8 bits sin conversión
+        self.spritesheet = pygame.Surface((128, 128), depth=8)
+        self.spritesheet.set_palette(self.palette)
         self.clock = pygame.time.Clock()
         self.running = True
         self._gen_debug_sprites()
 
+        # Sprites pre-recortados (y sus variantes) + lote de blits pendientes.
+        # spr() solo encola; el lote se vuelca a la VRAM con un único
+        # Surface.blits antes de cualquier otra escritura o lectura de la VRAM
+        self.sprite_cache = SpriteCache(self.spritesheet, self.palette)
+        self._sprite_batch = []
+        # Paleta de dibujo de sprites (pal): None = identidad
+        self._draw_pal = list(range(256))
+        self._pal_table = None
+
+        # Tilemap 128x128 (IDs de sprite) con chunks pre-renderizados
+        self.tilemap = TileMap(self.sprite_cache, self.palette)
+
+    def _create_window(self, size):
+        window = pygame.display.set_mode(size)
+        pygame.display.set_caption("Spark Fantasy Console")
+        return window
+
+    def framebuffer_checksum(self):
+        """CRC32 de la VRAM de juego (para comparar frames entre ejecuciones)"""
+        if self._sprite_batch: self.flush_sprites()
+        return zlib.crc32(self.vram)
+
+    def damage(self):
+        """
+        Franjas de la VRAM que cambiaron desde el último present(), como
+        Rects de ancho completo (coordenadas 160x160). Lista vacía si el
+        frame es idéntico. Filas separadas por pocas filas limpias se unen.
+        """
+        if self._sprite_batch: self.flush_sprites()
+        cur, old = self.vram, self._presented
+        if cur == old:
+            return []
+
+        w, gap = self.WIDTH, self.DAMAGE_GAP
+        cur, old = memoryview(cur), memoryview(old)
+        rects = []
+        top = last = None
+        for y in range(self.HEIGHT):
+            row = y * w
+            if cur[row:row + w] != old[row:row + w]:
+                if top is None:
+                    top = y
+                elif y - last > gap:
+                    rects.append(pygame.Rect(0, top, w, last - top + 1))
+                    top = y
+                last = y
+        rects.append(pygame.Rect(0, top, w, last - top + 1))
+        return rects
+
+    def present(self, full=False):
+        """
+        Expande a RGB en self.screen solo las franjas de la VRAM que cambiaron
+        (en C). full=True expande todo. Devuelve los Rects actualizados.
+        """
+        if full:
+            if self._sprite_batch: self.flush_sprites()
+            rects = [self.screen.get_rect()]
+        else:
+            rects = self.damage()
+        for r in rects:
+            self.screen.blit(self.vram_surface, r, r)
+        self._presented[:] = self.vram
+        return rects
+
     def clear_screen(self):
         """Limpia la VRAM con color negro (índice 0)"""
-        self.screen.fill(self.palette[0])
+        # Los sprites pendientes quedarían tapados: se descartan
+        self._sprite_batch.clear()
+        self.vram_surface.fill(0)
 
     def pset(self, x, y, color_idx):
         """Pone un pixel en la VRAM (Sistema de Coordenadas 160x160)"""
+        if self._sprite_batch: self.flush_sprites()
         try:
             # 1. SANITIZACIÓN: Convertir a Enteros (Quitar decimales)
             # Esto arregla el problema de "ry + j" siendo float
@@ -61,27 +155,131 @@ class SparkHardware:
 
             # 2. Protecciones de hardware (Clipping)
             if 0 <= ix < self.WIDTH and 0 <= iy < self.HEIGHT:
-                # Aseguramos que el índice de color sea válido usando módulo
-                safe_idx = ic % len(self.palette)
-                c = self.palette[safe_idx]
-
-                self.screen.set_at((ix, iy), c)
+                # Índice válido: la paleta tiene 32 colores (igual que % 32)
+                self.vram[iy * self.WIDTH + ix] = ic & 31
         except Exception as e:
             # Si algo falla (ej: valores nulos), fallamos silenciosamente
             # para no romper el juego por un pixel malo.
             print(f"HARDWARE ERROR (pset): {e} | Val: {x}, {y}, {color_idx}")
             pass
 
+    # --- Primitivas de dibujo: spans y rellenos sobre la VRAM ---
+    def _hspan(self, x0, x1, y, c):
+        """Línea horizontal x0..x1 (inclusive, enteros), recortada contra la pantalla"""
+        if 0 <= y < self.HEIGHT:
+            if x0 > x1: x0, x1 = x1, x0
+            if x0 < 0: x0 = 0
+            if x1 >= self.WIDTH: x1 = self.WIDTH - 1
+            if x0 <= x1:
+                row = y * self.WIDTH
+                self.vram[row + x0:row + x1 + 1] = self._spans[c][:x1 - x0 + 1]
+
+    def _fill(self, x, y, w, h, c):
+        """Rectángulo relleno (enteros). Se recorta acá: Surface.fill no recorta
+        coordenadas negativas, las corre hasta el borde"""
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.WIDTH), min(y + h, self.HEIGHT)
+        if x0 < x1 and y0 < y1:
+            self.vram_surface.fill(c, (x0, y0, x1 - x0, y1 - y0))
+
+    def _plot(self, x, y, c):
+        if 0 <= x < self.WIDTH and 0 <= y < self.HEIGHT:
+            self.vram[y * self.WIDTH + x] = c
+
+    def line(self, x0, y0, x1, y1, color_idx):
+        """Línea de (x0, y0) a (x1, y1), extremos incluidos"""
+        if self._sprite_batch: self.flush_sprites()
+        try:
+            ix0, iy0, ix1, iy1 = int(x0), int(y0), int(x1), int(y1)
+            c = int(color_idx) & 31
+            if iy0 == iy1:
+                self._hspan(ix0, ix1, iy0, c)
+            elif ix0 == ix1:
+                self._fill(ix0, min(iy0, iy1), 1, abs(iy1 - iy0) + 1, c)
+            else:
+                pygame.draw.line(self.vram_surface, c, (ix0, iy0), (ix1, iy1))
+        except Exception as e:
+            print(f"HARDWARE ERROR (line): {e} | Val: {x0}, {y0}, {x1}, {y1}, {color_idx}")
+
+    def rect(self, x, y, w, h, color_idx):
+        """Borde de un rectángulo de w x h con esquina en (x, y)"""
+        if self._sprite_batch: self.flush_sprites()
+        try:
+            ix, iy, iw, ih = int(x), int(y), int(w), int(h)
+            c = int(color_idx) & 31
+            if iw <= 0 or ih <= 0: return
+            self._fill(ix, iy, iw, 1, c)
+            self._fill(ix, iy + ih - 1, iw, 1, c)
+            self._fill(ix, iy, 1, ih, c)
+            self._fill(ix + iw - 1, iy, 1, ih, c)
+        except Exception as e:
+            print(f"HARDWARE ERROR (rect): {e} | Val: {x}, {y}, {w}, {h}, {color_idx}")
+
+    def rectfill(self, x, y, w, h, color_idx):
+        """Rectángulo relleno: un solo fill recortado sobre la VRAM"""
+        if self._sprite_batch: self.flush_sprites()
+        try:
+            ix, iy, iw, ih = int(x), int(y), int(w), int(h)
+            if iw > 0 and ih > 0:
+                self._fill(ix, iy, iw, ih, int(color_idx) & 31)
+        except Exception as e:
+            print(f"HARDWARE ERROR (rectfill): {e} | Val: {x}, {y}, {w}, {h}, {color_idx}")
+
+    def circ(self, x, y, r, color_idx):
+        """Borde de un círculo (algoritmo del punto medio)"""
+        if self._sprite_batch: self.flush_sprites()
+        try:
+            cx, cy, r, c = int(x), int(y), int(r), int(color_idx) & 31
+            if r < 0: return
+            plot = self._plot
+            dx, dy, err = r, 0, 1 - r
+            while dx >= dy:
+                plot(cx + dx, cy + dy, c); plot(cx - dx, cy + dy, c)
+                plot(cx + dx, cy - dy, c); plot(cx - dx, cy - dy, c)
+                plot(cx + dy, cy + dx, c); plot(cx - dy, cy + dx, c)
+                plot(cx + dy, cy - dx, c); plot(cx - dy, cy - dx, c)
+                dy += 1
+                if err < 0:
+                    err += 2 * dy + 1
+                else:
+                    dx -= 1
+                    err += 2 * (dy - dx) + 1
+        except Exception as e:
+            print(f"HARDWARE ERROR (circ): {e} | Val: {x}, {y}, {r}, {color_idx}")
+
+    def circfill(self, x, y, r, color_idx):
+        """Círculo relleno: un span horizontal por fila (punto medio)"""
+        if self._sprite_batch: self.flush_sprites()
+        try:
+            cx, cy, r, c = int(x), int(y), int(r), int(color_idx) & 31
+            if r < 0: return
+            span = self._hspan
+            dx, dy, err = r, 0, 1 - r
+            while dx >= dy:
+                span(cx - dx, cx + dx, cy + dy, c)
+                span(cx - dx, cx + dx, cy - dy, c)
+                span(cx - dy, cx + dy, cy + dx, c)
+                span(cx - dy, cx + dy, cy - dx, c)
+                dy += 1
+                if err < 0:
+                    err += 2 * dy + 1
+                else:
+                    dx -= 1
+                    err += 2 * (dy - dx) + 1
+        except Exception as e:
+            print(f"HARDWARE ERROR (circfill): {e} | Val: {x}, {y}, {r}, {color_idx}")
+
     def flip(self):
         """Renderiza la VRAM a la ventana escalada"""
         # 1. Escalar la superficie pequeña a la grande (Nearest Neighbor para look retro)
+        self.present()
         pygame.transform.scale(self.screen, self.window.get_size(), self.window)
 
         # 2. Actualizar la ventana real
         pygame.display.flip()
 
         # 3. Mantener 60 FPS fijos
-        self.clock.tick(60)
+        self.clock.tick(self.FPS)
 
     def handle_input(self):
         """Procesa eventos del SO (cerrar ventana, etc)"""
@@ -111,9 +309,9 @@ class SparkHardware:
             sx = (i % 16) * 8
             sy = (i // 16) * 8
 
-            # Color base (usamos el ID para variar el color)
-            col = self.palette[i % len(self.palette)]
-            contrast_col = self.palette[(i + 8) % len(self.palette)]
+            # Color base (usamos el ID para variar el color); la hoja es indexada
+            col = i % len(self.palette)
+            contrast_col = (i + 8) % len(self.palette)
 
             # Dibujamos un cuadradito relleno
             pygame.draw.rect(self.spritesheet, col, (sx, sy, 8, 8))
@@ -122,60 +320,123 @@ class SparkHardware:
 
         # IMPORTANTE: Definir el color transparente (Color 0 = Negro)
         # Esto hace que el fondo del sprite no tape lo que hay detrás
-        self.spritesheet.set_colorkey(self.palette[0])
-
-    def spr(self, sprite_id, x, y):
-        """Dibuja el sprite ID (0-255) en la posición (x, y)"""
+        self.spritesheet.set_colorkey(0)
+
+    def spritesheet_bytes(self):
+        """La spritesheet como 128x128 índices de paleta (para guardar en un cartucho)"""
+        return pygame.image.tobytes(self.spritesheet, "P")
+
+    def load_spritesheet(self, data):
+        """Reemplaza la spritesheet con 128x128 índices (bytes o memoryview)"""
+        if self._sprite_batch: self.flush_sprites()
+        sheet = pygame.image.frombytes(bytes(data), self.spritesheet.get_size(), "P")
+        sheet.set_palette(self.palette)
+        self.spritesheet.blit(sheet, (0, 0))
+        self.sprite_cache.invalidate()
+        self.tilemap.invalidate_sprite()
+
+    def load_tilemap(self, data):
+        """Reemplaza el tilemap con 128x128 IDs de sprite (bytes o memoryview)"""
+        if self._sprite_batch: self.flush_sprites()
+        self.tilemap.load(data)
+
+    def sset(self, x, y, color_idx):
+        """Pone un pixel en la spritesheet (128x128) e invalida ese sprite"""
         try:
-            sid = int(sprite_id % 256)
-            ix = int(x)
-            iy = int(y)
+            ix, iy = int(x), int(y)
+            if 0 <= ix < 128 and 0 <= iy < 128:
+                # Lo ya encolado se dibuja con la hoja anterior
+                if self._sprite_batch: self.flush_sprites()
+                self.spritesheet.set_at((ix, iy), int(color_idx) & 31)
+                sid = (iy // 8) * 16 + ix // 8
+                self.sprite_cache.invalidate(sid)
+                self.tilemap.invalidate_sprite(sid)
+        except Exception as e:
+            print(f"HARDWARE ERROR (sset): {e} | Val: {x}, {y}, {color_idx}")
 
-            sheet_x = (sid % 16) * 8
-            sheet_y = (sid // 16) * 8
+    def pal(self, c0=None, c1=None):
+        """pal(c0, c1): los sprites dibujan c1 donde la hoja tiene c0. pal(): resetea"""
+        try:
+            if c0 is None or c1 is None:
+                self._draw_pal = list(range(256))
+            else:
+                c0 = int(c0) & 31
+                if c0 == 0: return  # el 0 es el transparente
+                self._draw_pal[c0] = int(c1) & 31
+            identity = all(i == c for i, c in enumerate(self._draw_pal))
+            self._pal_table = None if identity else bytes(self._draw_pal)
+        except Exception as e:
+            print(f"HARDWARE ERROR (pal): {e} | Val: {c0}, {c1}")
 
-            self.screen.blit(self.spritesheet, (ix, iy), (sheet_x, sheet_y, 8, 8))
+    def spr(self, sprite_id, x, y, flip_x=False, flip_y=False):
+        """Dibuja el sprite ID (0-255) en la posición (x, y), opcionalmente espejado"""
+        try:
+            sid = int(sprite_id % 256)
+            surf = None
+            if not (flip_x or flip_y or self._pal_table):
+                surf = self.sprite_cache.plain[sid]
+            if surf is None:
+                surf = self.sprite_cache.get(sid, bool(flip_x), bool(flip_y), self._pal_table)
+            self._sprite_batch.append((surf, (int(x), int(y))))
         except Exception as e:
             print(f"HARDWARE ERROR (spr): {e} | Val:  {x}, {y}")
             pass
 
-        # En VM/Hardware.py -> SparkHardware
+    def map(self, cx, cy, sx=0, sy=0, w=128, h=128):
+        """Dibuja w x h celdas del tilemap desde (cx, cy) con la esquina en (sx, sy)"""
+        try:
+            cx, cy, sx, sy, w, h = int(cx), int(cy), int(sx), int(sy), int(w), int(h)
+            if self._pal_table:
+                # Los chunks tienen la paleta original: con pal() activo se
+                # dibuja celda por celda con los sprites remapeados
+                for ty in range(max(cy, 0), min(cy + h, self.tilemap.HEIGHT)):
+                    for tx in range(max(cx, 0), min(cx + w, self.tilemap.WIDTH)):
+                        sid = self.tilemap.mget(tx, ty)
+                        if sid: self.spr(sid, sx + (tx - cx) * 8, sy + (ty - cy) * 8)
+            else:
+                # Se encola junto a los sprites: mismo Surface.blits, mismo orden
+                self._sprite_batch.extend(self.tilemap.blits(cx, cy, sx, sy, w, h, self.WIDTH, self.HEIGHT))
+        except Exception as e:
+            print(f"HARDWARE ERROR (map): {e} | Val: {cx}, {cy}, {sx}, {sy}, {w}, {h}")
+
+    def mget(self, x, y):
+        """ID de sprite de la celda (x, y) del tilemap (0 fuera del mapa)"""
+        try:
+            return self.tilemap.mget(int(x), int(y))
+        except Exception as e:
+            print(f"HARDWARE ERROR (mget): {e} | Val: {x}, {y}")
+            return 0
+
+    def mset(self, x, y, sprite_id):
+        """Pone el sprite sprite_id en la celda (x, y) del tilemap"""
+        try:
+            ix, iy, sid = int(x), int(y), int(sprite_id % 256)
+            # El chunk se redibuja sobre la misma Surface: lo ya encolado
+            # (map() previos) tiene que salir con el tile anterior
+            if self._sprite_batch and self.tilemap.mget(ix, iy) != sid: self.flush_sprites()
+            self.tilemap.mset(ix, iy, sid)
+        except Exception as e:
+            print(f"HARDWARE ERROR (mset): {e} | Val: {x}, {y}, {sprite_id}")
+
+    def flush_sprites(self):
+        """Vuelca los sprites encolados a la VRAM en un solo Surface.blits"""
+        self.vram_surface.blits(self._sprite_batch, doreturn=False)
+        self._sprite_batch.clear()
 
     def print_text(self, text, x, y, color_idx, is_small=False, target=None):
         """
         Dibuja texto.
-        target: Surface de destino. Si es None, usa self.screen (Juego)
+        target: Surface de destino. Si es None, usa la VRAM (Juego)
         """
-        # Si no especifican target, usamos la pantalla del juego (comportamiento default)
-        dest_surf = target if target else self.screen
-        dest_w = dest_surf.get_width()
-        dest_h = dest_surf.get_height()
-
-        cursor_x = int(x)
-        cursor_y = int(y)
-
+        # Si no especifican target, usamos la VRAM del juego (comportamiento default).
+        # El texto sale ya armado de la caché: un blit por llamada
+        dest_surf = target if target else self.vram_surface
+        if dest_surf is self.vram_surface and self._sprite_batch: self.flush_sprites()
         safe_idx = int(color_idx) % len(self.palette)
-        color = self.palette[safe_idx]
-
-        font_data = SparkFont.DATA_SMALL if is_small else SparkFont.DATA_BIG
-        width = 4 if is_small else 8
-        height = 6 if is_small else 8
-        spacing = 5 if is_small else 9
-
-        for char in str(text).upper():
-            if char in font_data:
-                bitmap = font_data[char]
-                for row_idx, row_byte in enumerate(bitmap):
-                    bits_to_read = width
-                    for col_idx in range(bits_to_read):
-                        shift = (width - 1) - col_idx
-                        if (row_byte >> shift) & 1:
-                            px = cursor_x + col_idx
-                            py = cursor_y + row_idx
-                            # Check de limites contra la superficie de destino
-                            if 0 <= px < dest_w and 0 <= py < dest_h:
-                                dest_surf.set_at((px, py), color)
-            cursor_x += spacing
+
+        surf = self.text_cache.render(str(text), safe_idx, bool(is_small))
+        if surf is not None:
+            dest_surf.blit(surf, (int(x), int(y)))
 
     def flip(self, mode="GAME", overlay_callback=None):
         """
@@ -184,6 +445,7 @@ class SparkHardware:
         """
         # 1. Escalar la capa base (Juego o Editor) a la ventana física
         if mode == "GAME":
+            self.present()
             pygame.transform.scale(self.screen, self.window.get_size(), self.window)
         else:
             pygame.transform.scale(self.editor_screen, self.window.get_size(), self.window)
@@ -195,4 +457,32 @@ class SparkHardware:
 
         # 3. Refrescar
         pygame.display.flip()
-        self.clock.tick(60)
+        self.clock.tick(self.FPS)
+
+
+class HeadlessHardware(SparkHardware):
+    """
+    Hardware sin ventana ni límite de FPS, para correr cartuchos en lote
+    (servidores sin display). La "ventana" es una Surface fuera de pantalla
+    y los botones se controlan desde el código con self.buttons.
+    """
+    FPS = 0
+
+    def __init__(self, scale=1):
+        # Drivers nulos de SDL: sin display ni dispositivo de audio
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        self.buttons = set()  # IDs de botón presionados
+        super().__init__(scale)
+
+    def _create_window(self, size):
+        return pygame.Surface(size)
+
+    def flip(self, mode="GAME", overlay_callback=None):
+        pass  # No hay nada que presentar
+
+    def handle_input(self):
+        pass
+
+    def btn(self, btn_id):
+        return btn_id in self.buttons
@@ -0,0 +1,42 @@
+"""
+Pruebas del hardware sin ventana (HeadlessHardware).
+
+    python -m VM.HardwareTest
+"""
+from VM.Hardware import HeadlessHardware
+from VM.Testing import run_tests
+
+
+def sheet_pixel(hw, sid):
+    """Color del pixel (0, 0) del sprite sid en la spritesheet"""
+    return hw.spritesheet.get_at_mapped(((sid % 16) * 8, (sid // 16) * 8))
+
+
+def test_mset_after_queued_map():
+    # Un map() encolado tiene que dibujar el tile que había al llamarlo,
+    # aunque un mset posterior redibuje ese chunk antes del flush
+    hw = HeadlessHardware()
+    hw.mset(0, 0, 5)
+    hw.map(0, 0, 0, 0, 1, 1)
+    hw.mset(0, 0, 9)
+    hw.map(0, 0, 80, 0, 1, 1)
+    hw.flush_sprites()
+    assert hw.vram[0] == sheet_pixel(hw, 5), hw.vram[0]
+    assert hw.vram[80] == sheet_pixel(hw, 9), hw.vram[80]
+
+
+def test_mset_same_tile_keeps_batch():
+    # Un mset que no cambia la celda no vacía el lote
+    hw = HeadlessHardware()
+    hw.mset(0, 0, 5)
+    hw.map(0, 0, 0, 0, 1, 1)
+    hw.mset(0, 0, 5)
+    assert hw._sprite_batch
+    hw.flush_sprites()
+    assert hw.vram[0] == sheet_pixel(hw, 5)
+
+
+TESTS = [test_mset_after_queued_map, test_mset_same_tile_keeps_batch]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
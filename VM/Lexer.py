@@ -41,10 +41,146 @@ def Lexer(src: str) -> List[Token]:
             tokens.append(Token("KEYWORD", val, line, col))
             continue
         if kind == "STRING":
-            inner = val[1:-1]
-            inner = inner.replace(r'\"', '"').replace(r'\\', '\\').replace(r'\n', '\n')
-            tokens.append(Token("STRING", inner, line, col))
+            tokens.append(_string_token(val[1:-1], line, col))
+            # Un string puede ocupar varias líneas
+            breaks = val.count("\n")
+            if breaks:
+                line += breaks
+                line_start = m.start() + val.rindex("\n") + 1
             continue
         tokens.append(Token(kind, val, line, col))
     tokens.append(Token("EOF", "", line, 1))
     return tokens
+
+
+def _string_token(inner: str, line: int, col: int) -> Token:
+    inner = inner.replace(r'\"', '"').replace(r'\\', '\\').replace(r'\n', '\n')
+    return Token("STRING", inner, line, col)
+
+
+# -----------------------------
+# Lexer incremental por líneas (editor)
+# -----------------------------
+# Cuerpo de un string dentro de una línea: corta en la comilla de cierre,
+# en el fin de línea o en una barra final (que no puede escapar el salto)
+STRING_BODY_RE = re.compile(r"(?:[^\"\\]|\\.)*")
+
+
+def lex_line(text: str, in_string: bool):
+    """
+    Segmentos (tipo, texto, columna) de una línea, incluyendo espacios y
+    comentarios (los usa el resaltado). Un string que cruza líneas queda como
+    STRING_START / STRING_PART / STRING_END.
+    Devuelve (segmentos, termina dentro de un string, exacto); exacto es False
+    si el string no puede continuar (barra al final de la línea).
+    """
+    segments = []
+    pos = 0
+    if in_string:
+        end = STRING_BODY_RE.match(text).end()
+        if end == len(text):
+            return (("STRING_PART", text, 1),), True, True
+        if text[end] != '"':
+            return (("STRING_PART", text, 1),), True, False
+        segments.append(("STRING_END", text[:end + 1], 1))
+        pos = end + 1
+
+    for m in TOKEN_RE.finditer(text, pos):
+        kind = m.lastgroup
+        if kind == "UNKNOWN" and m.group() == '"':
+            # Comilla sin cierre en esta línea: el string sigue en la próxima
+            exact = STRING_BODY_RE.match(text, m.end()).end() == len(text)
+            segments.append(("STRING_START", text[m.start():], m.start() + 1))
+            return tuple(segments), True, exact
+        segments.append((kind, m.group(), m.start() + 1))
+    return tuple(segments), False, True
+
+
+class LineLexer:
+    """
+    Lexer incremental para el editor: cada línea se tokeniza una vez y se
+    cachea por (estado de entrada, texto), así que al editar solo se vuelven
+    a tokenizar las líneas que cambiaron (y las siguientes si cambió el
+    estado, p. ej. al abrir o cerrar un string).
+    Lo usan el resaltado de sintaxis (segments) y la compilación (tokens).
+    """
+
+    def __init__(self):
+        self.cache = {}     # (en_string, texto) -> (segmentos, en_string al final, exacto)
+        self.lines = None   # copia de las líneas tokenizadas
+        self.segments = []  # segmentos por línea
+        self.exact = True   # False si tokens() tiene que caer al Lexer completo
+        self.line_tokens = []  # por línea: (segmentos, nro de línea, es la última, tokens) ya armados
+
+    def update(self, lines: List[str]):
+        """Re-tokeniza lo que cambió desde la última llamada"""
+        if lines == self.lines:
+            return
+        cache, new_cache = self.cache, {}
+        segments = []
+        in_string, exact = False, True
+        for text in lines:
+            key = (in_string, text)
+            result = cache.get(key)
+            if result is None:
+                result = lex_line(text, in_string)
+            new_cache[key] = result
+            segments.append(result[0])
+            in_string = result[1]
+            exact = exact and result[2]
+
+        # Solo quedan en caché las líneas actuales
+        self.cache = new_cache
+        self.lines = list(lines)
+        self.segments = segments
+        # Un string sin cerrar al final: el Lexer completo decide qué es
+        self.exact = exact and not in_string
+
+    def tokens(self) -> List[Token]:
+        """Los mismos tokens que Lexer("\n".join(lines)), armados desde la caché"""
+        if not self.exact:
+            return Lexer("\n".join(self.lines))
+
+        tokens: List[Token] = []
+        pending = None  # string abierto: (línea, columna, partes)
+        last = len(self.segments)
+        cached = self.line_tokens
+        line_tokens = []
+        for line, segments in enumerate(self.segments, 1):
+            # Línea sin cambios (mismo contenido, número y si es la última): se reusan sus tokens
+            if pending is None and line <= len(cached):
+                prev_segments, prev_line, prev_last, prev_tokens = cached[line - 1]
+                if (prev_segments is segments and prev_line == line and prev_last == (line == last)
+                        and prev_tokens is not None):
+                    tokens.extend(prev_tokens)
+                    line_tokens.append(cached[line - 1])
+                    continue
+
+            start = len(tokens)
+            multiline = pending is not None
+            for kind, val, col in segments:
+                if kind == "SKIP" or kind == "COMMENT":
+                    continue
+                if kind == "STRING":
+                    tokens.append(_string_token(val[1:-1], line, col))
+                elif kind == "IDENT" and val in KEYWORDS:
+                    tokens.append(Token("KEYWORD", val, line, col))
+                elif kind == "STRING_START":
+                    pending = (line, col, [val[1:]])
+                    multiline = True
+                elif kind == "STRING_PART":
+                    pending[2].append(val)
+                elif kind == "STRING_END":
+                    pending[2].append(val[:-1])
+                    tokens.append(_string_token("\n".join(pending[2]), pending[0], pending[1]))
+                    pending = None
+                else:
+                    tokens.append(Token(kind, val, line, col))
+            if line < last and pending is None:
+                tokens.append(Token("NEWLINE", "\\n", line, len(self.lines[line - 1]) + 1))
+            # Las líneas con partes de un string multilínea no se cachean
+            line_tokens.append((segments, line, line == last, None if multiline else tokens[start:]))
+
+        self.line_tokens = line_tokens
+        tokens.append(Token("EOF", "", last, 1))
+        return tokens
@@ -2,9 +2,12 @@
 # Constantes para identificar las instrucciones
 HALT          = 0
 LOAD_CONST    = 1  # [idx] -> Carga const[idx] al stack
-LOAD_VAR      = 2  # [idx] -> Carga global[vars[idx]] al stack
-STORE_VAR     = 3  # [idx] -> Guarda tope del stack en global[vars[idx]]
+LOAD_VAR      = 2  # [slot] -> Carga globals[slot] al stack
+STORE_VAR     = 3  # [slot] -> Guarda tope del stack en globals[slot]
 POP           = 4  # Elimina el tope del stack
+DUP           = 5  # Duplica el tope del stack
+LOAD_LOCAL    = 6  # [offset] -> Carga la variable local stack[bp + offset]
+STORE_LOCAL   = 7  # [offset] -> Guarda tope del stack en stack[bp + offset]
 
 ADD           = 10
 SUB           = 11
@@ -25,10 +28,37 @@ JMP_IF_FALSE  = 31 # [addr] -> Salta si el tope es Falso/0
 
 CALL          = 40 # [argc] -> Llama función
 RET           = 41 # Retorna
-SYS           = 42 # [id, argc] -> Llamada al sistema (opcional por ahora)
+SYS           = 42 # [id, argc, mask] -> Llamada al sistema (mask: args a validar en runtime)
+ENTER         = 43 # [nparams, nlocals] -> Prólogo: ajusta argumentos y reserva locales
+
+# --- Superinstrucciones (idiomas frecuentes fusionados en una sola instrucción) ---
+INC_VAR       = 50 # [slot, const] -> globals[slot] = globals[slot] + const
+CMP_JMP_FALSE = 51 # [cmp, slot, const, addr] -> Salta a addr si NO (var <cmp> const)
+CMP_JMP_TRUE  = 52 # [cmp, slot, const, addr] -> Salta a addr si (var <cmp> const)
+SYS_POP       = 53 # [id, argc, mask] -> SYS descartando el resultado (SYS + POP)
+INC_LOCAL     = 54 # [offset, const] -> Igual que INC_VAR sobre una local
+CMP_LOCAL_JMP_FALSE = 55 # [cmp, offset, const, addr] -> Igual que CMP_JMP_FALSE sobre una local
+CMP_LOCAL_JMP_TRUE  = 56 # [cmp, offset, const, addr] -> Igual que CMP_JMP_TRUE sobre una local
 
 OP_NAMES = {v: k for k, v in globals().items() if isinstance(v, int) and k.isupper()}
 
+# Cantidad de operandos que siguen a cada opcode dentro del código
+OP_ARGC = {op: 0 for op in OP_NAMES}
+OP_ARGC.update({
+    LOAD_CONST: 1, LOAD_VAR: 1, STORE_VAR: 1, LOAD_LOCAL: 1, STORE_LOCAL: 1,
+    JMP: 1, JMP_IF_FALSE: 1,
+    CALL: 1, SYS: 3, ENTER: 2,
+    INC_VAR: 2, CMP_JMP_FALSE: 4, CMP_JMP_TRUE: 4, SYS_POP: 3,
+    INC_LOCAL: 2, CMP_LOCAL_JMP_FALSE: 4, CMP_LOCAL_JMP_TRUE: 4,
+})
+
+# Opcodes con una dirección de código como operando -> posición de ese operando
+JUMP_OPS = {JMP: 0, JMP_IF_FALSE: 0, CMP_JMP_FALSE: 3, CMP_JMP_TRUE: 3,
+            CMP_LOCAL_JMP_FALSE: 3, CMP_LOCAL_JMP_TRUE: 3}
+
+# Comparaciones que pueden fusionarse en CMP_JMP_*
+CMP_OPS = (EQ, NEQ, LT, LTE, GT, GTE)
+
 SYS_FUNCTIONS = {
     "pset": 0,
     "sfx": 1,
@@ -37,6 +67,15 @@ SYS_FUNCTIONS = {
     "btn": 4,
     "cls": 5,
     "print": 6,
-    "log": 7
+    "log": 7,
+    "line": 8,
+    "rect": 9,
+    "rectfill": 10,
+    "circ": 11,
+    "circfill": 12,
+    "pal": 13,
+    "sset": 14,
+    "mset": 15,
+    "mget": 16
 }
 
@@ -0,0 +1,168 @@
+import math
+from dataclasses import fields
+
+from VM.Data import *
+
+# Operadores aritméticos que se pueden evaluar en tiempo de compilación.
+# Replican exactamente lo que hace la VM con dos números.
+FOLD_OPS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+    '%': lambda a, b: a % b,
+}
+
+
+def count_nodes(node):
+    """Cuenta los nodos del AST que cuelgan de node (incluido)"""
+    if isinstance(node, list):
+        return sum(count_nodes(n) for n in node)
+    if not isinstance(node, Node):
+        return 0
+    total = 1
+    for f in fields(node):
+        total += count_nodes(getattr(node, f.name))
+    return total
+
+
+class ASTOptimizer:
+    """
+    Etapa entre Parser.parse() y Compiler.compile():
+    pliega expresiones constantes, simplifica identidades (x*1, x/1, x-0)
+    y elimina ramas muertas con condición literal.
+    """
+
+    def __init__(self):
+        self.nodes_before = 0
+        self.nodes_after = 0
+
+    @property
+    def eliminated(self):
+        return self.nodes_before - self.nodes_after
+
+    def optimize(self, program):
+        self.nodes_before = count_nodes(program)
+        program = self.visit(program)
+        self.nodes_after = count_nodes(program)
+        return program
+
+    def visit(self, node):
+        method = getattr(self, f'visit_{type(node).__name__}', self.keep)
+        return method(node)
+
+    def keep(self, node):
+        return node
+
+    def visit_block(self, nodes):
+        """Optimiza una lista de statements (las ramas muertas desaparecen)"""
+        out = []
+        for node in nodes:
+            result = self.visit(node)
+            if isinstance(result, list):
+                out.extend(result)
+            elif result is not None:
+                out.append(result)
+        return out
+
+    # --- Statements ---
+    def visit_Program(self, node):
+        return Program(self.visit_block(node.body))
+
+    def visit_FuncDecl(self, node):
+        return FuncDecl(node.name, node.params, self.visit_block(node.body))
+
+    def visit_Assign(self, node):
+        return Assign(node.name, self.visit(node.value))
+
+    def visit_Return(self, node):
+        return Return(self.visit(node.value) if node.value else None)
+
+    def visit_Call(self, node):
+        return Call(node.name, [self.visit(arg) for arg in node.args])
+
+    def visit_If(self, node):
+        cond = self.visit(node.cond)
+        if isinstance(cond, (Number, String)):
+            # Condición conocida: nos quedamos solo con la rama que se ejecuta
+            taken = node.body if cond.value else node.else_body
+            return self.visit_block(taken or [])
+
+        else_body = self.visit_block(node.else_body) if node.else_body else None
+        return If(cond, self.visit_block(node.body), else_body or None)
+
+    def visit_While(self, node):
+        cond = self.visit(node.cond)
+        if isinstance(cond, (Number, String)) and not cond.value:
+            return None  # El bucle nunca entra
+        return While(cond, self.visit_block(node.body))
+
+    # --- Expresiones ---
+    def visit_UnaryOp(self, node):
+        value = self.visit(node.value)
+        if node.op == '-' and isinstance(value, Number):
+            return Number(-value.value)
+        return UnaryOp(node.op, value)
+
+    def visit_BinaryOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        op = node.op
+
+        if op in FOLD_OPS:
+            folded = self.fold(op, left, right)
+            if folded is not None:
+                return folded
+
+            simplified = self.simplify(op, left, right)
+            if simplified is not None:
+                return simplified
+
+        return BinaryOp(op, left, right)
+
+    def fold(self, op, left, right):
+        """Evalúa op si ambos lados son literales y el resultado es seguro"""
+        if isinstance(left, Number) and isinstance(right, Number):
+            if op in ('/', '%') and right.value == 0:
+                return None  # Se deja para que la VM reporte el error
+            return Number(FOLD_OPS[op](left.value, right.value))
+
+        # La VM concatena con '+' cuando algún lado no es número
+        if op == '+' and isinstance(left, (Number, String)) and isinstance(right, (Number, String)):
+            return String(str(left.value) + str(right.value))
+        return None
+
+    def simplify(self, op, left, right):
+        """Identidades algebraicas. Solo si el otro lado es seguro que es un float."""
+        if op in ('*', '/') and self.is_literal(right, 1) and self.is_float(left):
+            return left
+        if op == '*' and self.is_literal(left, 1) and self.is_float(right):
+            return right
+        # x+0 no es identidad: -0.0 + 0 da 0.0. x-0 sí (-0.0 - 0 da -0.0),
+        # pero no x-(-0), que es x+0
+        if op == '-' and self.is_literal(right, 0) and math.copysign(1, right.value) > 0 and self.is_float(left):
+            return left
+        return None
+
+    @staticmethod
+    def is_literal(node, value):
+        return isinstance(node, Number) and node.value == value
+
+    def is_float(self, node):
+        """
+        True si la expresión solo puede producir un float (o un error).
+        Una Var puede contener strings, bools o ints (btn), así que no cuenta:
+        x*1 con x string debe fallar y con x int debe convertirse en float.
+        """
+        if isinstance(node, Number):
+            return True
+        if isinstance(node, UnaryOp):
+            return node.op == '-' and self.is_float(node.value)
+        if isinstance(node, BinaryOp):
+            if node.op == '/':
+                return True
+            if node.op in ('-', '*', '%'):
+                return self.is_float(node.left) or self.is_float(node.right)
+            if node.op == '+':
+                return self.is_float(node.left) and self.is_float(node.right)
+        return False
@@ -0,0 +1,123 @@
+"""
+Pruebas del ASTOptimizer: plegado de constantes, identidades, ramas muertas
+y el conteo de nodos eliminados.
+
+    python -m VM.OptimizerTest
+"""
+import math
+
+from VM.Bytecode import instructions
+from VM.Compiler import Compiler
+from VM.Data import *
+from VM.Lexer import Lexer
+from VM.Opcodes import LOAD_CONST
+from VM.Optimizer import ASTOptimizer
+from VM.Parser import Parser
+from VM.Pipeline import compile_source
+from VM.Testing import run_tests
+from VM.VirtualMachine import SparkVM
+
+
+def optimized(source):
+    """(AST optimizado, optimizer) de source"""
+    optimizer = ASTOptimizer()
+    return optimizer.optimize(Parser(Lexer(source)).parse()), optimizer
+
+
+def assigned(source, name):
+    """Expresión optimizada que se asigna a name"""
+    program, _ = optimized(source)
+    for node in program.body:
+        if isinstance(node, Assign) and node.name == name:
+            return node.value
+    raise AssertionError(f"no hay asignación a {name}")
+
+
+def run_globals(program_ast):
+    compiler = Compiler()
+    compiler.compile(program_ast)
+    compiler.assemble()
+    vm = SparkVM([], [])
+    vm.load(compiler.code, compiler.consts, compiler.names)
+    vm.run()
+    return vm.globals_dict(), vm.runtime_error
+
+
+def test_fold_constants():
+    assert assigned("x = 160 / 32", "x") == Number(5.0)
+    assert assigned("x = (10 + 2) * -2", "x") == Number(-24.0)
+    assert assigned('x = "v" + 2', "x") == String("v2.0")
+
+    compiler, _ = compile_source("x = 160 / 32")
+    assert compiler.consts == [5.0], compiler.consts
+    assert [op for _, op, _ in instructions(compiler.code)].count(LOAD_CONST) == 1
+
+    # La división por cero no se pliega: la VM reporta el error
+    assert isinstance(assigned("x = 1 / 0", "x"), BinaryOp)
+
+
+def test_identities_only_for_numbers():
+    # Lado que solo puede ser float: se quita la identidad
+    assert assigned("x = (a / 2) * 1", "x") == BinaryOp('/', Var('a'), Number(2.0))
+    assert assigned("x = 1 * (a / 2)", "x") == BinaryOp('/', Var('a'), Number(2.0))
+    assert assigned("x = (a / 2) / 1", "x") == BinaryOp('/', Var('a'), Number(2.0))
+    assert assigned("x = (a / 2) - 0", "x") == BinaryOp('/', Var('a'), Number(2.0))
+
+    # Una Var puede ser string: x*1 tiene que fallar y x+0 concatenar
+    for source in ("x = a * 1", "x = a + 0", "x = 0 + a", "x = a - 0"):
+        assert isinstance(assigned(source, "x"), BinaryOp), source
+    assert run_globals(optimized('a = "s"\nx = a + 0')[0])[0]["x"] == "s0.0"
+    _, error = run_globals(optimized('a = "s"\nx = a * 1')[0])
+    assert error and "Math Error" in error, error
+
+    # x+0 no es identidad ni con floats: -0.0 + 0 da 0.0
+    assert isinstance(assigned("x = (a / 2) + 0", "x"), BinaryOp)
+    assert isinstance(assigned("x = (a / 2) - -0", "x"), BinaryOp)
+
+
+def test_negative_zero():
+    value = assigned("x = -0", "x")
+    assert isinstance(value, Number) and value.value == 0 and math.copysign(1, value.value) < 0
+
+    compiler, _ = compile_source("x = 0\ny = -0")
+    assert [repr(c) for c in compiler.consts] == ["0.0", "-0.0"], compiler.consts
+
+
+def test_matches_unoptimized():
+    # El programa optimizado deja las mismas globales que sin optimizar
+    sources = [
+        "x = 0\ny = -0\nz = \"v\" + y",
+        "x = 0\ny = (x * -1) + 0\nz = \"v\" + y",
+        "x = 0\ny = (x * -1) - -0\nz = \"v\" + y",
+        "x = 0\ny = (x * -1) - 0\nz = \"v\" + y",
+        "a = 3\nx = (a / 2) * 1 + 1 * (a % 2) - 0",
+        "x = 2\nif 1 then\n y = x\nelse\n y = 0\nend\nwhile 0 do\n y = 9\nend",
+    ]
+    for source in sources:
+        raw = Parser(Lexer(source)).parse()
+        expected = run_globals(raw)
+        got = run_globals(optimized(source)[0])
+        assert repr(got) == repr(expected), f"{source!r}:\n  {got}\n  {expected}"
+
+
+def test_dead_branches():
+    program, _ = optimized("if 0 then\n x = 1\nelse\n x = 2\nend\nwhile 0 do\n y = 1\nend")
+    assert program.body == [Assign("x", Number(2.0))], program.body
+
+
+def test_eliminated_count():
+    _, optimizer = optimized("x = (10 + 2) * -2")
+    # BinaryOp(*, BinaryOp(+, 10, 2), UnaryOp(-, 2)) -> Number: 6 nodos -> 1
+    assert optimizer.eliminated == 5, optimizer.eliminated
+    _, stats = compile_source("x = (10 + 2) * -2")
+    assert stats["ast_eliminated"] == 5
+
+    _, optimizer = optimized("x = a + b")
+    assert optimizer.eliminated == 0
+
+
+TESTS = [test_fold_constants, test_identities_only_for_numbers, test_negative_zero, test_matches_unoptimized,
+         test_dead_branches, test_eliminated_count]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
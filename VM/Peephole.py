@@ -0,0 +1,174 @@
+from VM.Opcodes import *
+
+# Escritura -> lectura de la misma variable
+STORE_LOAD_PAIRS = {STORE_VAR: LOAD_VAR, STORE_LOCAL: LOAD_LOCAL}
+
+
+class PeepholeOptimizer:
+    """
+    Optimizador de mirilla sobre el bytecode ya emitido por el Compiler.
+    Trabaja con instrucciones (no con palabras sueltas) y al final vuelve a
+    calcular todas las direcciones: saltos y direcciones de función guardadas
+    por compile_FuncDecl (compiler.address_consts).
+    """
+    MAX_PASSES = 10
+
+    def __init__(self, compiler):
+        self.compiler = compiler
+        self.stats = {"before": len(compiler.code), "after": len(compiler.code), "saved_words": 0,
+                      "threaded": 0, "dead": 0, "fused": 0}
+
+    def optimize(self):
+        """Reescribe compiler.code en el lugar. Devuelve las estadísticas."""
+        ins = self.decode(self.compiler.code)
+        if ins is None:
+            return self.stats  # Código con saltos a mitad de instrucción: no se toca
+
+        for _ in range(self.MAX_PASSES):
+            ins, changed = self.run_pass(ins)
+            if not changed:
+                break
+
+        self.compiler.code[:] = self.assemble(ins)
+        self.stats["after"] = len(self.compiler.code)
+        self.stats["saved_words"] = self.stats["before"] - self.stats["after"]
+        return self.stats
+
+    # --- Decodificación: direcciones -> índices de instrucción ---
+    def decode(self, code):
+        ins = []
+        addr_to_idx = {}
+        addr = 0
+        while addr < len(code):
+            op = code[addr]
+            argc = OP_ARGC.get(op)
+            if argc is None or addr + argc >= len(code):
+                return None  # Opcode desconocido o instrucción truncada
+            addr_to_idx[addr] = len(ins)
+            ins.append([op] + list(code[addr + 1:addr + 1 + argc]))
+            addr += 1 + argc
+        addr_to_idx[len(code)] = len(ins)  # "Fin del código" también es destino válido
+
+        for instr in ins:
+            if instr[0] in JUMP_OPS:
+                pos = 1 + JUMP_OPS[instr[0]]
+                if instr[pos] not in addr_to_idx: return None
+                instr[pos] = addr_to_idx[instr[pos]]
+
+        self.func_targets = {}
+        for const_idx in self.compiler.address_consts:
+            addr = self.compiler.consts[const_idx]
+            if addr not in addr_to_idx: return None
+            self.func_targets[const_idx] = addr_to_idx[addr]
+        return ins
+
+    def labels(self, ins):
+        """Índices de instrucción a los que se puede llegar saltando"""
+        targets = {instr[1 + JUMP_OPS[instr[0]]] for instr in ins if instr[0] in JUMP_OPS}
+        targets.update(self.func_targets.values())
+        return targets
+
+    # --- Una pasada de reescritura ---
+    def run_pass(self, ins):
+        labels = self.labels(ins)
+        keep = [True] * len(ins)
+        changed = False
+
+        i = 0
+        while i < len(ins):
+            op = ins[i][0]
+            nxt = ins[i + 1] if i + 1 < len(ins) and (i + 1) not in labels else None
+
+            # 1. Saltos a saltos: JMP/JMP_IF_FALSE/CMP_JMP_* -> JMP -> destino final
+            if op in JUMP_OPS:
+                pos = 1 + JUMP_OPS[op]
+                target = self.thread_jump(ins, ins[i][pos])
+                if target != ins[i][pos]:
+                    ins[i][pos] = target
+                    self.stats["threaded"] += 1
+                    changed = True
+
+            # 2. Salto a la instrucción siguiente
+            if op == JMP and ins[i][1] == i + 1:
+                keep[i] = False
+                self.stats["dead"] += 1
+                changed = True
+
+            # 3. Valor que se carga y se descarta: LOAD_CONST/LOAD_VAR/LOAD_LOCAL; POP
+            elif op in (LOAD_CONST, LOAD_VAR, LOAD_LOCAL) and nxt and nxt[0] == POP:
+                keep[i] = keep[i + 1] = False
+                self.stats["fused"] += 1
+                changed = True
+                i += 2
+                continue
+
+            # 4. STORE_VAR x; LOAD_VAR x -> DUP; STORE_VAR x (igual con locales)
+            elif op in STORE_LOAD_PAIRS and nxt and nxt[0] == STORE_LOAD_PAIRS[op] and nxt[1] == ins[i][1]:
+                ins[i], ins[i + 1] = [DUP], [op, ins[i][1]]
+                self.stats["fused"] += 1
+                changed = True
+                i += 2
+                continue
+
+            # 5. Código inalcanzable tras un salto incondicional, RET o HALT
+            if op in (JMP, RET, HALT) and keep[i]:
+                j = i + 1
+                while j < len(ins) and j not in labels:
+                    keep[j] = False
+                    self.stats["dead"] += 1
+                    changed = True
+                    j += 1
+                i = j
+                continue
+
+            i += 1
+
+        return self.compact(ins, keep), changed
+
+    def thread_jump(self, ins, target):
+        seen = set()
+        while target < len(ins) and ins[target][0] == JMP and target not in seen:
+            seen.add(target)
+            target = ins[target][1]
+        return target
+
+    def compact(self, ins, keep):
+        """Elimina las instrucciones borradas y reubica los destinos"""
+        # new_idx[i] = cantidad de instrucciones conservadas antes de i: para una
+        # instrucción borrada apunta a la siguiente que sobrevive
+        new_idx = []
+        count = 0
+        for k in keep:
+            new_idx.append(count)
+            if k: count += 1
+        new_idx.append(count)
+
+        out = [instr for instr, k in zip(ins, keep) if k]
+        for instr in out:
+            if instr[0] in JUMP_OPS:
+                pos = 1 + JUMP_OPS[instr[0]]
+                instr[pos] = new_idx[instr[pos]]
+        for const_idx, target in self.func_targets.items():
+            self.func_targets[const_idx] = new_idx[target]
+        return out
+
+    # --- Ensamblado: índices de instrucción -> direcciones ---
+    def assemble(self, ins):
+        addr_of = []
+        addr = 0
+        for instr in ins:
+            addr_of.append(addr)
+            addr += len(instr)
+        addr_of.append(addr)
+
+        code = []
+        for instr in ins:
+            if instr[0] in JUMP_OPS:
+                instr = list(instr)
+                pos = 1 + JUMP_OPS[instr[0]]
+                instr[pos] = addr_of[instr[pos]]
+            code.extend(instr)
+
+        for const_idx, target in self.func_targets.items():
+            self.compiler.consts[const_idx] = addr_of[target]
+        return code
@@ -0,0 +1,203 @@
+import hashlib
+import marshal
+import os
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List
+
+from VM.Bytecode import MAX_CODE_BYTES, encode
+from VM.Lexer import Lexer
+from VM.Parser import Parser
+from VM.Optimizer import ASTOptimizer
+from VM.Compiler import Compiler
+from VM.Peephole import PeepholeOptimizer
+
+# Módulos cuyo código determina el bytecode generado
+PIPELINE_MODULES = ("Lexer", "Token", "Parser", "Data", "Optimizer", "Compiler", "Peephole",
+                    "Bytecode", "Opcodes", "Scope", "Types", "SystemSpecs", "Pipeline")
+
+
+def compile_source(source_code, tokens=None):
+    """
+    Cadena completa de compilación de un cartucho:
+    Lexer -> Parser -> ASTOptimizer -> Compiler -> PeepholeOptimizer -> assemble.
+    tokens: tokens ya calculados para source_code (el LineLexer del editor).
+    Devuelve (compiler, stats); compiler.code queda en formato compacto,
+    stats["bytes"] es su tamaño y stats["saved_bytes"] lo que ahorró la
+    mirilla sobre ese mismo formato. Los errores de sintaxis (y pasarse de
+    MAX_CODE_BYTES) se propagan.
+    """
+    if tokens is None:
+        tokens = Lexer(source_code)
+    ast = Parser(tokens).parse()
+
+    optimizer = ASTOptimizer()
+    ast = optimizer.optimize(ast)
+
+    compiler = Compiler()
+    compiler.compile(ast)
+    # Tamaño compacto sin la mirilla (el de los saltos no depende de las constantes)
+    unoptimized = len(encode(compiler.code))
+
+    stats = PeepholeOptimizer(compiler).optimize()
+    stats["ast_eliminated"] = optimizer.eliminated
+
+    compiler.assemble()
+    stats["bytes"] = len(compiler.code)
+    stats["saved_bytes"] = unoptimized - stats["bytes"]
+    if stats["bytes"] > MAX_CODE_BYTES:
+        raise SyntaxError(f"Bytecode de {stats['bytes']} B: supera el máximo de {MAX_CODE_BYTES} B")
+    return compiler, stats
+
+
+def _compiler_version(here=None):
+    """Hash del código de todo el pipeline: cualquier cambio invalida la caché"""
+    h = hashlib.sha256(repr(sys.version_info[:2]).encode())  # formato de marshal
+    if here is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+    for name in PIPELINE_MODULES:
+        with open(os.path.join(here, name + ".py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+COMPILER_VERSION = _compiler_version()
+
+
+@dataclass
+class CompiledProgram:
+    """Lo que SparkVM.load necesita de una compilación"""
+    code: bytes  # Bytecode compacto
+    consts: list
+    names: List[str] = field(default_factory=list)
+
+
+class CompileCache:
+    """
+    Caché de compilación en memoria + directorio local, por hash del fuente
+    y COMPILER_VERSION. Un cartucho sin cambios (o el BIOS) se carga sin
+    pasar por Lexer/Parser/Compiler.
+
+    En disco cada entrada es un archivo marshal (code, consts, names, stats);
+    se descartan los menos usados (mtime) al pasar MAX_DISK_BYTES.
+    Los errores de disco no son fatales: la caché es solo un atajo.
+    """
+    MAX_MEMORY_ENTRIES = 32
+    MAX_DISK_BYTES = 4 * 1024 * 1024
+    SUFFIX = ".sparkc"
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.environ.get("SPARK_CACHE_DIR") or os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__sparkcache__")
+        self.directory = directory
+        self.memory = OrderedDict()  # clave -> (code, consts, names, stats)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source_code):
+        data = f"{COMPILER_VERSION}\0{source_code}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def compile(self, source_code, tokens=None):
+        """
+        Como compile_source, pero devuelve (CompiledProgram, stats) y usa la
+        caché. stats["cached"] indica si se saltó la compilación.
+        """
+        key = self.key(source_code)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        else:
+            entry = self._read(key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is not None:
+            self.hits += 1
+            code, consts, names, stats = entry
+            stats = dict(stats, cached=True)
+        else:
+            self.misses += 1
+            compiler, stats = compile_source(source_code, tokens)
+            code, consts, names = compiler.code, compiler.consts, compiler.names
+            entry = (bytes(code), list(consts), list(names), dict(stats))
+            self._remember(key, entry)
+            self._write(key, entry)
+            stats = dict(stats, cached=False)
+
+        # Copias: la VM no comparte listas con la caché (el código es inmutable)
+        return CompiledProgram(code, list(consts), list(names)), stats
+
+    def clear(self):
+        self.memory.clear()
+        for path, _, _ in self._disk_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # --- Memoria ---
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        if len(self.memory) > self.MAX_MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+    # --- Disco ---
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = marshal.load(f)
+            os.utime(path)  # LRU en disco por mtime
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        # Un archivo dañado puede ser marshal válido con otra forma
+        if not (type(entry) is tuple and len(entry) == 4 and type(entry[0]) is bytes
+                and type(entry[1]) is list and type(entry[2]) is list and type(entry[3]) is dict):
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                marshal.dump(entry, f)
+            os.replace(tmp, self._path(key))
+        except (OSError, ValueError):
+            return  # Directorio de solo lectura o valores no serializables
+        self._evict()
+
+    def _disk_entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(self.SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._disk_entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.MAX_DISK_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,127 @@
+"""
+Pruebas de la caché de compilación (CompileCache), sobre directorios temporales.
+
+    python -m VM.PipelineTest
+"""
+import os
+import shutil
+import tempfile
+
+from VM import Pipeline
+from VM.Compiler import Compiler
+from VM.Lexer import Lexer
+from VM.Optimizer import ASTOptimizer
+from VM.Parser import Parser
+from VM.Pipeline import CompileCache, compile_source
+from VM.Testing import run_tests
+
+SOURCE = """
+function add(a, b)
+    return a + b
+end
+x = add(2, 3)
+"""
+
+
+def same_program(program, source):
+    compiler, _ = compile_source(source)
+    return (program.code, program.consts, program.names) == (bytes(compiler.code), compiler.consts, compiler.names)
+
+
+def test_peephole_saving_in_bytes():
+    # Código muerto tras return, lejos del inicio (direcciones de 2 bytes)
+    source = "\n".join(f"v{i} = {i}" for i in range(60))
+    source += "\nfunction f()\n return 1\n x = 2\n y = x\nend\nz = f()"
+    _, stats = compile_source(source)
+
+    compiler = Compiler()  # Mismo pipeline sin PeepholeOptimizer
+    compiler.compile(ASTOptimizer().optimize(Parser(Lexer(source)).parse()))
+    unoptimized = len(compiler.assemble())
+    assert stats["saved_bytes"] == unoptimized - stats["bytes"] > 0, stats
+
+
+def test_memory_and_disk_hits():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = CompileCache(tmp)
+        program, stats = cache.compile(SOURCE)
+        assert not stats["cached"] and same_program(program, SOURCE)
+        assert len(os.listdir(tmp)) == 1
+
+        program, stats = cache.compile(SOURCE)  # memoria
+        assert stats["cached"] and same_program(program, SOURCE)
+
+        fresh = CompileCache(tmp)  # otra sesión: solo el disco
+        program, stats = fresh.compile(SOURCE)
+        assert stats["cached"] and same_program(program, SOURCE)
+        assert (fresh.hits, fresh.misses) == (1, 0)
+
+
+def test_changed_source_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = CompileCache(tmp)
+        cache.compile(SOURCE)
+        changed = SOURCE.replace("add(2, 3)", "add(2, 4)")
+        program, stats = cache.compile(changed)
+        assert not stats["cached"] and same_program(program, changed)
+        assert len(os.listdir(tmp)) == 2
+
+
+def test_compiler_change_invalidates():
+    # Editar cualquier módulo del pipeline cambia COMPILER_VERSION...
+    with tempfile.TemporaryDirectory() as tmp:
+        here = os.path.dirname(os.path.abspath(Pipeline.__file__))
+        for name in Pipeline.PIPELINE_MODULES:
+            shutil.copy(os.path.join(here, name + ".py"), tmp)
+        before = Pipeline._compiler_version(tmp)
+        assert before == Pipeline.COMPILER_VERSION
+        with open(os.path.join(tmp, "Compiler.py"), "a", encoding="utf-8") as f:
+            f.write("\n# cambio\n")
+        assert Pipeline._compiler_version(tmp) != before
+
+    # ...y con otra versión las entradas en disco ya no se usan
+    with tempfile.TemporaryDirectory() as tmp:
+        CompileCache(tmp).compile(SOURCE)
+        version = Pipeline.COMPILER_VERSION
+        Pipeline.COMPILER_VERSION = version + "x"
+        try:
+            _, stats = CompileCache(tmp).compile(SOURCE)
+        finally:
+            Pipeline.COMPILER_VERSION = version
+        assert not stats["cached"]
+
+
+def test_corrupt_file_recompiles():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, CompileCache.key(SOURCE) + CompileCache.SUFFIX)
+        # Basura, marshal truncado y marshal válido con otra forma
+        for data in (b"\xff\x00basura", b"\xa9\x04", bytes([ord("i"), 1, 0, 0, 0])):
+            with open(path, "wb") as f:
+                f.write(data)
+            program, stats = CompileCache(tmp).compile(SOURCE)
+            assert not stats["cached"] and same_program(program, SOURCE), data
+            # La entrada se reescribe sana
+            _, stats = CompileCache(tmp).compile(SOURCE)
+            assert stats["cached"], data
+
+
+def test_spark_cache_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        old = os.environ.get("SPARK_CACHE_DIR")
+        os.environ["SPARK_CACHE_DIR"] = tmp
+        try:
+            cache = CompileCache()
+        finally:
+            if old is None:
+                del os.environ["SPARK_CACHE_DIR"]
+            else:
+                os.environ["SPARK_CACHE_DIR"] = old
+        assert cache.directory == tmp
+        cache.compile(SOURCE)
+        assert os.listdir(tmp) == [CompileCache.key(SOURCE) + CompileCache.SUFFIX]
+
+
+TESTS = [test_peephole_saving_in_bytes, test_memory_and_disk_hits, test_changed_source_misses,
+         test_compiler_change_invalidates, test_corrupt_file_recompiles, test_spark_cache_dir]
+
+if __name__ == "__main__":
+    run_tests(TESTS)
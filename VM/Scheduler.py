@@ -0,0 +1,97 @@
+from collections import deque
+
+# Docs/specs.md: "Velocidad: 60 ciclos por frame". Se puede pasar como budget
+# para emular la CPU de la especificación al pie de la letra.
+SPEC_CYCLES_PER_FRAME = 60
+
+# Presupuesto por defecto: lo que el motor "table" corre holgado dentro de
+# un frame de 60 FPS, para que un draw() pesado no congele la ventana
+DEFAULT_FRAME_BUDGET = 20000
+
+
+class FrameScheduler:
+    """
+    Reparte un presupuesto de ciclos por frame entre las funciones del
+    cartucho (update y draw, en ese orden).
+
+    Un "tick" del juego es una pasada completa por todas ellas. Si una
+    función no termina dentro del presupuesto queda suspendida en la VM
+    (ip, stack y frames intactos) y se retoma en el frame siguiente; el tick
+    nuevo no empieza hasta que el anterior terminó.
+    """
+
+    def __init__(self, vm, budget=DEFAULT_FRAME_BUDGET, hooks=("update", "draw"), history=120):
+        self.vm = vm
+        self.budget = budget  # None = sin límite (como call_function)
+        self.hooks = tuple(hooks)
+
+        self.pending = []  # Funciones del tick actual que todavía no empezaron
+        self.current = None  # Función suspendida a mitad de camino
+
+        # Contabilidad
+        self.frame = 0
+        self.frame_cycles = 0  # Ciclos usados en el último frame
+        self.finished = []  # Funciones que terminaron en el último frame
+        self.history = deque(maxlen=history)  # Ciclos de los últimos frames
+
+    def reset(self):
+        """Descarta el tick en curso (p. ej. al cargar otro cartucho)"""
+        self.pending = []
+        self.current = None
+        self.finished = []
+        self.frame_cycles = 0
+        self.history.clear()
+
+    @property
+    def suspended(self):
+        return self.current is not None
+
+    @property
+    def tick_done(self):
+        """True si el último frame cerró un tick completo (hay imagen nueva)"""
+        return not self.pending and self.current is None
+
+    @property
+    def load(self):
+        """Fracción del presupuesto usada en el último frame"""
+        return self.frame_cycles / self.budget if self.budget else 0.0
+
+    def run_frame(self):
+        """Ejecuta un frame de CPU. Devuelve tick_done."""
+        vm = self.vm
+        if self.tick_done:
+            self.pending = list(self.hooks)
+
+        used = 0
+        self.finished = []
+        while not vm.runtime_error:
+            if self.current is None:
+                if not self.pending:
+                    break
+                name = self.pending.pop(0)
+                if not vm.begin_call(name):
+                    self.finished.append(name)  # El cartucho no la define
+                    continue
+                self.current = name
+
+            left = None if self.budget is None else self.budget - used
+            if left is not None and left <= 0:
+                break  # Sin ciclos: sigue el próximo frame
+
+            before = vm.cycle_count
+            done = vm.resume(left)
+            used += vm.cycle_count - before
+            if not done:
+                break
+            self.finished.append(self.current)
+            self.current = None
+
+        if vm.runtime_error:
+            # Tras un crash no se retoma nada
+            self.pending = []
+            self.current = None
+
+        self.frame += 1
+        self.frame_cycles = used
+        self.history.append(used)
+        return self.tick_done
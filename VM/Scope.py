@@ -0,0 +1,140 @@
+from VM.Data import *
+
+# Ámbito del código que no está dentro de ninguna función
+TOP_LEVEL = None
+
+
+def expr_reads(node, out):
+    """Agrega a out los nombres que lee una expresión"""
+    if isinstance(node, Var):
+        out.append(node.name)
+    elif isinstance(node, BinaryOp):
+        expr_reads(node.left, out)
+        expr_reads(node.right, out)
+    elif isinstance(node, UnaryOp):
+        expr_reads(node.value, out)
+    elif isinstance(node, Call):
+        out.append(node.name)
+        for arg in node.args:
+            expr_reads(arg, out)
+    return out
+
+
+class ScopeResolver:
+    """
+    Decide qué nombres de cada función son locales (viven en el frame):
+    - Los parámetros, siempre.
+    - Los temporales: nombres asignados en la función que ningún otro ámbito
+      menciona y que siempre se asignan antes de leerse. Si una lectura pudiera
+      ver el valor de una llamada anterior (o el 0.0 por defecto), el nombre
+      sigue siendo global para no cambiar la semántica.
+    Los nombres de función son siempre globales.
+    """
+
+    def __init__(self):
+        self.scope_names = {}  # ámbito (id de FuncDecl o TOP_LEVEL) -> nombres mencionados
+        self.func_names = set()
+        self.funcs = []
+
+    def resolve(self, program):
+        """Devuelve {id(FuncDecl): [locales]} con los parámetros primero"""
+        self.collect(program.body, TOP_LEVEL)
+
+        result = {}
+        for func in self.funcs:
+            params = list(func.params)
+            others = set()
+            for scope, names in self.scope_names.items():
+                if scope != id(func):
+                    others |= names
+
+            candidates = {name for name in self.assigned_in(func.body)
+                          if name not in params and name not in others and name not in self.func_names}
+            bad = set()
+            self.check_block(func.body, set(), candidates, bad)
+            temps = sorted(candidates - bad, key=self.first_use(func.body).index)
+            result[id(func)] = params + temps
+        return result
+
+    # --- Recolección de nombres por ámbito ---
+    def collect(self, nodes, scope):
+        names = self.scope_names.setdefault(id(scope) if scope else TOP_LEVEL, set())
+        for node in nodes:
+            if isinstance(node, FuncDecl):
+                self.func_names.add(node.name)
+                names.add(node.name)
+                self.funcs.append(node)
+                self.scope_names[id(node)] = set(node.params)
+                self.collect(node.body, node)
+                continue
+            names.update(self.stmt_names(node))
+            for block in self.sub_blocks(node):
+                self.collect(block, scope)
+
+    def stmt_names(self, node):
+        """Nombres que un statement menciona directamente (sin sub-bloques)"""
+        if isinstance(node, Assign):
+            return [node.name] + expr_reads(node.value, [])
+        if isinstance(node, Return):
+            return expr_reads(node.value, []) if node.value else []
+        if isinstance(node, (If, While)):
+            return expr_reads(node.cond, [])
+        return expr_reads(node, [])
+
+    @staticmethod
+    def sub_blocks(node):
+        if isinstance(node, If):
+            return [node.body, node.else_body or []]
+        if isinstance(node, While):
+            return [node.body]
+        return []
+
+    def assigned_in(self, nodes):
+        names = set()
+        for node in nodes:
+            if isinstance(node, Assign):
+                names.add(node.name)
+            for block in self.sub_blocks(node):
+                names |= self.assigned_in(block)
+        return names
+
+    def first_use(self, nodes, out=None):
+        """Nombres en orden de aparición (para numerar los locales de forma estable)"""
+        out = [] if out is None else out
+        for node in nodes:
+            if isinstance(node, FuncDecl):
+                continue
+            for name in self.stmt_names(node):
+                if name not in out: out.append(name)
+            for block in self.sub_blocks(node):
+                self.first_use(block, out)
+        return out
+
+    # --- Asignación definida ---
+    def check_block(self, nodes, assigned, candidates, bad):
+        """Marca en bad los candidatos que se pueden leer antes de asignarse"""
+        assigned = set(assigned)
+        for node in nodes:
+            if isinstance(node, FuncDecl):
+                continue
+            if isinstance(node, Assign):
+                self.check_reads(expr_reads(node.value, []), assigned, candidates, bad)
+                assigned.add(node.name)
+            elif isinstance(node, If):
+                self.check_reads(expr_reads(node.cond, []), assigned, candidates, bad)
+                a1 = self.check_block(node.body, assigned, candidates, bad)
+                a2 = self.check_block(node.else_body or [], assigned, candidates, bad)
+                assigned = a1 & a2
+            elif isinstance(node, While):
+                # El cuerpo puede no ejecutarse: lo que asigna no cuenta después
+                self.check_reads(expr_reads(node.cond, []), assigned, candidates, bad)
+                self.check_block(node.body, assigned, candidates, bad)
+            else:
+                self.check_reads(self.stmt_names(node), assigned, candidates, bad)
+        return assigned
+
+    @staticmethod
+    def check_reads(names, assigned, candidates, bad):
+        for name in names:
+            if name in candidates and name not in assigned:
+                bad.add(name)
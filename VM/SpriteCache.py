@@ -0,0 +1,75 @@
+import pygame
+
+
+class SpriteCache:
+    """
+    Caché de sprites pre-recortados para SparkHardware.spr.
+
+    Cada sprite de la hoja se guarda como su propia Surface de 8x8 (8 bits,
+    colorkey 0), junto con sus variantes espejadas y con paleta cambiada
+    (pal). Las variantes se arman la primera vez que se piden.
+
+    Si la hoja cambia (sset o una hoja nueva) hay que invalidar: el sprite
+    tocado o la caché entera.
+    """
+    SIZE = 8
+    # Variantes por sprite antes de descartarlas (cada pal distinto es una)
+    MAX_VARIANTS = 8
+
+    def __init__(self, spritesheet, palette):
+        self.spritesheet = spritesheet
+        self.palette = palette
+        self.sprites = [None] * 256  # sid -> {(flip_x, flip_y, pal): surface}
+        # Atajo para el caso común (sin espejar ni pal): sid -> surface
+        self.plain = [None] * 256
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sid, flip_x=False, flip_y=False, pal=None):
+        """
+        Surface del sprite sid (0-255).
+        pal: None o una tabla bytes de 256 entradas (índice -> índice)
+        """
+        variants = self.sprites[sid]
+        if variants is None:
+            variants = self.sprites[sid] = {}
+        key = (flip_x, flip_y, pal)
+        surf = variants.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        if len(variants) >= self.MAX_VARIANTS:
+            variants.clear()
+            self.plain[sid] = None
+        surf = variants[key] = self._build(sid, flip_x, flip_y, pal)
+        if key == (False, False, None):
+            self.plain[sid] = surf
+        return surf
+
+    def invalidate(self, sid=None):
+        """Descarta las variantes de un sprite, o de toda la hoja si sid es None"""
+        if sid is None:
+            self.sprites = [None] * 256
+            self.plain = [None] * 256
+        else:
+            self.sprites[sid] = None
+            self.plain[sid] = None
+
+    def _build(self, sid, flip_x, flip_y, pal):
+        size = self.SIZE
+        sx, sy = (sid % 16) * size, (sid // 16) * size
+        surf = self.spritesheet.subsurface((sx, sy, size, size)).copy()
+
+        if pal is not None:
+            # Cambio de paleta sobre los índices (el 0 sigue siendo transparente)
+            data = pygame.image.tobytes(surf, "P").translate(pal)
+            surf = pygame.image.frombytes(data, (size, size), "P")
+            surf.set_palette(self.palette)
+
+        if flip_x or flip_y:
+            surf = pygame.transform.flip(surf, flip_x, flip_y)
+
+        surf.set_colorkey(0)
+        return surf
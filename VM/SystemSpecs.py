@@ -9,7 +9,15 @@ SYS_SPECS = {
     "pset":     {"min_args": 3, "snippet": "(x, y, 7)", "args": ["int", "int", "color"]},
     "line":     {"min_args": 5, "snippet": "(x0, y0, x1, y1, 7)", "args": ["int", "int", "int", "int", "color"]},
     "rect":     {"min_args": 5, "snippet": "(x, y, w, h, 7)", "args": ["int", "int", "int", "int", "color"]},
-    "spr":      {"min_args": 3, "snippet": "(0, x, y)", "args": ["int", "int", "int"]},  # spr no pide color
+    "rectfill": {"min_args": 5, "snippet": "(x, y, w, h, 7)", "args": ["int", "int", "int", "int", "color"]},
+    "circ":     {"min_args": 4, "snippet": "(x, y, r, 7)", "args": ["int", "int", "int", "color"]},
+    "circfill": {"min_args": 4, "snippet": "(x, y, r, 7)", "args": ["int", "int", "int", "color"]},
+    "spr":      {"min_args": 3, "snippet": "(0, x, y)", "args": ["int", "int", "int", "any", "any"]},  # spr no pide color
+    "pal":      {"min_args": 0, "snippet": "(8, 12)", "args": ["color", "color"]},
+    "sset":     {"min_args": 3, "snippet": "(x, y, 7)", "args": ["int", "int", "color"]},
+    "map":      {"min_args": 2, "snippet": "(0, 0, 0, 0, 20, 20)", "args": ["int", "int", "int", "int", "int", "int"]},
+    "mset":     {"min_args": 3, "snippet": "(x, y, 1)", "args": ["int", "int", "int"]},
+    "mget":     {"min_args": 2, "snippet": "(x, y)", "args": ["int", "int"]},
     "btn":      {"min_args": 1, "snippet": "(0)", "args": ["btn_id"]},
     "print":    {"min_args": 4, "snippet": '("TEXT", x, y, 7)', "args": ["str", "int", "int", "color", "int"]},
     "cls":      {"min_args": 0, "snippet": "()", "args": []},
@@ -0,0 +1,28 @@
+"""
+Mini-runner para los módulos *Test.py (el proyecto no depende de pytest):
+
+    if __name__ == "__main__":
+        run_tests(TESTS)
+
+Las pruebas son funciones sin argumentos que fallan con assert. Los mismos
+módulos corren con pytest si se le pasa el archivo: pytest VM/HardwareTest.py
+"""
+import traceback
+
+
+def run_tests(tests):
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"ok    {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL  {test.__name__}: {type(e).__name__}: {e}")
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+
+    if failed:
+        print(f"\nFAILURE: {failed} de {len(tests)} pruebas fallaron.")
+        raise SystemExit(1)
+    print("\nSUCCESS: ¡Todas las pruebas pasaron correctamente!")
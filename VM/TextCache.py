@@ -0,0 +1,103 @@
+from collections import OrderedDict
+
+import pygame
+
+from VM.SparkFont import SparkFont
+
+# Métricas de cada fuente: (datos, ancho del glifo, avance del cursor)
+FONTS = {
+    False: (SparkFont.DATA_BIG, 8, 9),
+    True: (SparkFont.DATA_SMALL, 4, 5),
+}
+
+
+class TextCache:
+    """
+    Caché de texto pre-renderizado para SparkHardware.print_text.
+
+    - Atlas de glifos: una tira con todos los caracteres de la fuente por
+      (tamaño, color), construida la primera vez que se usa.
+    - Strings completos: cada texto ya armado como una sola Surface, así un
+      texto que se repite frame a frame cuesta un único blit.
+
+    Las superficies son de 8 bits con la paleta de la consola: se copian tal
+    cual sobre la VRAM indexada y se expanden a RGB sobre el editor.
+    Ambos niveles se recortan por LRU.
+    """
+    MAX_ATLASES = 16
+    MAX_STRINGS = 512
+
+    def __init__(self, palette):
+        self.palette = palette
+        self.atlases = OrderedDict()  # (small, color) -> (surface, {char: rect})
+        self.strings = OrderedDict()  # (texto, small, color) -> surface
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color_idx, is_small=False):
+        """Surface con el texto (en mayúsculas) o None si está vacío"""
+        key = (text, is_small, color_idx)
+        surf = self.strings.get(key)
+        if surf is not None:
+            self.strings.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = self._build_string(text.upper(), color_idx, is_small)
+        self.strings[key] = surf
+        if len(self.strings) > self.MAX_STRINGS:
+            self.strings.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.atlases.clear()
+        self.strings.clear()
+
+    # --- Construcción ---
+    def _new_surface(self, size, color_idx):
+        """Surface indexada con fondo transparente (un índice distinto al del texto)"""
+        bg = 1 if color_idx == 0 else 0
+        surf = pygame.Surface(size, depth=8)
+        surf.set_palette(self.palette)
+        surf.fill(bg)
+        surf.set_colorkey(bg)
+        return surf
+
+    def _atlas(self, color_idx, is_small):
+        key = (is_small, color_idx)
+        atlas = self.atlases.get(key)
+        if atlas is not None:
+            self.atlases.move_to_end(key)
+            return atlas
+
+        font_data, width, _ = FONTS[is_small]
+        height = max(len(bitmap) for bitmap in font_data.values())
+        surf = self._new_surface((width * len(font_data), height), color_idx)
+        rects = {}
+        for i, (char, bitmap) in enumerate(font_data.items()):
+            ox = i * width
+            for row_idx, row_byte in enumerate(bitmap):
+                for col_idx in range(width):
+                    if (row_byte >> ((width - 1) - col_idx)) & 1:
+                        surf.set_at((ox + col_idx, row_idx), color_idx)
+            rects[char] = pygame.Rect(ox, 0, width, height)
+
+        atlas = (surf, rects)
+        self.atlases[key] = atlas
+        if len(self.atlases) > self.MAX_ATLASES:
+            self.atlases.popitem(last=False)
+        return atlas
+
+    def _build_string(self, text, color_idx, is_small):
+        if not text:
+            return None
+        _, width, spacing = FONTS[is_small]
+        atlas, rects = self._atlas(color_idx, is_small)
+        height = atlas.get_height()
+
+        # Los caracteres sin glifo no se dibujan pero avanzan el cursor
+        surf = self._new_surface(((len(text) - 1) * spacing + width, height), color_idx)
+        surf.blits([(atlas, (i * spacing, 0), rects[char])
+                    for i, char in enumerate(text) if char in rects], doreturn=False)
+        return surf
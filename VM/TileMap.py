@@ -0,0 +1,117 @@
+import pygame
+
+
+class TileMap:
+    """
+    Tilemap de 128x128 celdas: un bytearray de 16 KB con el ID de sprite de
+    cada celda (0 = vacía, no se dibuja).
+
+    Para dibujar, el mapa se divide en chunks de CHUNK x CHUNK celdas, cada
+    uno pre-renderizado en su propia Surface indexada (colorkey 0). map()
+    se resuelve con un blit por chunk visible en lugar de un spr por celda.
+    mset solo marca su chunk como sucio; se redibuja la próxima vez que se
+    usa, sobre la misma Surface (por eso SparkHardware.mset vacía antes el
+    lote de blits pendientes que pueda referenciarla).
+    """
+    WIDTH = 128
+    HEIGHT = 128
+    TILE = 8
+    CHUNK = 16  # celdas por lado de cada chunk (128x128 px)
+
+    def __init__(self, sprite_cache, palette):
+        self.sprite_cache = sprite_cache
+        self.palette = palette
+        self.tiles = bytearray(self.WIDTH * self.HEIGHT)
+
+        per_row = self.WIDTH // self.CHUNK
+        count = per_row * (self.HEIGHT // self.CHUNK)
+        self.chunks = [None] * count       # k -> Surface (o None si nunca se usó)
+        self.chunk_sprites = [()] * count  # k -> sprites usados al construirlo
+        self.dirty = set(range(count))
+        self.rebuilds = 0
+
+    def mget(self, x, y):
+        if 0 <= x < self.WIDTH and 0 <= y < self.HEIGHT:
+            return self.tiles[y * self.WIDTH + x]
+        return 0
+
+    def mset(self, x, y, sid):
+        if 0 <= x < self.WIDTH and 0 <= y < self.HEIGHT:
+            i = y * self.WIDTH + x
+            if self.tiles[i] != sid:
+                self.tiles[i] = sid
+                self.dirty.add(self._chunk_index(x, y))
+
+    def load(self, data):
+        """Reemplaza el mapa entero (WIDTH * HEIGHT bytes, p. ej. la sección MAP de un cartucho)"""
+        self.tiles[:] = data
+        self.dirty.update(range(len(self.chunks)))
+
+    def invalidate_sprite(self, sid=None):
+        """La hoja cambió: ensuciar los chunks que usan el sprite (o todos)"""
+        for k, used in enumerate(self.chunk_sprites):
+            if sid is None or sid in used:
+                self.dirty.add(k)
+
+    def blits(self, cx, cy, sx, sy, w, h, screen_w, screen_h):
+        """
+        Secuencia (surface, destino, área) para Surface.blits que dibuja las
+        celdas [cx, cx+w) x [cy, cy+h) con la esquina en (sx, sy) de pantalla.
+        Se recorta en pixeles contra el mapa y contra la pantalla.
+        """
+        t, cp = self.TILE, self.CHUNK * self.TILE
+        # Rectángulo pedido, en pixeles del mapa
+        ox, oy = cx * t - sx, cy * t - sy  # pixel del mapa que cae en (0, 0) de pantalla
+        x0 = max(cx * t, 0, ox)
+        y0 = max(cy * t, 0, oy)
+        x1 = min((cx + w) * t, self.WIDTH * t, ox + screen_w)
+        y1 = min((cy + h) * t, self.HEIGHT * t, oy + screen_h)
+        if x0 >= x1 or y0 >= y1:
+            return []
+
+        seq = []
+        per_row = self.WIDTH // self.CHUNK
+        for ky in range(y0 // cp, (y1 - 1) // cp + 1):
+            top = ky * cp
+            ay0, ay1 = max(y0, top), min(y1, top + cp)
+            for kx in range(x0 // cp, (x1 - 1) // cp + 1):
+                left = kx * cp
+                ax0, ax1 = max(x0, left), min(x1, left + cp)
+                surf = self._chunk(ky * per_row + kx)
+                seq.append((surf, (ax0 - ox, ay0 - oy), (ax0 - left, ay0 - top, ax1 - ax0, ay1 - ay0)))
+        return seq
+
+    # --- Chunks ---
+    def _chunk_index(self, x, y):
+        return (y // self.CHUNK) * (self.WIDTH // self.CHUNK) + x // self.CHUNK
+
+    def _chunk(self, k):
+        surf = self.chunks[k]
+        if surf is None:
+            size = self.CHUNK * self.TILE
+            surf = self.chunks[k] = pygame.Surface((size, size), depth=8)
+            surf.set_palette(self.palette)
+            surf.set_colorkey(0)
+        if k in self.dirty:
+            self._render_chunk(k, surf)
+            self.dirty.discard(k)
+        return surf
+
+    def _render_chunk(self, k, surf):
+        self.rebuilds += 1
+        n, t = self.CHUNK, self.TILE
+        per_row = self.WIDTH // n
+        base_x, base_y = (k % per_row) * n, (k // per_row) * n
+        get = self.sprite_cache.get
+
+        surf.fill(0)
+        used = set()
+        seq = []
+        for ty in range(n):
+            row = (base_y + ty) * self.WIDTH + base_x
+            for tx, sid in enumerate(self.tiles[row:row + n]):
+                if sid:
+                    used.add(sid)
+                    seq.append((get(sid), (tx * t, ty * t)))
+        surf.blits(seq, doreturn=False)
+        self.chunk_sprites[k] = used
@@ -0,0 +1,92 @@
+from VM.Data import *
+from VM.Opcodes import SYS_FUNCTIONS
+
+# Tipos de argumento de SYS_SPECS que aceptan cualquier número (nunca bool)
+NUMERIC_TYPES = ("int", "float", "btn_id", "color")
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Validación en runtime por tipo esperado ("any" y desconocidos no se validan)
+ARG_CHECKS = {name: is_number for name in NUMERIC_TYPES}
+ARG_CHECKS["str"] = lambda value: isinstance(value, str)
+
+# Lo que el Compiler puede probar de una expresión
+NUM = "num"  # int o float
+STR = "str"
+BOOL = "bool"
+
+
+class TypeInference:
+    """
+    Deduce en tiempo de compilación el tipo de las expresiones que se pasan
+    a las SYS calls, para que la VM no valide en cada llamada lo ya probado.
+
+    Una variable es numérica si todas sus asignaciones (en cualquier ámbito)
+    son numéricas. Se parte de "todas numéricas" y se descartan hasta llegar
+    a un punto fijo, así 'x = x + 1' sigue siendo numérica. Los parámetros
+    reciben cualquier cosa y los nombres de función guardan direcciones:
+    nunca se dan por probados.
+    """
+
+    def __init__(self):
+        self.numeric_vars = set()
+
+    def analyze(self, program):
+        assigns = {}  # nombre -> expresiones que se le asignan
+        excluded = set()  # parámetros y nombres de función
+        self.collect(program.body, assigns, excluded)
+
+        numeric = set(assigns) - excluded
+        changed = True
+        while changed:
+            changed = False
+            self.numeric_vars = numeric
+            for name in list(numeric):
+                if any(self.kind(value) != NUM for value in assigns[name]):
+                    numeric.discard(name)
+                    changed = True
+        self.numeric_vars = numeric
+        return self
+
+    def collect(self, nodes, assigns, excluded):
+        for node in nodes:
+            if isinstance(node, FuncDecl):
+                excluded.add(node.name)
+                excluded.update(node.params)
+                self.collect(node.body, assigns, excluded)
+            elif isinstance(node, Assign):
+                assigns.setdefault(node.name, []).append(node.value)
+            elif isinstance(node, If):
+                self.collect(node.body, assigns, excluded)
+                self.collect(node.else_body or [], assigns, excluded)
+            elif isinstance(node, While):
+                self.collect(node.body, assigns, excluded)
+
+    def kind(self, node):
+        """NUM, STR, BOOL o None si no se puede probar"""
+        if isinstance(node, Number):
+            return NUM
+        if isinstance(node, String):
+            return STR
+        if isinstance(node, Var):
+            return NUM if node.name in self.numeric_vars else None
+        if isinstance(node, UnaryOp):
+            # NEG da un número o falla antes de llegar a la SYS call
+            return NUM if node.op == '-' else self.kind(node.value)
+        if isinstance(node, BinaryOp):
+            if node.op in ('-', '*', '/', '%'):
+                return NUM
+            if node.op == '+':
+                left, right = self.kind(node.left), self.kind(node.right)
+                if STR in (left, right):
+                    return STR  # La VM concatena
+                if left in (NUM, BOOL) and right in (NUM, BOOL):
+                    return NUM
+                return None
+            return BOOL  # Comparaciones
+        if isinstance(node, Call) and node.name in SYS_FUNCTIONS:
+            return NUM  # Todas las SYS calls dejan 0 (btn: 0/1, mget: ID)
+        return None
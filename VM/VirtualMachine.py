@@ -1,28 +1,125 @@
+import operator
+
+from VM.Bytecode import read_instruction, read_varint
 from VM.Opcodes import *
 from VM.SystemSpecs import SYS_SPECS
+from VM.Types import ARG_CHECKS
+
+# Comparaciones que usan las superinstrucciones CMP_JMP_*
+CMP_FUNCS = {
+    EQ: operator.eq, NEQ: operator.ne, LT: operator.lt,
+    LTE: operator.le, GT: operator.gt, GTE: operator.ge,
+}
+
+# Aritmética binaria (motor "threaded")
+ARITH_FUNCS = {
+    ADD: operator.add, SUB: operator.sub, MUL: operator.mul,
+    DIV: operator.truediv, MOD: operator.mod,
+}
 
 
 class SparkVM:
-    def __init__(self, bytecode, constants, hardware=None):
+    # Motores de ejecución disponibles:
+    # "classic" -> cadena if/elif original (referencia)
+    # "table"   -> tabla de handlers indexada por opcode sobre el
+    #              flujo de instrucciones pre-decodificado (ver decode)
+    # "threaded" -> cada instrucción es un closure con sus operandos ya
+    #              enlazados que devuelve el próximo ip (ver thread)
+    ENGINES = ("classic", "table", "threaded")
+
+    # Profundidad máxima de llamadas anidadas (recursión sin caso base)
+    MAX_CALL_DEPTH = 256
+
+    # Ciclos por tramo de step() cuando resume() corre sin límite
+    HOST_SLICE = 4096
+
+    def __init__(self, bytecode, constants, hardware=None, engine="table", names=()):
+        self.compact = False
         self.code = bytecode
         self.consts = constants
         self.hardware = hardware
 
+        if engine not in self.ENGINES:
+            raise ValueError(f"Motor desconocido: {engine}")
+        self.engine = engine
+        self._dispatch = self._build_dispatch_table()
+
+        # Flujo pre-decodificado: program[addr] = (handler, operando, siguiente_ip)
+        self.program = []
+        self._decoded_from = None
+        # Código enhebrado: threaded[addr] = closure que ejecuta y devuelve el próximo ip
+        self.threaded = []
+        self._threaded_from = None
+
         # Estado del Procesador
         self.ip = 0
         self.sp = 0
         self.stack = []
-        self.globals = {}
-        self.call_stack = []
+        self.call_stack = []  # Frames: (ip de retorno, bp del llamador)
+        self.bp = 0  # Base del frame actual: los locales viven en stack[bp:]
         self.halted = False
+        self._host_call = None  # (profundidad, bp, stack) de la llamada de begin_call
+
+        # Globales: array plano indexado por slot + tabla de símbolos nombre <-> slot
+        self._install_symbols(names)
 
         # Estado de Error
         self.runtime_error = None
         self.cycle_count = 0
 
+    def load(self, bytecode, constants, names=()):
+        """Instala un programa nuevo (código, constantes y nombres de globales)"""
+        self.code = bytecode
+        self.consts = constants
+        self._install_symbols(names)
+        self.reset()
+        if self.engine == "table":
+            self.decode()
+        elif self.engine == "threaded":
+            self.thread()
+
+    # --- Código: compacto (bytes, ver VM/Bytecode.py) o lista de palabras ---
+    @property
+    def code(self):
+        return self._code
+
+    @code.setter
+    def code(self, code):
+        # El bytecode compacto se lee a través de una memoryview, sin copiarlo
+        # (puede ser la sección CODE de un cartucho mapeado con mmap). Una
+        # lista de enteros es el formato de palabras previo a Compiler.assemble.
+        self.compact = isinstance(code, (bytes, bytearray, memoryview))
+        self._code = memoryview(code) if self.compact else code
+
+    def _install_symbols(self, names):
+        self.names = list(names)
+        self.symbols = {name: slot for slot, name in enumerate(self.names)}
+        self.globals = [0.0] * len(self.names)  # 0.0 = valor de una variable sin asignar
+
+    # --- Acceso a globales por nombre (consola, depuración, call_function) ---
+    def get_global(self, name, default=0.0):
+        slot = self.symbols.get(name)
+        return default if slot is None else self.globals[slot]
+
+    def set_global(self, name, value):
+        slot = self.symbols.get(name)
+        if slot is None:
+            slot = len(self.names)
+            self.names.append(name)
+            self.symbols[name] = slot
+            self.globals.append(0.0)
+        self.globals[slot] = value
+
+    def globals_dict(self):
+        """Copia {nombre: valor} de todas las globales"""
+        return dict(zip(self.names, self.globals))
+
     def reset(self):
         self.ip = 0
         self.stack = []
+        self.call_stack = []
+        self.bp = 0
+        self._host_call = None
         self.halted = False
         self.cycle_count = 0
         self.runtime_error = None
@@ -34,15 +131,101 @@ class SparkVM:
         # print(self.runtime_error) # Descomentar para debug en consola
         return False
 
-    def _check_type(self, value, expected_type):
-        """Valida tipos en tiempo de ejecución"""
-        if expected_type in ["int", "float", "btn_id", "color"]:
-            return isinstance(value, (int, float)) and not isinstance(value, bool)
-        elif expected_type == "str":
-            return isinstance(value, str)
-        return True
+    # --- Tabla de syscalls: id -> (nombre, handler, chequeos de tipo) ---
+    @property
+    def hardware(self):
+        return self._hardware
+
+    @hardware.setter
+    def hardware(self, hardware):
+        # Los handlers quedan enlazados a los métodos del hardware actual
+        self._hardware = hardware
+        self._syscalls = self._build_syscall_table(hardware)
+
+    def _build_syscall_table(self, hw):
+        handlers = {}
+        if hw:
+            pset, spr, btn = hw.pset, hw.spr, hw.btn
+            clear_screen, print_text = hw.clear_screen, hw.print_text
+
+            def sys_pset(args):
+                if len(args) >= 3: pset(args[0], args[1], args[2])
+                return 0
+
+            def sys_spr(args):
+                if len(args) >= 3: spr(*args[:5])
+                return 0
+
+            def sys_pal(args):
+                if len(args) >= 2: hw.pal(args[0], args[1])
+                else: hw.pal()
+                return 0
+
+            def sys_btn(args):
+                if len(args) >= 1: return 1 if btn(int(args[0])) else 0
+                return 0
+
+            def sys_cls(args):
+                clear_screen()
+                return 0
+
+            def sys_print(args):
+                if len(args) >= 4:
+                    is_small = len(args) >= 5 and args[4] == 1
+                    print_text(str(args[0]), args[1], args[2], args[3], is_small)
+                return 0
+
+            def sys_map(args):
+                if len(args) >= 2: hw.map(*args[:6])
+                return 0
+
+            def sys_mget(args):
+                if len(args) >= 2: return hw.mget(args[0], args[1])
+                return 0
+
+            def fixed_arity(fn, argc):
+                """Handler que pasa los primeros argc argumentos (si están)"""
+                def handler(args):
+                    if len(args) >= argc: fn(*args[:argc])
+                    return 0
+                return handler
+
+            handlers = {"pset": sys_pset, "spr": sys_spr, "btn": sys_btn, "cls": sys_cls,
+                        "print": sys_print, "log": self._sys_log,
+                        "line": fixed_arity(hw.line, 5), "rect": fixed_arity(hw.rect, 5),
+                        "rectfill": fixed_arity(hw.rectfill, 5),
+                        "circ": fixed_arity(hw.circ, 4), "circfill": fixed_arity(hw.circfill, 4),
+                        "pal": sys_pal, "sset": fixed_arity(hw.sset, 3),
+                        "map": sys_map, "mset": fixed_arity(hw.mset, 3), "mget": sys_mget}
+
+        table = {}
+        for name, sys_id in SYS_FUNCTIONS.items():
+            expected = SYS_SPECS.get(name, {}).get("args", [])
+            checks = tuple((i, arg_type, ARG_CHECKS[arg_type])
+                           for i, arg_type in enumerate(expected) if arg_type in ARG_CHECKS)
+            table[sys_id] = (name, handlers.get(name, self._sys_nop), checks)
+        return table
+
+    @staticmethod
+    def _sys_nop(args):
+        return 0
+
+    def _sys_log(self, args):
+        if len(args) >= 1:
+            msg = str(args[0])
+            # Enviar a la consola del sistema (si existe)
+            if hasattr(self, 'console') and self.console:
+                self.console.log(msg, "USER")
+            else:
+                print(f"[USER LOG] {msg}")  # Fallback
+        return 0
 
     def step(self, max_cycles=60):
+        if self.engine == "table":
+            return self._step_table(max_cycles)
+        if self.engine == "threaded":
+            return self._step_threaded(max_cycles)
+
         cycles_left = max_cycles
         while cycles_left > 0 and not self.halted:
             if self.ip >= len(self.code):
@@ -71,28 +254,36 @@ class SparkVM:
 
         # --- A. DATOS ---
         if op == LOAD_CONST:
-            idx = self.code[self.ip];
-            self.ip += 1
+            idx = self._fetch()
             self.stack.append(self.consts[idx])
 
         elif op == LOAD_VAR:
-            idx = self.code[self.ip];
-            self.ip += 1
-            name = self.consts[idx]
-            val = self.globals.get(name, 0.0)
-            self.stack.append(val)
+            slot = self._fetch()
+            self.stack.append(self.globals[slot])
 
         elif op == STORE_VAR:
-            idx = self.code[self.ip];
-            self.ip += 1
-            name = self.consts[idx]
+            slot = self._fetch()
             if not self.stack: return self._error("Stack Underflow (STORE)")
             val = self.stack.pop()
-            self.globals[name] = val
+            self.globals[slot] = val
+
+        elif op == LOAD_LOCAL:
+            offset = self._fetch()
+            self.stack.append(self.stack[self.bp + offset])
+
+        elif op == STORE_LOCAL:
+            offset = self._fetch()
+            if not self.stack: return self._error("Stack Underflow (STORE)")
+            val = self.stack.pop()
+            self.stack[self.bp + offset] = val
 
         elif op == POP:
             if self.stack: self.stack.pop()
 
+        elif op == DUP:
+            if not self.stack: return self._error("Stack Underflow (DUP)")
+            self.stack.append(self.stack[-1])
+
         # --- B. ARITMÉTICA (CORREGIDA) ---
         # ¡IMPORTANTE! SUB (11) y ADD (10) deben estar en esta lista
         elif op in [ADD, SUB, MUL, DIV, MOD]:
@@ -154,13 +345,11 @@ class SparkVM:
 
         # --- D. SALTOS ---
         elif op == JMP:
-            target = self.code[self.ip]
-            self.ip += 1
+            target = self._fetch()
             self.ip = int(target)
 
         elif op == JMP_IF_FALSE:
-            target = self.code[self.ip]
-            self.ip += 1
+            target = self._fetch()
             if not self.stack: return self._error("Stack Underflow (JMP_IF)")
             val = self.stack.pop()
             if not val: self.ip = int(target)
@@ -170,119 +359,806 @@ class SparkVM:
             self.halted = True
 
         elif op == CALL:
-            argc = self.code[self.ip];
-            self.ip += 1
-            if len(self.stack) < argc + 1: return self._error("Stack Underflow (CALL)")
+            argc = self._fetch()
+            return self._call(argc)
+
+        # --- F. SYSCALLS ---
+        elif op == SYS:
+            sys_id, argc, mask = self._fetch(), self._fetch(), self._fetch()
+            return self._syscall(sys_id, argc, mask)
 
-            # 1. Extraer argumentos (sin perderlos)
-            args_temp = []
-            for _ in range(argc): args_temp.append(self.stack.pop())
+        elif op == ENTER:
+            nparams, nlocals = self._fetch(), self._fetch()
+            return self._enter(nparams, nlocals)
 
-            # 2. Extraer destino
-            func_target = self.stack.pop()
+        elif op == RET:
+            return self._ret()
 
-            # 3. Devolver argumentos al stack
-            for arg in reversed(args_temp): self.stack.append(arg)
+        # --- G. SUPERINSTRUCCIONES ---
+        elif op == INC_VAR:
+            slot = self._fetch()
+            step = self.consts[self._fetch()]
+            return self._inc_var(slot, step)
 
-            target_addr = None
+        elif op in [CMP_JMP_FALSE, CMP_JMP_TRUE]:
+            cmp_op, slot = self._fetch(), self._fetch()
+            value = self.consts[self._fetch()]
+            target = self._fetch()
+            a = self.globals[slot]
+            try:
+                result = CMP_FUNCS[cmp_op](a, value)
+            except TypeError:
+                return self._error(f"Cannot compare {type(a)} and {type(value)}")
+            if bool(result) == (op == CMP_JMP_TRUE): self.ip = int(target)
 
-            # --- CORRECCIÓN AQUÍ ---
-            # Aceptamos int Y float para la dirección
-            if isinstance(func_target, (int, float)):
-                target_addr = int(func_target)  # Forzamos entero
-            elif isinstance(func_target, str):
-                target_addr = self.globals.get(func_target)
+        elif op == INC_LOCAL:
+            offset = self._fetch()
+            step = self.consts[self._fetch()]
+            return self._inc_local(offset, step)
 
-            if isinstance(target_addr, int):
-                self.call_stack.append(self.ip)
-                self.ip = target_addr
-            else:
-                # Si falla, limpiamos los argumentos para no corromper la pila
-                for _ in range(argc): self.stack.pop()
-                # Opcional: Avisar si no es una función del sistema
-                # print(f"Warning: Function {func_target} not found/invalid")
+        elif op in [CMP_LOCAL_JMP_FALSE, CMP_LOCAL_JMP_TRUE]:
+            cmp_op, offset = self._fetch(), self._fetch()
+            value = self.consts[self._fetch()]
+            target = self._fetch()
+            a = self.stack[self.bp + offset]
+            try:
+                result = CMP_FUNCS[cmp_op](a, value)
+            except TypeError:
+                return self._error(f"Cannot compare {type(a)} and {type(value)}")
+            if bool(result) == (op == CMP_LOCAL_JMP_TRUE): self.ip = int(target)
 
-        # --- F. SYSCALLS ---
-        elif op == SYS:
-            sys_id = self.code[self.ip];
-            self.ip += 1
-            argc = self.code[self.ip];
-            self.ip += 1
+        elif op == SYS_POP:
+            sys_id, argc, mask = self._fetch(), self._fetch(), self._fetch()
+            self._syscall(sys_id, argc, mask)
+            if not self.halted: self.stack.pop()
 
-            if len(self.stack) < argc: return self._error(f"Stack Underflow (SYS {sys_id})")
+        else:
+            return self._error(f"Unknown Opcode {op}")
 
-            args = []
-            for _ in range(argc): args.insert(0, self.stack.pop())
-
-            # Identificar nombre para validación
-            func_name = None
-            for name, fid in SYS_FUNCTIONS.items():
-                if fid == sys_id: func_name = name; break
-
-            # Validar Tipos
-            if func_name and func_name in SYS_SPECS:
-                specs = SYS_SPECS[func_name]
-                expected = specs.get("args", [])
-                for i, val in enumerate(args):
-                    if i < len(expected):
-                        if not self._check_type(val, expected[i]):
-                            return self._error(
-                                f"'{func_name}' arg {i + 1}: expected {expected[i]}, got {type(val).__name__}")
-
-            # Ejecutar
-            if not self.halted and self.hardware:
-                if sys_id == 0:  # pset
-                    if len(args) >= 3: self.hardware.pset(args[0], args[1], args[2])
-                    self.stack.append(0)
-                elif sys_id == 2:  # spr
-                    if len(args) >= 3: self.hardware.spr(args[0], args[1], args[2])
-                    self.stack.append(0)
-                elif sys_id == 4:  # btn
-                    val = 0
-                    if len(args) >= 1: val = 1 if self.hardware.btn(int(args[0])) else 0
-                    self.stack.append(val)
-                elif sys_id == 5:  # cls
-                    self.hardware.clear_screen()
-                    self.stack.append(0)
-                elif sys_id == 6:  # print
-                    if len(args) >= 4:
-                        is_small = False
-                        if len(args) >= 5 and args[4] == 1: is_small = True
-                        self.hardware.print_text(str(args[0]), args[1], args[2], args[3], is_small)
-                    self.stack.append(0)
-                elif sys_id == 7:  # log
-                    if len(args) >= 1:
-                        msg = str(args[0])
-                        # Enviar a la consola del sistema (si existe)
-                        if hasattr(self, 'console') and self.console:
-                            self.console.log(msg, "USER")
-                        else:
-                            print(f"[USER LOG] {msg}")  # Fallback
-                    self.stack.append(0)
-                else:
-                    self.stack.append(0)
+    def _fetch(self):
+        """Siguiente operando (motor classic): una palabra, o un varint si el código es compacto"""
+        if self.compact:
+            value, self.ip = read_varint(self.code, self.ip)
+            return value
+        value = self.code[self.ip]
+        self.ip += 1
+        return value
+
+    # ==========================================
+    # MOTOR "table": Despacho por tabla sobre código pre-decodificado
+    # ==========================================
+    def _build_dispatch_table(self):
+        """Tabla de 256 entradas (una por opcode posible) con handlers ya enlazados"""
+        handlers = {
+            LOAD_CONST: self._op_load_const, LOAD_VAR: self._op_load_var,
+            STORE_VAR: self._op_store_var, POP: self._op_pop, DUP: self._op_dup,
+            LOAD_LOCAL: self._op_load_local, STORE_LOCAL: self._op_store_local,
+            ADD: self._op_add, SUB: self._op_sub, MUL: self._op_mul,
+            DIV: self._op_div, MOD: self._op_mod, NEG: self._op_neg,
+            EQ: self._op_eq, NEQ: self._op_neq, LT: self._op_lt,
+            LTE: self._op_lte, GT: self._op_gt, GTE: self._op_gte,
+            JMP: self._op_jmp, JMP_IF_FALSE: self._op_jmp_if_false,
+            HALT: self._op_halt, CALL: self._op_call, SYS: self._op_sys,
+            RET: self._op_ret, ENTER: self._op_enter,
+            INC_VAR: self._op_inc_var, CMP_JMP_FALSE: self._op_cmp_jmp_false,
+            CMP_JMP_TRUE: self._op_cmp_jmp_true, SYS_POP: self._op_sys_pop,
+            INC_LOCAL: self._op_inc_local, CMP_LOCAL_JMP_FALSE: self._op_cmp_local_jmp_false,
+            CMP_LOCAL_JMP_TRUE: self._op_cmp_local_jmp_true,
+        }
+        missing = [OP_NAMES[op] for op in OP_NAMES if op not in handlers]
+        if missing:
+            raise NotImplementedError(f"Opcodes sin handler: {missing}")
+
+        table = [None] * 256
+        for op, handler in handlers.items():
+            table[op] = handler
+        return table
+
+    def decode(self):
+        """
+        Convierte el código (compacto o lista de palabras) en instrucciones
+        pre-decodificadas. Se indexa por dirección de código, así que los
+        destinos de salto y las direcciones de función siguen siendo válidos
+        sin traducción.
+        """
+        self.program = [None] * len(self.code)
+        self._decoded_from = self.code
+        addr = 0
+        while addr < len(self.code):
+            addr = self._decode_at(addr)[2]
+
+    def _decode_at(self, addr):
+        """Decodifica (y memoriza) la instrucción que empieza en addr"""
+        entry = self._decode_entry(addr)[1]
+        self.program[addr] = entry
+        return entry
+
+    def _decode_entry(self, addr):
+        """(opcode, (handler, operando, siguiente_ip)) de la instrucción en addr"""
+        code = self.code
+        op = code[addr]
+        if self.compact:
+            try:
+                _, operands, next_ip = read_instruction(code, addr)
+            except IndexError:
+                operands, next_ip = None, len(code)  # Varint cortado por el fin del código
+        else:
+            next_ip = addr + 1 + OP_ARGC.get(op, 0)
+            operands = code[addr + 1:next_ip] if next_ip <= len(code) else None
+
+        if not (isinstance(op, int) and 0 <= op < 256) or self._dispatch[op] is None:
+            entry = (self._op_unknown, op, addr + 1)
+        elif operands is None:
+            # Instrucción truncada: el operando cae fuera del código
+            entry = (self._op_fault, None, next_ip)
+        else:
+            try:
+                entry = (self._dispatch[op], self._resolve_operand(op, operands), next_ip)
+            except IndexError:
+                # Índice de constante inválido: falla al ejecutarse, no al cargar
+                entry = (self._op_fault, None, next_ip)
+        return op, entry
+
+    def _resolve_operand(self, op, operands):
+        """Resuelve los operandos en tiempo de carga (valores, slots, destinos)"""
+        if op == LOAD_CONST:
+            return self.consts[operands[0]]
+        if op in (LOAD_VAR, STORE_VAR, LOAD_LOCAL, STORE_LOCAL):
+            return operands[0]
+        if op in (JMP, JMP_IF_FALSE):
+            return int(operands[0])
+        if op == CALL:
+            return operands[0]
+        if op in (SYS, SYS_POP):
+            sys_id, argc, mask = operands
+            return sys_id, argc, self._syscall_checks(sys_id, argc, mask)
+        if op == ENTER:
+            return operands[0], operands[1]
+        if op in (INC_VAR, INC_LOCAL):
+            return operands[0], self.consts[operands[1]]
+        if op in (CMP_JMP_FALSE, CMP_JMP_TRUE, CMP_LOCAL_JMP_FALSE, CMP_LOCAL_JMP_TRUE):
+            cmp_op, slot, const_idx, target = operands
+            return CMP_FUNCS[cmp_op], slot, self.consts[const_idx], int(target)
+        return None
+
+    def _step_table(self, max_cycles):
+        if self._decoded_from is not self.code:
+            self.decode()  # El código se reemplazó sin pasar por load()
+
+        program = self.program
+        size = len(program)
+        cycles_left = max_cycles
+        try:
+            while cycles_left > 0 and not self.halted:
+                ip = self.ip
+                if ip >= size:
+                    self.halted = True
+                    break
+
+                entry = program[ip]
+                if entry is None:
+                    entry = self._decode_at(ip)  # Salto a mitad de instrucción
+                handler, arg, self.ip = entry
+                handler(arg)
+                cycles_left -= 1
+
+        except IndexError:
+            self._error("Segmentation Fault (Read beyond end of code)")
+        except Exception as e:
+            self._error(f"CPU Exception: {e}")
+
+        self.cycle_count += max_cycles - cycles_left
+
+    def _op_unknown(self, op):
+        return self._error(f"Unknown Opcode {op}")
+
+    def _op_fault(self, _):
+        raise IndexError
+
+    # --- A. DATOS ---
+    def _op_load_const(self, value):
+        self.stack.append(value)
+
+    def _op_load_var(self, slot):
+        self.stack.append(self.globals[slot])
+
+    def _op_store_var(self, slot):
+        if not self.stack: return self._error("Stack Underflow (STORE)")
+        self.globals[slot] = self.stack.pop()
+
+    def _op_load_local(self, offset):
+        self.stack.append(self.stack[self.bp + offset])
+
+    def _op_store_local(self, offset):
+        if not self.stack: return self._error("Stack Underflow (STORE)")
+        val = self.stack.pop()
+        self.stack[self.bp + offset] = val
+
+    def _op_pop(self, _):
+        if self.stack: self.stack.pop()
+
+    def _op_dup(self, _):
+        if not self.stack: return self._error("Stack Underflow (DUP)")
+        self.stack.append(self.stack[-1])
+
+    # --- B. ARITMÉTICA ---
+    # Cada handler repite el patrón pop/pop/chequeo en línea: llamar a un
+    # helper común costaría una llamada extra por instrucción.
+    def _math_error(self, op, a, b):
+        return self._error(f"Math Error: Cannot op {op} on {type(a)} and {type(b)}")
+
+    def _op_add(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error(f"Stack Underflow ({ADD})")
+        b = stack.pop()
+        a = stack.pop()
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            stack.append(a + b)
+        else:
+            # Excepción: Concatenar strings con '+'
+            stack.append(str(a) + str(b))
+
+    def _op_sub(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error(f"Stack Underflow ({SUB})")
+        b = stack.pop()
+        a = stack.pop()
+        if not (isinstance(a, (int, float)) and isinstance(b, (int, float))):
+            return self._math_error(SUB, a, b)
+        stack.append(a - b)
+
+    def _op_mul(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error(f"Stack Underflow ({MUL})")
+        b = stack.pop()
+        a = stack.pop()
+        if not (isinstance(a, (int, float)) and isinstance(b, (int, float))):
+            return self._math_error(MUL, a, b)
+        stack.append(a * b)
+
+    def _op_div(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error(f"Stack Underflow ({DIV})")
+        b = stack.pop()
+        a = stack.pop()
+        if not (isinstance(a, (int, float)) and isinstance(b, (int, float))):
+            return self._math_error(DIV, a, b)
+        if b == 0: return self._error("Division by Zero")
+        stack.append(a / b)
+
+    def _op_mod(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error(f"Stack Underflow ({MOD})")
+        b = stack.pop()
+        a = stack.pop()
+        if not (isinstance(a, (int, float)) and isinstance(b, (int, float))):
+            return self._math_error(MOD, a, b)
+        if b == 0: return self._error("Modulo by Zero")
+        stack.append(a % b)
+
+    def _op_neg(self, _):
+        if not self.stack: return self._error("Stack Underflow (NEG)")
+        val = self.stack.pop()
+        if not isinstance(val, (int, float)): return self._error("Cannot negate non-number")
+        self.stack.append(-val)
+
+    # --- C. COMPARACIONES ---
+    def _op_eq(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        stack.append(stack.pop() == b)
+
+    def _op_neq(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        stack.append(stack.pop() != b)
+
+    def _op_lt(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        a = stack.pop()
+        try:
+            stack.append(a < b)
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(b)}")
+
+    def _op_lte(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        a = stack.pop()
+        try:
+            stack.append(a <= b)
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(b)}")
+
+    def _op_gt(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        a = stack.pop()
+        try:
+            stack.append(a > b)
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(b)}")
+
+    def _op_gte(self, _):
+        stack = self.stack
+        if len(stack) < 2: return self._error("Stack Underflow (COMP)")
+        b = stack.pop()
+        a = stack.pop()
+        try:
+            stack.append(a >= b)
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(b)}")
+
+    # --- D. SALTOS ---
+    def _op_jmp(self, target):
+        self.ip = target
+
+    def _op_jmp_if_false(self, target):
+        if not self.stack: return self._error("Stack Underflow (JMP_IF)")
+        if not self.stack.pop(): self.ip = target
+
+    # --- E. CONTROL ---
+    def _op_halt(self, _):
+        self.halted = True
+
+    def _op_call(self, argc):
+        return self._call(argc)
+
+    def _op_enter(self, operands):
+        return self._enter(*operands)
+
+    def _op_ret(self, _):
+        return self._ret()
+
+    # --- F. SYSCALLS ---
+    def _op_sys(self, operands):
+        return self._run_syscall(*operands)
+
+    # --- G. SUPERINSTRUCCIONES ---
+    def _op_inc_var(self, operands):
+        return self._inc_var(*operands)
+
+    def _op_cmp_jmp_false(self, operands):
+        cmp, slot, value, target = operands
+        a = self.globals[slot]
+        try:
+            if not cmp(a, value): self.ip = target
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(value)}")
+
+    def _op_cmp_jmp_true(self, operands):
+        cmp, slot, value, target = operands
+        a = self.globals[slot]
+        try:
+            if cmp(a, value): self.ip = target
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(value)}")
+
+    def _op_sys_pop(self, operands):
+        self._run_syscall(*operands)
+        if not self.halted: self.stack.pop()
+
+    def _op_inc_local(self, operands):
+        return self._inc_local(*operands)
+
+    def _op_cmp_local_jmp_false(self, operands):
+        cmp, offset, value, target = operands
+        a = self.stack[self.bp + offset]
+        try:
+            if not cmp(a, value): self.ip = target
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(value)}")
+
+    def _op_cmp_local_jmp_true(self, operands):
+        cmp, offset, value, target = operands
+        a = self.stack[self.bp + offset]
+        try:
+            if cmp(a, value): self.ip = target
+        except TypeError:
+            return self._error(f"Cannot compare {type(a)} and {type(value)}")
+
+    # ==========================================
+    # MOTOR "threaded": closures enhebrados sobre el código decodificado
+    # ==========================================
+    def thread(self):
+        """
+        Convierte cada instrucción en un closure sin argumentos, con sus
+        operandos (y el stack, las globales, el siguiente ip) capturados.
+        Ejecutar es llamar closures en secuencia: cada uno devuelve el ip de
+        la próxima instrucción, así los saltos son solo otro valor de retorno.
+        """
+        self.threaded = [None] * len(self.code)
+        self._threaded_from = (self.code, self.stack, self.globals)
+        addr = 0
+        while addr < len(self.code):
+            addr = self._thread_at(addr)[1]
+
+    def _thread_at(self, addr):
+        """Arma (y memoriza) el closure de la instrucción en addr. Devuelve (closure, siguiente_ip)."""
+        op, (handler, arg, next_ip) = self._decode_entry(addr)
+        # Opcode desconocido o instrucción truncada: el handler es de error
+        valid = isinstance(op, int) and 0 <= op < 256 and handler is self._dispatch[op]
+        fn = self._make_closure(op, arg, next_ip) if valid else None
+        if fn is None:
+            fn = self._wrap_handler(handler, arg, next_ip)
+        self.threaded[addr] = fn
+        return fn, next_ip
+
+    def _wrap_handler(self, handler, arg, next_ip):
+        """Closure genérico sobre el handler de "table" (CALL, RET, ENTER, errores)"""
+        def run():
+            self.ip = next_ip
+            handler(arg)
+            return self.ip
+        return run
+
+    def _make_closure(self, op, arg, nxt):
+        """Closure especializado para las instrucciones frecuentes (None = usar el genérico)"""
+        stack, glob, error = self.stack, self.globals, self._error
+        push, pop = stack.append, stack.pop
+
+        # --- A. DATOS ---
+        if op == LOAD_CONST:
+            def run():
+                push(arg)
+                return nxt
+        elif op == LOAD_VAR:
+            def run():
+                push(glob[arg])
+                return nxt
+        elif op == STORE_VAR:
+            def run():
+                if not stack:
+                    error("Stack Underflow (STORE)")
+                    return nxt
+                glob[arg] = pop()
+                return nxt
+        elif op == LOAD_LOCAL:
+            def run():
+                push(stack[self.bp + arg])
+                return nxt
+        elif op == STORE_LOCAL:
+            def run():
+                if not stack:
+                    error("Stack Underflow (STORE)")
+                    return nxt
+                val = pop()
+                stack[self.bp + arg] = val
+                return nxt
+        elif op == POP:
+            def run():
+                if stack: pop()
+                return nxt
+        elif op == DUP:
+            def run():
+                if not stack:
+                    error("Stack Underflow (DUP)")
+                    return nxt
+                push(stack[-1])
+                return nxt
+
+        # --- B. ARITMÉTICA Y C. COMPARACIONES ---
+        elif op in ARITH_FUNCS:
+            return self._make_arith(op, nxt)
+        elif op == NEG:
+            def run():
+                if not stack:
+                    error("Stack Underflow (NEG)")
+                    return nxt
+                val = pop()
+                if not isinstance(val, (int, float)):
+                    error("Cannot negate non-number")
+                    return nxt
+                push(-val)
+                return nxt
+        elif op in CMP_FUNCS:
+            cmp = CMP_FUNCS[op]
+
+            def run():
+                if len(stack) < 2:
+                    error("Stack Underflow (COMP)")
+                    return nxt
+                b = pop()
+                a = pop()
+                try:
+                    push(cmp(a, b))
+                except TypeError:
+                    error(f"Cannot compare {type(a)} and {type(b)}")
+                return nxt
+
+        # --- D. SALTOS ---
+        elif op == JMP:
+            def run():
+                return arg
+        elif op == JMP_IF_FALSE:
+            def run():
+                if not stack:
+                    error("Stack Underflow (JMP_IF)")
+                    return nxt
+                return nxt if pop() else arg
+        elif op == HALT:
+            def run():
+                self.halted = True
+                return nxt
+
+        # --- F. SYSCALLS ---
+        elif op in (SYS, SYS_POP):
+            run_syscall = self._run_syscall
+            sys_id, argc, checks = arg
+            if op == SYS:
+                def run():
+                    run_syscall(sys_id, argc, checks)
+                    return nxt
             else:
-                self.stack.append(0)
+                def run():
+                    run_syscall(sys_id, argc, checks)
+                    if not self.halted: pop()
+                    return nxt
 
-        elif op == RET:
-            if self.call_stack:
-                self.ip = self.call_stack.pop()
+        # --- G. SUPERINSTRUCCIONES ---
+        elif op in (INC_VAR, INC_LOCAL):
+            slot, step = arg
+            step_is_number = isinstance(step, (int, float))
+            if op == INC_VAR:
+                def run():
+                    a = glob[slot]
+                    if step_is_number and isinstance(a, (int, float)):
+                        glob[slot] = a + step
+                    else:
+                        glob[slot] = str(a) + str(step)
+                    return nxt
             else:
-                self.halted = True
+                def run():
+                    idx = self.bp + slot
+                    a = stack[idx]
+                    if step_is_number and isinstance(a, (int, float)):
+                        stack[idx] = a + step
+                    else:
+                        stack[idx] = str(a) + str(step)
+                    return nxt
+        elif op in (CMP_JMP_FALSE, CMP_JMP_TRUE, CMP_LOCAL_JMP_FALSE, CMP_LOCAL_JMP_TRUE):
+            cmp, slot, value, target = arg
+            # Destino si la comparación da verdadero / falso
+            if op in (CMP_JMP_TRUE, CMP_LOCAL_JMP_TRUE):
+                if_true, if_false = target, nxt
+            else:
+                if_true, if_false = nxt, target
+            if op in (CMP_JMP_FALSE, CMP_JMP_TRUE):
+                def run():
+                    a = glob[slot]
+                    try:
+                        return if_true if cmp(a, value) else if_false
+                    except TypeError:
+                        error(f"Cannot compare {type(a)} and {type(value)}")
+                        return nxt
+            else:
+                def run():
+                    a = stack[self.bp + slot]
+                    try:
+                        return if_true if cmp(a, value) else if_false
+                    except TypeError:
+                        error(f"Cannot compare {type(a)} and {type(value)}")
+                        return nxt
+        else:
+            return None  # CALL, RET, ENTER: usan self.ip / self.bp
+        return run
+
+    def _make_arith(self, op, nxt):
+        stack, error = self.stack, self._error
+        push, pop = stack.append, stack.pop
+        fn = ARITH_FUNCS[op]
+        zero_error = {DIV: "Division by Zero", MOD: "Modulo by Zero"}.get(op)
+
+        def run():
+            if len(stack) < 2:
+                error(f"Stack Underflow ({op})")
+                return nxt
+            b = pop()
+            a = pop()
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+                if zero_error and b == 0:
+                    error(zero_error)
+                    return nxt
+                push(fn(a, b))
+            elif op == ADD:
+                push(str(a) + str(b))  # Excepción: Concatenar strings con '+'
+            else:
+                self._math_error(op, a, b)
+            return nxt
+        return run
+
+    def _step_threaded(self, max_cycles):
+        if self._threaded_from is None or self._threaded_from[0] is not self.code \
+                or self._threaded_from[1] is not self.stack or self._threaded_from[2] is not self.globals:
+            self.thread()  # Código, stack o globales reemplazados sin pasar por load()
+
+        program = self.threaded
+        size = len(program)
+        ip = self.ip
+        cycles_left = max_cycles
+        try:
+            while cycles_left > 0 and not self.halted:
+                if ip >= size:
+                    self.halted = True
+                    break
+                run = program[ip]
+                if run is None:
+                    run = self._thread_at(ip)[0]  # Salto a mitad de instrucción
+                ip = run()
+                cycles_left -= 1
 
+        except IndexError:
+            self._error("Segmentation Fault (Read beyond end of code)")
+        except Exception as e:
+            self._error(f"CPU Exception: {e}")
+
+        self.ip = ip
+        self.cycle_count += max_cycles - cycles_left
+
+    # --- Rutinas compartidas por todos los motores ---
+    def _inc_var(self, slot, step):
+        """INC_VAR: misma semántica que LOAD_VAR, LOAD_CONST, ADD, STORE_VAR"""
+        a = self.globals[slot]
+        if isinstance(a, (int, float)) and isinstance(step, (int, float)):
+            self.globals[slot] = a + step
         else:
-            return self._error(f"Unknown Opcode {op}")
+            self.globals[slot] = str(a) + str(step)
+
+    def _inc_local(self, offset, step):
+        """INC_LOCAL: INC_VAR sobre una variable del frame"""
+        idx = self.bp + offset
+        a = self.stack[idx]
+        if isinstance(a, (int, float)) and isinstance(step, (int, float)):
+            self.stack[idx] = a + step
+        else:
+            self.stack[idx] = str(a) + str(step)
+
+    def _call(self, argc):
+        """
+        Salto a función de usuario (CALL).
+        El destino está en el tope (el Compiler lo carga después de los
+        argumentos); los argumentos quedan en el stack como base del frame.
+        """
+        if len(self.stack) < argc + 1: return self._error("Stack Underflow (CALL)")
+
+        func_target = self.stack.pop()
+        target_addr = None
+
+        # Las direcciones de función son int (ver compile_FuncDecl). Un float
+        # es una variable sin asignar (0.0) o un número: no se salta a él.
+        if type(func_target) is int:
+            target_addr = func_target
+        elif isinstance(func_target, str):
+            target_addr = self.get_global(func_target, None)
+
+        if type(target_addr) is int:
+            if len(self.call_stack) >= self.MAX_CALL_DEPTH:
+                return self._error("Stack Overflow (CALL)")
+            self.call_stack.append((self.ip, self.bp))
+            self.bp = len(self.stack) - argc
+            self.ip = target_addr
+        else:
+            # Si falla, limpiamos los argumentos y dejamos un resultado
+            # para que la expresión que llamaba no desbalancee la pila
+            if argc: del self.stack[-argc:]
+            self.stack.append(0)
+
+    def _enter(self, nparams, nlocals):
+        """Prólogo (ENTER): ajusta los argumentos a nparams y reserva los temporales"""
+        have = len(self.stack) - self.bp
+        if have > nparams:
+            del self.stack[self.bp + nparams:]  # Argumentos de más
+        elif have < nparams:
+            self.stack.extend([0.0] * (nparams - have))  # Faltantes: como variable sin asignar
+        if nlocals > nparams:
+            self.stack.extend([0.0] * (nlocals - nparams))
 
+    def _ret(self):
+        """RET: descarta el frame, deja el resultado y vuelve al llamador"""
+        if not self.call_stack:
+            self.halted = True
+            return
+        ret_ip, caller_bp = self.call_stack.pop()
+        if len(self.stack) > self.bp:
+            result = self.stack.pop()
+            del self.stack[self.bp:]
+            self.stack.append(result)
+        self.ip = ret_ip
+        self.bp = caller_bp
+
+    def _syscall(self, sys_id, argc, mask=0):
+        """Llamada al sistema (SYS) tal como viene en el bytecode"""
+        return self._run_syscall(sys_id, argc, self._syscall_checks(sys_id, argc, mask))
+
+    def _syscall_checks(self, sys_id, argc, mask):
+        """Chequeos de tipo que quedan para runtime: los que el Compiler no pudo probar"""
+        checks = self._syscalls.get(sys_id, (None, None, ()))[2]
+        return tuple(check for check in checks if check[0] < argc and mask >> check[0] & 1)
+
+    def _run_syscall(self, sys_id, argc, checks):
+        """Toma los argumentos, valida los no probados y delega en el handler"""
+        stack = self.stack
+        if len(stack) < argc: return self._error(f"Stack Underflow (SYS {sys_id})")
+
+        if argc:
+            args = stack[-argc:]
+            del stack[-argc:]
+        else:
+            args = []
+
+        name, handler, _ = self._syscalls.get(sys_id, (None, self._sys_nop, ()))
+        for i, arg_type, check in checks:
+            if not check(args[i]):
+                return self._error(f"'{name}' arg {i + 1}: expected {arg_type}, got {type(args[i]).__name__}")
+
+        stack.append(handler(args))
+
+    def run(self):
+        """Corre el programa principal (inicialización de globales) hasta el HALT o un error"""
+        while not self.halted and self.ip < len(self.code):
+            self.step()
+
+    # --- Llamadas desde el host (update/draw) ---
     def call_function(self, func_name):
-        if func_name in self.globals:
-            addr = self.globals[func_name]
-            initial_stack = len(self.stack)
-            self.call_stack.append(len(self.code))
-            self.ip = int(addr)
-            self.halted = False
-
-            while self.ip < len(self.code) and len(self.call_stack) > 0 and not self.halted:
-                self.step()
-
-            if len(self.stack) > initial_stack:
-                self.stack.pop()
\ No newline at end of file
+        """Ejecuta una función de usuario hasta que retorna, sin límite de ciclos"""
+        if self.begin_call(func_name):
+            self.resume()
+
+    def begin_call(self, func_name):
+        """
+        Prepara la llamada a una función sin ejecutarla. Devuelve False si no existe.
+        Después se corre con resume(), de a tramos si hace falta.
+        """
+        addr = self.get_global(func_name, None)
+        # Las direcciones de función son int; un slot sin asignar vale 0.0
+        if type(addr) is not int:
+            return False
+
+        initial_stack = len(self.stack)
+        self._host_call = (len(self.call_stack), self.bp, initial_stack)
+        # Frame de entrada: al volver, ip queda fuera del código y la llamada termina
+        self.call_stack.append((len(self.code), self.bp))
+        self.bp = initial_stack
+        self.ip = addr
+        self.halted = False
+        return True
+
+    def resume(self, max_cycles=None):
+        """
+        Continúa la llamada iniciada con begin_call.
+        Devuelve True si terminó (o falló) y False si se agotaron los
+        ciclos: en ese caso el estado queda intacto para retomarla después.
+        """
+        if self._host_call is None:
+            return True
+        depth, caller_bp, initial_stack = self._host_call
+
+        used = 0
+        while self.ip < len(self.code) and len(self.call_stack) > depth and not self.halted:
+            if max_cycles is None:
+                chunk = self.HOST_SLICE
+            elif used < max_cycles:
+                chunk = max_cycles - used
+            else:
+                return False  # Suspendida
+
+            before = self.cycle_count
+            self.step(chunk)
+            used += self.cycle_count - before
+
+        # Si hubo un error a mitad de camino quedan frames colgando
+        if len(self.call_stack) > depth:
+            del self.call_stack[depth:]
+            del self.stack[initial_stack:]
+        self.bp = caller_bp
+        self._host_call = None
+
+        if len(self.stack) > initial_stack:
+            self.stack.pop()
+        return True
@@ -0,0 +1,126 @@
+"""
+Ejecución de cartuchos sin ventana y sin límite de FPS (tests en lote / CI).
+
+    python headless.py juego.spark otro.spark --frames 600
+    python headless.py juego.sparkcart
+    python headless.py --bios --frames 30 --budget 0
+
+Por cada frame imprime: cartucho, frame, ciclos usados y CRC32 de la VRAM.
+Al final de cada cartucho, un resumen con el tiempo total.
+Sale con código 1 si algún cartucho no compila o crashea.
+"""
+import argparse
+import os
+import sys
+import time
+
+# La salida es para máquinas: sin el banner de pygame en stdout
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from BIOS import BIOS_SOURCE
+from VM.Cartridge import Cartridge, CartridgeError
+from VM.Hardware import HeadlessHardware
+from VM.Pipeline import compile_source
+from VM.Scheduler import DEFAULT_FRAME_BUDGET, FrameScheduler
+from VM.CodeGen import ENGINES, NativeVM, create_vm
+
+
+def run_cartridge(name, source_code, hw, frames, budget, engine, out, quiet=False, cart=None):
+    """
+    Compila y corre un cartucho N frames. Devuelve True si no hubo errores.
+    cart: un Cartridge ya abierto (.sparkcart); se usa su bytecode sin compilar.
+    """
+    t0 = time.perf_counter()
+    if cart is not None:
+        program = cart
+        if cart.spritesheet is not None:
+            hw.load_spritesheet(cart.spritesheet)
+        if cart.tilemap is not None:
+            hw.load_tilemap(cart.tilemap)
+        source_code = cart.source
+    else:
+        try:
+            program, _ = compile_source(source_code)
+        except Exception as e:
+            print(f"{name}\tCOMPILE ERROR\t{e}", file=out)
+            return False
+
+    hw.clear_screen()
+    hw.buttons.clear()
+    vm = create_vm(engine, hw)
+    if engine == NativeVM.ENGINE and source_code is not None:
+        vm.load_source(source_code)
+    else:
+        vm.load(program.code, program.consts, program.names)
+
+    # Inicialización (variables globales), igual que SparkSystem.start_program
+    vm.run()
+    if vm.runtime_error:
+        print(f"{name}\tINIT CRASH\t{vm.runtime_error}", file=out)
+        return False
+    vm.halted = False
+
+    scheduler = FrameScheduler(vm, budget=budget or None)
+    total_cycles = 0
+    for frame in range(frames):
+        hw.handle_input()
+        scheduler.run_frame()
+        total_cycles += scheduler.frame_cycles
+
+        if vm.runtime_error:
+            print(f"{name}\t{frame}\tCRASH\t{vm.runtime_error}", file=out)
+            return False
+        if not quiet:
+            print(f"{name}\t{frame}\t{scheduler.frame_cycles}\t{hw.framebuffer_checksum():08x}", file=out)
+
+    elapsed = time.perf_counter() - t0
+    fps = frames / elapsed if elapsed else 0.0
+    print(f"{name}\tDONE\t{frames} frames\t{total_cycles} ciclos\t{elapsed * 1000:.1f}ms\t{fps:.0f} fps"
+          f"\t{hw.framebuffer_checksum():08x}", file=out)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spark: ejecución headless de cartuchos")
+    parser.add_argument("carts", nargs="*", help="archivos fuente SparkLang")
+    parser.add_argument("--bios", action="store_true", help="correr también el BIOS")
+    parser.add_argument("--frames", type=int, default=60, help="frames por cartucho (default: 60)")
+    parser.add_argument("--budget", type=int, default=DEFAULT_FRAME_BUDGET,
+                        help=f"ciclos por frame, 0 = sin límite (default: {DEFAULT_FRAME_BUDGET})")
+    parser.add_argument("--engine", choices=ENGINES, default="table")
+    parser.add_argument("--quiet", action="store_true", help="solo el resumen por cartucho")
+    args = parser.parse_args(argv)
+
+    carts = [("BIOS", BIOS_SOURCE)] if args.bios else []
+    for path in args.carts:
+        if path.endswith(".sparkcart"):
+            carts.append((path, None))
+        else:
+            with open(path, encoding="utf-8") as f:
+                carts.append((path, f.read()))
+    if not carts:
+        parser.error("no hay cartuchos para correr (pasar archivos o --bios)")
+
+    hw = HeadlessHardware()
+    ok = True
+    for name, source_code in carts:
+        if source_code is not None:
+            ok &= run_cartridge(name, source_code, hw, args.frames, args.budget, args.engine, sys.stdout, args.quiet)
+            continue
+        try:
+            cart = Cartridge.open(name)
+        except (OSError, CartridgeError) as e:
+            print(f"{name}\tLOAD ERROR\t{e}", file=sys.stdout)
+            ok = False
+            continue
+        with cart:
+            try:
+                ok &= run_cartridge(name, None, hw, args.frames, args.budget, args.engine, sys.stdout, args.quiet, cart)
+            except CartridgeError as e:  # Secciones que se decodifican al usarlas (SRC)
+                print(f"{name}\tLOAD ERROR\t{e}", file=sys.stdout)
+                ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
+import argparse
 import pygame
 import time
 
 from BIOS import BIOS_SOURCE
-from VM.Lexer import Lexer
-from VM.Parser import Parser
-from VM.Compiler import Compiler
-from VM.VirtualMachine import SparkVM
+from VM.Bytecode import MAX_CODE_BYTES
+from VM.Cartridge import Cartridge
+from VM.CodeGen import ENGINES, NativeVM, create_vm
+from VM.Pipeline import CompileCache
+from VM.Scheduler import FrameScheduler
 from VM.Hardware import SparkHardware
 from Tools.CodeEditor import CodeEditor
 from Tools.SystemConsole import SystemConsole
@@ -37,7 +39,7 @@ end
 # 2. CLASE PRINCIPAL DEL SISTEMA
 # ==========================================
 class SparkSystem:
-    def __init__(self):
+    def __init__(self, cart_path=None, engine="table"):
         # Constantes de Estado
         self.MODE_EDITOR = 0
         self.MODE_GAME = 1
@@ -45,7 +47,13 @@ class SparkSystem:
         # Inicialización de Componentes
         self.hw = SparkHardware(scale=4)
         self.console = SystemConsole(self.hw)
-        self.vm = SparkVM([], [], hardware=self.hw)
+        # "native": los cartuchos con fuente corren como código Python generado
+        self.engine = engine
+        self.vm = create_vm(engine, self.hw)
+        # update/draw corren con presupuesto de ciclos por frame
+        self.scheduler = FrameScheduler(self.vm)
+        # Bytecode ya compilado (memoria + disco) por hash del fuente
+        self.compile_cache = CompileCache()
 
         # Inyectar consola en VM para logs
         self.vm.console = self.console
@@ -53,9 +61,18 @@ class SparkSystem:
         self.editor = CodeEditor(self.hw)
         self.editor.load_code(GAME_SOURCE)
 
+        # Cartucho .sparkcart a correr después del BIOS (queda abierto: la VM
+        # ejecuta directo sobre su sección CODE mapeada en memoria)
+        self.cart_path = cart_path
+        self.cartridge = None
+
         # Estado Inicial
         self.current_mode = self.MODE_EDITOR
         self.running = True
+        # La ventana tiene otra cosa que el juego (editor, consola): el
+        # próximo frame de juego se presenta entero
+        self.window_stale = True
+        self.console_shown = False  # visibilidad de la consola en el último frame
 
         # Secuencia de Arranque (BIOS)
         self.bios_mode = True
@@ -65,7 +82,7 @@ class SparkSystem:
         if not self.load_cartridge(BIOS_SOURCE):
             self.console.log("BIOS Corrupta. Saltando.", "WARN")
             self.bios_mode = False
-            self.switch_to_editor()
+            self.boot_finished()
         else:
             pygame.key.set_repeat()  # Desactivar repeat durante BIOS
 
@@ -84,30 +101,27 @@ class SparkSystem:
         pygame.display.set_caption("Spark - RUNNING")
         pygame.key.set_repeat()  # Desactivar repetición para inputs de juego
 
-    def load_cartridge(self, source_code):
+    def load_cartridge(self, source_code, tokens=None):
         """Compila y carga código en la VM. Retorna True/False."""
         t0 = time.time()
         self.console.log("--- COMPILING ---", "INFO")
 
         try:
-            tokens = Lexer(source_code)
-            ast = Parser(tokens).parse()
-            compiler = Compiler()
-            compiler.compile(ast)
-
-            self.vm.code = compiler.code
-            self.vm.consts = compiler.consts
-            self.vm.reset()
-
-            # Ejecutar inicialización (Variables globales)
-            while not self.vm.halted and self.vm.ip < len(self.vm.code):
-                self.vm.step()
-
-            # Chequeo post-inicialización
-            if self.vm.runtime_error:
-                raise Exception(self.vm.runtime_error)
-
-            self.vm.halted = False
+            program, stats = self.compile_cache.compile(source_code, tokens)
+            size = f"Bytecode: {stats['bytes']}/{MAX_CODE_BYTES} B"
+            if stats["cached"]:
+                self.console.log(f"{size} (caché)", "INFO")
+            else:
+                if stats["ast_eliminated"]:
+                    self.console.log(f"AST: {stats['ast_eliminated']} nodos eliminados", "INFO")
+                self.console.log(f"{size} (peephole: -{stats['saved_bytes']} B)", "INFO")
+
+            if self.engine == NativeVM.ENGINE:
+                # El bytecode queda validado (y en caché); corre el código generado
+                self.vm.load_source(source_code, tokens)
+                self.start_program()
+            else:
+                self.start_program(program)
             elapsed = round((time.time() - t0) * 1000, 2)
             self.console.log(f"Success ({elapsed}ms)", "SUCCESS")
             return True
@@ -118,6 +132,61 @@ class SparkSystem:
                 self.editor.set_error(str(e))
             return False
 
+    def start_program(self, program=None):
+        """
+        Carga un programa compilado (code/consts/names) y corre su inicialización.
+        Sin program, corre lo que ya tiene la VM (NativeVM.load_source).
+        """
+        if program is not None:
+            self.vm.load(program.code, program.consts, program.names)
+
+        # Ejecutar inicialización (Variables globales)
+        self.vm.run()
+
+        # Chequeo post-inicialización
+        if self.vm.runtime_error:
+            raise Exception(self.vm.runtime_error)
+
+        self.vm.halted = False
+        self.scheduler.reset()
+
+    def load_cart_file(self, path):
+        """Abre un .sparkcart (mmap) y lo carga: assets, fuente para el editor y bytecode"""
+        t0 = time.time()
+        try:
+            cart = Cartridge.open(path)
+            if cart.spritesheet is not None:
+                self.hw.load_spritesheet(cart.spritesheet)
+            if cart.tilemap is not None:
+                self.hw.load_tilemap(cart.tilemap)
+            if cart.source is not None:
+                self.editor.load_code(cart.source)
+
+            if self.engine == NativeVM.ENGINE and cart.source is not None:
+                self.vm.load_source(cart.source)
+                self.start_program()
+            else:
+                self.start_program(cart)
+            if self.cartridge is not None:
+                self.cartridge.close()
+            self.cartridge = cart
+        except Exception as e:
+            self.console.log(f"Cartucho {path}: {e}", "ERROR")
+            return False
+
+        title = cart.meta.get("title", path)
+        elapsed = round((time.time() - t0) * 1000, 2)
+        self.console.log(f"Cartucho {title}: {cart.size} B ({elapsed}ms)", "SUCCESS")
+        return True
+
+    def boot_finished(self):
+        """Fin del BIOS: corre el cartucho pedido, o abre el editor"""
+        self.console.log("System Ready.", "INFO")
+        if self.cart_path and self.load_cart_file(self.cart_path):
+            self.switch_to_game()
+        else:
+            self.switch_to_editor()
+
     def handle_global_input(self, event):
         """Maneja teclas globales (F1, F3, F5, Quit)"""
         if event.type == pygame.QUIT:
@@ -141,7 +210,7 @@ class SparkSystem:
                 if self.current_mode == self.MODE_EDITOR:
                     self.editor.validate_syntax()
                     if self.editor.error_msg == "OK":
-                        if self.load_cartridge(self.editor.get_code()):
+                        if self.load_cartridge(self.editor.get_code(), self.editor.get_tokens()):
                             self.switch_to_game()
                     else:
                         self.console.log("Sintaxis Inválida", "WARN")
@@ -160,54 +229,78 @@ class SparkSystem:
     def update(self):
         """Lógica de actualización por frame"""
 
-        # 1. BIOS Update
+        # 1. BIOS Update (update + draw del cartucho, dentro del presupuesto)
         if self.bios_mode:
-            self.vm.call_function("update")
+            self.scheduler.run_frame()
             self.check_vm_crash("BIOS")
 
             if time.time() - self.start_time > 8:
-                self.switch_to_editor()
-                self.console.log("System Ready.", "INFO")
+                self.boot_finished()
 
         # 2. GAME Update
         elif self.current_mode == self.MODE_GAME:
             self.hw.handle_input()  # Polling de botones
-            self.vm.call_function("update")
+            self.scheduler.run_frame()
             self.check_vm_crash("GAME")
 
         # 3. EDITOR Update (Nada por ahora)
         pass
 
+    def present_game(self):
+        """
+        Lleva la imagen del juego a la ventana. Devuelve los Rects de la
+        ventana que cambiaron, o None si se repintó entera.
+        """
+        # draw() ya corrió en el scheduler; si quedó suspendido a mitad
+        # de camino se sigue mostrando la imagen anterior
+        if self.window_stale:
+            self.window_stale = False
+            if self.scheduler.tick_done:
+                self.hw.present(full=True)
+            pygame.transform.scale(self.hw.screen, self.hw.window.get_size(), self.hw.window)
+            return None
+
+        if not self.scheduler.tick_done:
+            return []
+
+        # VRAM indexada -> RGB y escalado 160x160 -> Ventana, solo lo que cambió
+        scale = self.hw.SCALE
+        dirty = []
+        for r in self.hw.present():
+            dest = pygame.Rect(r.x * scale, r.y * scale, r.w * scale, r.h * scale)
+            pygame.transform.scale(self.hw.screen.subsurface(r), dest.size, self.hw.window.subsurface(dest))
+            dirty.append(dest)
+        return dirty
+
     def draw(self):
         """Pipeline Gráfico Unificado"""
 
         # 1. Dibujar Capa Base (Juego/Bios o Editor)
+        dirty = None  # None = ventana completa
         if self.bios_mode or self.current_mode == self.MODE_GAME:
-            self.vm.call_function("draw")
-            # Escalar 160x160 -> Ventana
-            pygame.transform.scale(self.hw.screen, self.hw.window.get_size(), self.hw.window)
+            if self.console.visible != self.console_shown or (self.console.visible and self.console.dirty):
+                # Se mostró/ocultó o cambió la consola: se repinta la base entera
+                self.window_stale = True
+            dirty = self.present_game()
 
         elif self.current_mode == self.MODE_EDITOR:
             self.editor.draw()
             # Escalar 320x320 -> Ventana
             pygame.transform.scale(self.hw.editor_screen, self.hw.window.get_size(), self.hw.window)
+            self.window_stale = True
 
-        # 2. Dibujar Overlay (Consola)
+        # 2. Dibujar Overlay (Consola): un blit del overlay ya escalado, solo
+        # sobre lo que se repintó debajo
         if self.console.visible:
-            # Dibujar consola sobre su canvas transparente
-            # Limpiamos el canvas de la consola primero si es necesario,
-            # pero console.draw ya maneja su fondo.
-            self.console.draw()
+            self.console.draw(self.hw.window, dirty)
+        self.console_shown = self.console.visible
 
-            # Pegar consola sobre la ventana
-            overlay = pygame.transform.scale(self.hw.editor_screen, self.hw.window.get_size())
-            # Usamos colorkey negro para transparencia si el fondo no es sólido
-            # (Depende de tu implementación de SystemConsole, aquí asumimos overlay sólido o alpha blit)
-            self.hw.window.blit(overlay, (0, 0))
-
-        # 3. Flip Final
-        pygame.display.flip()
-        self.hw.clock.tick(60)
+        # 3. Flip Final (solo las regiones que cambiaron; nada si el frame es igual)
+        if dirty is None:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+        self.hw.clock.tick(self.hw.FPS)
 
     def run(self):
         """Bucle Principal (Limpio y sin indentación excesiva)"""
@@ -226,11 +319,23 @@ class SparkSystem:
             self.update()
             self.draw()
 
+        # Lo que quede pendiente de la copia de logs a la terminal
+        self.console.stdout.flush()
+
 
 # ==========================================
 # 3. ENTRY POINT
 # ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spark Fantasy Console")
+    parser.add_argument("cart", nargs="?", help="cartucho .sparkcart a correr después del BIOS")
+    parser.add_argument("--engine", choices=ENGINES, default="table", help="motor de ejecución (default: table)")
+    args = parser.parse_args(argv)
+
+    system = SparkSystem(args.cart, args.engine)
+    system.run()
+    pygame.quit()
+
+
 if __name__ == "__main__":
-    sys = SparkSystem()
-    sys.run()
-    pygame.quit()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,11 @@
+"""
+Punto de entrada de la consola.
+
+    python spark.py                      -> BIOS + editor
+    python spark.py cartucho.sparkcart   -> BIOS + cartucho
+    python spark.py --engine native      -> cartuchos como código Python generado
+"""
+from main import main
+
+if __name__ == "__main__":
+    main()